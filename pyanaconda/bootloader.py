@@ -25,6 +25,7 @@ import collections
 import os
 import re
 import struct
+import tempfile
 import blivet
 from parted import PARTITION_BIOS_GRUB
 from glob import glob
@@ -34,12 +35,14 @@ from blivet.devicelibs import raid
 from pyanaconda.isys import sync
 from pyanaconda.product import productName
 from pyanaconda.flags import flags, can_touch_runtime_system
-from blivet.errors import StorageError
+from blivet.errors import StorageError, FSError
 from blivet.fcoe import fcoe
+from blivet.devicetree import DeviceTree
 import pyanaconda.network
 from pyanaconda.errors import errorHandler, ERROR_RAISE, ZIPLError
 from pyanaconda.packaging.rpmostreepayload import RPMOSTreePayload
 from pyanaconda.nm import nm_device_hwaddress
+from pyanaconda.efi import EFIBootManager, EFIBootError, partition_signature
 from blivet import platform
 from blivet.size import Size
 from pyanaconda.i18n import _, N_
@@ -47,6 +50,33 @@ from pyanaconda.i18n import _, N_
 import logging
 log = logging.getLogger("anaconda")
 
+# Bumped whenever an action is registered or cancelled in any devicetree. The
+# devices' parents, disklabels and members only change that way, so the cached
+# results of the stage1/stage2 validity checks don't need to look at them.
+_action_generation = 0
+
+def _bump_action_generation(method):
+    def wrapper(*args, **kwargs):
+        global _action_generation
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _action_generation += 1
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+def _watch_actions(devicetree_class):
+    """ Bump the action generation when actions are registered or cancelled
+        in the devicetrees of the given class.
+    """
+    for name in ("registerAction", "cancelAction"):
+        method = getattr(devicetree_class, name)
+        setattr(devicetree_class, name, _bump_action_generation(method))
+
+_watch_actions(DeviceTree)
+
 def get_boot_block(device, seek_blocks=0):
     status = device.status
     if not status:
@@ -79,6 +109,35 @@ def is_windows_boot_block(block):
 def has_windows_boot_block(device):
     return is_windows_boot_block(get_boot_block(device))
 
+# the Windows boot manager on an EFI system partition
+WINDOWS_EFI_LOADER = "/EFI/Microsoft/Boot/bootmgfw.efi"
+
+def inspect_filesystem(device, func):
+    """ Call the function with the mount point of the file system on the
+        device, mounting it read-only for the call if it isn't mounted.
+
+        :returns: the return value of the function or None if the file
+                  system cannot be mounted
+    """
+    mount_paths = blivet.util.get_mount_paths(device.path)
+    if mount_paths:
+        return func(mount_paths[0])
+
+    mountpoint = tempfile.mkdtemp()
+    try:
+        try:
+            device.format.mount(mountpoint=mountpoint, options="ro")
+        except (FSError, StorageError) as e:
+            log.debug("failed to mount %s: %s", device.path, e)
+            return None
+
+        try:
+            return func(mountpoint)
+        finally:
+            device.format.unmount()
+    finally:
+        os.rmdir(mountpoint)
+
 class serial_opts(object):
     def __init__(self):
         self.speed = None
@@ -177,6 +236,20 @@ class BootLoaderImage(object):
         self.device = device
 
 
+class ForeignLinuxBootLoaderImage(BootLoaderImage):
+    """ Another linux installation, booted through its own boot loader
+        configuration.
+    """
+    def __init__(self, device=None, label=None, short=None, boot_device=None,
+                 efi_config=None):
+        super(ForeignLinuxBootLoaderImage, self).__init__(device=device,
+                                                          label=label,
+                                                          short=short)
+        self.boot_device = boot_device or device    # device holding /boot
+        # (EFI system partition, path) of its grub.cfg if installed with EFI
+        self.efi_config = efi_config
+
+
 class LinuxBootLoaderImage(BootLoaderImage):
     def __init__(self, device=None, label=None, short=None, version=None):
         super(LinuxBootLoaderImage, self).__init__(device=device, label=label)
@@ -291,10 +364,16 @@ class BootLoader(object):
         self.errors = []
         self.warnings = []
 
+        # results of the stage1/stage2 validity checks, see _check_validity
+        self._validity_cache = {}
+        self._validity_generation = 0
+
         self.reset()
 
     def reset(self):
         """ Reset stage1 and stage2 values """
+        self.invalidate_validity_cache()
+
         # the device the bootloader will be installed on
         self.stage1_device = None
 
@@ -360,7 +439,7 @@ class BootLoader(object):
     @property
     def images(self):
         """ List of OS images that will be included in the configuration. """
-        all_images = self.linux_images
+        all_images = self.linux_images[:]
         all_images.extend(i for i in self.chain_images if i.label)
         return all_images
 
@@ -557,6 +636,52 @@ class BootLoader(object):
         # partition means "use the stage2 device for a stage1 device"
         self.stage2_is_preferred_stage1 = True
 
+    def invalidate_validity_cache(self):
+        """ Forget the results of the stage1/stage2 validity checks. """
+        self._validity_generation += 1
+        self._validity_cache = {}
+
+    def _validity_stamp(self, device):
+        """ Return the state of the device the validity checks depend on.
+
+            Changes done by actions (including the ones to the device's
+            parents) are covered by the action generation. The rest are the
+            attributes of the device itself that are changed directly, like
+            the mountpoint or the geometry of an allocated partition. The
+            stage2 device is included since it may be a valid stage1 device.
+        """
+        fmt = device.format
+        end = None
+        if device.type == "partition" and device.partedPartition:
+            end = device.partedPartition.geometry.end
+
+        return (_action_generation, self._validity_generation,
+                id(self.stage2_device), self.stage2_is_preferred_stage1,
+                device.name, device.type, device.exists, device.size,
+                device.protected, getattr(device, "isPrimary", None), end,
+                id(fmt), fmt.type, getattr(fmt, "mountpoint", None),
+                getattr(fmt, "label", None))
+
+    def _check_validity(self, check, device, *args):
+        """ Run a validity check unless its result for the device is cached.
+
+            The cached result is used as long as the state of the device
+            returned by _validity_stamp doesn't change. The errors and
+            warnings of the check are restored with it.
+        """
+        key = (check.__name__, id(device)) + args
+        stamp = self._validity_stamp(device)
+        cached = self._validity_cache.get(key)
+        if cached and cached[0] == stamp:
+            (valid, errors, warnings) = cached[1:]
+            self.errors = errors[:]
+            self.warnings = warnings[:]
+            return valid
+
+        valid = check(device, *args)
+        self._validity_cache[key] = (stamp, valid, self.errors[:], self.warnings[:])
+        return valid
+
     def is_valid_stage1_device(self, device, early=False):
         """ Return True if the device is a valid stage1 target device.
 
@@ -575,12 +700,16 @@ class BootLoader(object):
         """
         self.errors = []
         self.warnings = []
-        valid = True
-        constraint = platform.platform.bootStage1ConstraintDict
 
         if device is None:
             return False
 
+        return self._check_validity(self._is_valid_stage1_device, device, early)
+
+    def _is_valid_stage1_device(self, device, early):
+        valid = True
+        constraint = platform.platform.bootStage1ConstraintDict
+
         if not self._device_type_match(device, constraint["device_types"]):
             log.debug("stage1 device cannot be of type %s", device.type)
             return False
@@ -689,11 +818,16 @@ class BootLoader(object):
         """
         self.errors = []
         self.warnings = []
-        valid = True
 
         if device is None:
             return False
 
+        return self._check_validity(self._is_valid_stage2_device, device,
+                                    linux, non_linux)
+
+    def _is_valid_stage2_device(self, device, linux, non_linux):
+        valid = True
+
         if device.protected:
             valid = False
 
@@ -1404,6 +1538,7 @@ class GRUB2(GRUB):
     _config_file = "grub.cfg"
     _config_dir = "grub2"
     defaults_file = "/etc/default/grub"
+    foreign_os_file = "/etc/grub.d/35_anaconda_foreign_os"
     terminal_type = "console"
 
     # requirements for boot devices
@@ -1506,6 +1641,10 @@ class GRUB2(GRUB):
         log.info("bootloader.py: used boot args: %s ", self.boot_args)
         defaults.write("GRUB_CMDLINE_LINUX=\"%s\"\n" % self.boot_args)
         defaults.write("GRUB_DISABLE_RECOVERY=\"true\"\n")
+        # the other operating systems are already known from the storage
+        # scan, see write_foreign_os_config
+        if not flags.osprober:
+            defaults.write("GRUB_DISABLE_OS_PROBER=\"true\"\n")
         #defaults.write("GRUB_THEME=\"/boot/grub2/themes/system/theme.txt\"\n")
         defaults.close()
 
@@ -1546,6 +1685,110 @@ class GRUB2(GRUB):
         header.close()
         iutil.eintr_retry_call(os.chmod, users_file, 0o700)
 
+    def _foreign_os_root(self, device):
+        """ Return the grub2 command pointing root at the device or None. """
+        if getattr(device.format, "uuid", None):
+            return "search --no-floppy --fs-uuid --set=root %s" % device.format.uuid
+        elif getattr(device.format, "label", None):
+            return "search --no-floppy --label --set=root '%s'" % device.format.label
+
+        try:
+            return "set root='%s'" % self.grub_device_name(device)
+        except ValueError:
+            return None
+
+    def windows_devices(self, devices):
+        """ Existing devices Windows can be booted from (chainloaded). """
+        return [d for d in devices
+                if d.format.name == "ntfs" and d.format.exists and
+                self.has_windows([d]) and has_windows_boot_block(d)]
+
+    def foreign_efi_configs(self, devices):
+        """ (EFI system partition, path) of the grub.cfg files of the other
+            systems installed with EFI.
+        """
+        return []
+
+    def _windows_entry(self, image):
+        root = self._foreign_os_root(image.device)
+        if not root:
+            return None
+
+        return [root, "chainloader +1"]
+
+    def _linux_entry(self, image):
+        root = self._foreign_os_root(image.boot_device)
+        if not root:
+            return None
+
+        if image.boot_device == image.device:
+            prefix = "/boot"
+        else:
+            prefix = ""
+
+        lines = [root]
+        keyword = "if"
+        for config in ("grub2/grub.cfg", "grub/grub.cfg"):
+            path = "%s/%s" % (prefix, config)
+            lines.append("%s [ -f %s ]; then" % (keyword, path))
+            lines.append("\tconfigfile %s" % path)
+            keyword = "elif"
+
+        if image.efi_config:
+            (esp, path) = image.efi_config
+            esp_root = self._foreign_os_root(esp)
+            if esp_root:
+                lines.append("else")
+                lines.append("\t" + esp_root)
+                lines.append("\tconfigfile %s" % path)
+
+        lines.append("fi")
+        return lines
+
+    def write_foreign_os_config(self):
+        """ Write a grub.d script with menu entries for the other operating
+            systems found when the devicetree was populated.
+
+            This replaces the os-prober run of grub2-mkconfig, which mounts
+            and probes every partition again.
+        """
+        entries = []
+        bodies = []
+        for image in self.chain_images:
+            if not image.label:
+                continue
+
+            if isinstance(image, ForeignLinuxBootLoaderImage):
+                body = self._linux_entry(image)
+            else:
+                body = self._windows_entry(image)
+
+            if not body:
+                log.warning("no way to boot %s, not adding it to the boot menu",
+                            image.label)
+                continue
+
+            if body in bodies:
+                continue
+
+            bodies.append(body)
+            entries.append("menuentry '%s' --class os {\n%s\n}\n"
+                           % (image.label.replace("'", "'\\''"),
+                              "\n".join("\t" + line for line in body)))
+
+        if not entries:
+            return
+
+        script_file = iutil.getSysroot() + self.foreign_os_file
+        script = open(script_file, "w")
+        script.write("#!/bin/sh -e\n\n")
+        script.write("# other operating systems found by anaconda\n")
+        script.write("cat << \"EOF\"\n")
+        script.write("".join(entries))
+        script.write("EOF\n")
+        script.close()
+        iutil.eintr_retry_call(os.chmod, script_file, 0o755)
+
     def write_config(self):
         self.write_config_console(None)
         # See if we have a password and if so update the boot args before we
@@ -1561,6 +1804,11 @@ class GRUB2(GRUB):
         except (BootLoaderError, OSError, RuntimeError) as e:
             log.error("boot loader password setup failed: %s", e)
 
+        try:
+            self.write_foreign_os_config()
+        except (IOError, OSError) as e:
+            log.error("failed to add the other operating systems to the boot menu: %s", e)
+
         # make sure the default entry is the OS we are installing
         if self.default is not None:
             entry_title = "0"
@@ -1687,6 +1935,42 @@ class EFIGRUB(GRUB2):
         super(EFIGRUB, self).__init__()
         self.efi_dir = 'BOOT'
 
+    def _efi_system_partitions(self, devices):
+        return [d for d in devices
+                if d.format.type == "efi" and d.format.exists]
+
+    def windows_devices(self, devices):
+        # the windows boot manager lives on an EFI system partition, not in
+        # the boot block of the ntfs partition
+        has_loader = lambda mountpoint: os.path.isfile(mountpoint + WINDOWS_EFI_LOADER)
+        return [d for d in self._efi_system_partitions(devices)
+                if inspect_filesystem(d, has_loader)]
+
+    def foreign_efi_configs(self, devices):
+        def find_configs(mountpoint):
+            return sorted("/EFI/%s/grub.cfg" % name
+                          for name in os.listdir(mountpoint + "/EFI")
+                          if name not in ("BOOT", "Microsoft", self.efi_dir) and
+                          os.path.isfile("%s/EFI/%s/grub.cfg" % (mountpoint, name)))
+
+        configs = []
+        for esp in self._efi_system_partitions(devices):
+            try:
+                paths = inspect_filesystem(esp, find_configs) or []
+            except OSError as e:
+                log.debug("failed to look for grub configs on %s: %s", esp.path, e)
+                continue
+            configs.extend((esp, path) for path in paths)
+
+        return configs
+
+    def _windows_entry(self, image):
+        root = self._foreign_os_root(image.device)
+        if not root:
+            return None
+
+        return [root, "chainloader %s" % WINDOWS_EFI_LOADER]
+
     def efibootmgr(self, *args, **kwargs):
         if flags.imageInstall or flags.dirInstall:
             log.info("Skipping efibootmgr for image/directory install.")
@@ -1752,10 +2036,43 @@ class EFIGRUB(GRUB2):
             for parent in self.stage1_device.parents:
                 self._add_single_efi_boot_target(parent)
 
+    @property
+    def efi_boot_targets(self):
+        """ (disk path, partition, loader) tuples for EFIBootManager.update """
+        if self.stage1_device.type == "mdarray":
+            partitions = self.stage1_device.parents
+        else:
+            partitions = [self.stage1_device]
+
+        loader = self.efi_dir_as_efifs_dir + self._efi_binary
+        targets = []
+        for partition in partitions:
+            geometry = partition.partedPartition.geometry
+            targets.append((partition.disk.path,
+                            (partition.partedPartition.number, geometry.start, geometry.length,
+                             partition_signature(partition.path)),
+                            loader))
+        return targets
+
     def install(self, args=None):
-        if not flags.leavebootorder:
-            self.remove_efi_boot_target()
-        self.add_efi_boot_target()
+        if flags.imageInstall or flags.dirInstall:
+            log.info("Skipping efi boot entries for image/directory install.")
+            return
+
+        # read the boot entries once and only change the ones that need it
+        manager = EFIBootManager(self.efibootmgr)
+        if not manager.available:
+            if not flags.leavebootorder:
+                self.remove_efi_boot_target()
+            self.add_efi_boot_target()
+            return
+
+        try:
+            manager.read()
+            manager.update(productName.split("-")[0], self.efi_boot_targets,
+                           keep_others=flags.leavebootorder)
+        except (EFIBootError, IOError, OSError) as e:
+            raise BootLoaderError("failed to set efi boot targets: %s" % e)
 
     def update(self):
         self.install()
@@ -2051,7 +2368,12 @@ class IPSeriesGRUB2(GRUB2):
 
         # Place the disk containing the PReP partition first.
         # Remove all other occurances of it.
-        boot_list = [boot_disk] + [x for x in boot_list if x != boot_disk]
+        new_boot_list = [boot_disk] + [x for x in boot_list if x != boot_disk]
+        if new_boot_list == boot_list:
+            # writing NVRAM is slow, don't do it for nothing
+            log.info("updateNVRAMBootList: %s is already first in the boot list", boot_disk)
+            return
+        boot_list = new_boot_list
 
         update_value = "boot-device=%s" % " ".join(boot_list)
 
@@ -2354,6 +2676,57 @@ def writeSysconfigKernel(storage, version, instClass):
         f.write("HYPERVISOR_ARGS=logging=vga,serial,memory\n")
     f.close()
 
+def foreignImages(storage):
+    """ Return images for the other operating systems on the system.
+
+        They are based on the scan done when the devicetree was populated:
+        bootable ntfs devices and the existing linux installations, as long
+        as they are not being destroyed or reformatted.
+    """
+    devices = storage.devices
+    images = []
+
+    for device in storage.bootloader.windows_devices(devices):
+        images.append(BootLoaderImage(device=device,
+                                      label="Windows (on %s)" % device.path,
+                                      short="windows"))
+
+    roots = []
+    for root in storage.roots:
+        device = root.device
+        if not device or device == storage.rootDevice:
+            continue
+
+        boot_device = root.mounts.get("/boot", device)
+        if any(d not in devices or not d.format.exists
+               for d in (device, boot_device)):
+            continue
+
+        roots.append((root, boot_device))
+
+    efi_configs = storage.bootloader.foreign_efi_configs(devices) if roots else []
+    for (root, boot_device) in roots:
+        images.append(ForeignLinuxBootLoaderImage(device=root.device,
+                                                  boot_device=boot_device,
+                                                  efi_config=_foreign_efi_config(root, efi_configs),
+                                                  label="%s (on %s)" % (root.name, root.device.path),
+                                                  short="linux"))
+
+    return images
+
+def _foreign_efi_config(root, efi_configs):
+    """ Pick the grub.cfg on an EFI system partition that most likely belongs
+        to the root, e.g. /EFI/fedora/grub.cfg for "Fedora 21".
+    """
+    name = (root.name or "").lower()
+    matching = [c for c in efi_configs if c[1].split("/")[2].lower() in name]
+    if matching:
+        return matching[0]
+    elif len(efi_configs) == 1:
+        return efi_configs[0]
+    else:
+        return None
+
 def writeBootLoaderFinal(storage, payload, instClass, ksdata):
     """ Do the final write of the bootloader. """
 
@@ -2404,6 +2777,12 @@ def writeBootLoader(storage, payload, instClass, ksdata):
         log.warning("no kernel was installed -- boot loader config unchanged")
         return
 
+    # grub2-mkconfig would run os-prober to find these again
+    if isinstance(storage.bootloader, GRUB2) and not flags.osprober:
+        for image in foreignImages(storage):
+            log.info("adding %s to the boot menu", image.label)
+            storage.bootloader.add_image(image)
+
     # all the linux images' labels are based on the default image's
     base_label = productName
     base_short_label = "linux"
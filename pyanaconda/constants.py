@@ -67,6 +67,11 @@ DEFAULT_VC_FONT = "eurlatgr"
 
 DEFAULT_KEYBOARD = "us"
 
+# the xkb layouts and switching options enumerated by libxklavier, written by
+# anaconda-xkl-catalog when the installer image is composed (the file says
+# which xkeyboard-config data it was made from)
+XKL_CATALOG_FILE = "/usr/share/anaconda/xkl-catalog.json"
+
 DRACUT_SHUTDOWN_EJECT = "/run/initramfs/usr/lib/dracut/hooks/shutdown/99anaconda-eject.sh"
 
 # VNC questions
@@ -76,6 +81,9 @@ USETEXT = N_("Use text mode")
 # Runlevel files
 RUNLEVELS = {3: 'multi-user.target', 5: 'graphical.target'}
 
+# Maximum number of kickstart scripts of a --parallel group running at once
+MAX_PARALLEL_SCRIPTS = 4
+
 # Network
 NETWORK_CONNECTION_TIMEOUT = 45  # in seconds
 NETWORK_CONNECTED_CHECK_INTERVAL = 0.1  # in seconds
@@ -90,6 +98,7 @@ THREAD_STORAGE_WATCHER = "AnaStorageWatcher"
 THREAD_CHECK_STORAGE = "AnaCheckStorageThread"
 THREAD_CUSTOM_STORAGE_INIT = "AnaCustomStorageInit"
 THREAD_WAIT_FOR_CONNECTING_NM = "AnaWaitForConnectingNMThread"
+THREAD_NETWORK_STACKED = "AnaNetworkStackedThread"
 THREAD_PAYLOAD = "AnaPayloadThread"
 THREAD_PAYLOAD_RESTART = "AnaPayloadRestartThread"
 THREAD_INPUT_BASENAME = "AnaInputThread"
@@ -110,6 +119,16 @@ THREAD_TIME_INIT = "AnaTimeInitThread"
 THREAD_DASDFMT = "AnaDasdfmtThread"
 THREAD_KEYBOARD_INIT = "AnaKeyboardThread"
 THREAD_ADD_LAYOUTS_INIT = "AnaAddLayoutsInitThread"
+THREAD_ISCSI_STARTUP = "AnaIscsiStartupThread"
+THREAD_FCOE_STARTUP = "AnaFCOEStartupThread"
+THREAD_ZFCP_STARTUP = "AnaZFCPStartupThread"
+THREAD_FILTER_INDEX = "AnaFilterIndexThread"
+THREAD_WELCOME_LANGUAGES = "AnaWelcomeLanguagesThread"
+THREAD_LOCALED_PREFIX = "AnaLocaledThread"
+THREAD_AUTOPART_PROPOSAL_PREFIX = "AnaAutopartProposalThread"
+THREAD_RESIZE_INFO_PREFIX = "AnaResizeInfo"
+THREAD_DISK_OVERVIEWS_PREFIX = "AnaDiskOverviews"
+THREAD_GEOLOCATION_PROVIDER_PREFIX = "AnaGeolocationProvider"
 
 # Geolocation constants
 
@@ -118,6 +137,8 @@ THREAD_ADD_LAYOUTS_INIT = "AnaAddLayoutsInitThread"
 GEOLOC_PROVIDER_FEDORA_GEOIP = "provider_fedora_geoip"
 GEOLOC_PROVIDER_HOSTIP = "provider_hostip"
 GEOLOC_PROVIDER_GOOGLE_WIFI = "provider_google_wifi"
+# - queries the GeoIP providers at once and uses the first result
+GEOLOC_PROVIDER_COMPOSITE = "provider_composite"
 # geocoding provider
 GEOLOC_GEOCODER_NOMINATIM = "geocoder_nominatim"
 # default providers
@@ -125,6 +146,8 @@ GEOLOC_DEFAULT_PROVIDER = GEOLOC_PROVIDER_FEDORA_GEOIP
 GEOLOC_DEFAULT_GEOCODER = GEOLOC_GEOCODER_NOMINATIM
 # timeout (in seconds)
 GEOLOC_TIMEOUT = 3
+# the last result of the composite provider, kept for the next run
+GEOLOC_CACHE_FILE = "/tmp/anaconda-geoloc.json"
 
 
 ANACONDA_ENVIRON = "anaconda"
@@ -0,0 +1,283 @@
+#
+# efi.py - firmware boot entry handling on EFI machines
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+import os
+import re
+import struct
+import uuid
+
+import logging
+log = logging.getLogger("anaconda")
+
+EFIVARS_DIR = "/sys/firmware/efi/efivars"
+EFI_GLOBAL_GUID = "8be4df61-93ca-11d2-aa0d-00e098032b8c"
+
+# device path nodes, see the Device Path Protocol in the UEFI specification
+MEDIA_DEVICE_PATH = 0x04
+MEDIA_HARDDRIVE_DP = 0x01
+MEDIA_FILEPATH_DP = 0x04
+END_DEVICE_PATH_TYPE = 0x7f
+
+# signature types of the hard drive node
+SIGNATURE_TYPE_MBR = 0x01
+SIGNATURE_TYPE_GUID = 0x02
+
+PARTUUID_DIR = "/dev/disk/by-partuuid"
+
+class EFIBootError(Exception):
+    pass
+
+class EFIBootEntry(object):
+    """ A Boot#### variable. """
+    def __init__(self, slot, label, partition=None, loader=None):
+        self.slot = slot                # hex number string, e.g. "0001"
+        self.label = label              # description string
+        self.partition = partition      # (number, start, size, signature) of the partition
+        self.loader = loader            # path of the EFI binary
+
+    def matches(self, label, partition, loader):
+        """ Return True if the entry boots the loader from the partition.
+
+            The signatures are only compared if both are known. Without them
+            the same partition on the disks of a RAID1 can't be told apart.
+        """
+        if self.partition is None or self.partition[:3] != partition[:3]:
+            return False
+
+        if self.partition[3] and partition[3] and self.partition[3] != partition[3]:
+            return False
+
+        # FAT file names are case insensitive
+        return (self.label == label and self.loader is not None and
+                self.loader.lower() == loader.lower())
+
+def parse_signature(signature, signature_type):
+    """ Return the partition signature of a hard drive node as a string.
+
+        :returns: the partition GUID on GPT disks, the disk signature as
+                  eight hex digits on MBR disks or None
+    """
+    if signature_type == SIGNATURE_TYPE_GUID:
+        return str(uuid.UUID(bytes_le=signature))
+    elif signature_type == SIGNATURE_TYPE_MBR:
+        return "%08x" % struct.unpack_from("<I", signature)
+    else:
+        return None
+
+def partition_signature(path):
+    """ Return the signature of the partition as in parse_signature.
+
+        The signature is taken from the /dev/disk/by-partuuid links, which
+        are named after the partition GUID on GPT disks and after the disk
+        signature and the partition number on MBR disks.
+
+        :param str path: the device node of the partition
+        :returns: the signature or None if it isn't known
+    """
+    try:
+        names = os.listdir(PARTUUID_DIR)
+    except OSError:
+        return None
+
+    path = os.path.realpath(path)
+    for name in names:
+        if os.path.realpath(os.path.join(PARTUUID_DIR, name)) != path:
+            continue
+
+        if re.match("^[0-9a-f]{8}-[0-9a-f]{2}$", name):
+            return name[:8]
+        else:
+            return name.lower()
+
+    return None
+
+def parse_load_option(data):
+    """ Parse the EFI_LOAD_OPTION stored in a Boot#### variable.
+
+        :param str data: the contents of the variable, without the attributes
+        :returns: a (label, partition, loader) tuple, where partition is the
+                  (number, start, size, signature) of the hard drive node of
+                  the device path and loader is the path of the file node.
+                  Both are None if the device path doesn't have the node.
+        :raises: ValueError if the data can't be parsed
+    """
+    try:
+        (_attributes, path_length) = struct.unpack_from("<IH", data)
+    except struct.error as e:
+        raise ValueError(str(e))
+
+    end = 6
+    while end + 1 < len(data) and data[end:end + 2] != "\0\0":
+        end += 2
+    if end + 1 >= len(data):
+        raise ValueError("unterminated description")
+
+    label = data[6:end].decode("utf-16-le")
+    device_path = data[end + 2:end + 2 + path_length]
+
+    partition = None
+    loader = None
+    pos = 0
+    while pos + 4 <= len(device_path):
+        (node_type, subtype, length) = struct.unpack_from("<BBH", device_path, pos)
+        if node_type == END_DEVICE_PATH_TYPE or length < 4:
+            break
+
+        node = device_path[pos + 4:pos + length]
+        if node_type == MEDIA_DEVICE_PATH:
+            if subtype == MEDIA_HARDDRIVE_DP and len(node) >= 38:
+                (number, start, size, signature, _mbr_type, signature_type) = \
+                        struct.unpack_from("<IQQ16sBB", node)
+                partition = (number, start, size,
+                             parse_signature(signature, signature_type))
+            elif subtype == MEDIA_FILEPATH_DP:
+                loader = node.decode("utf-16-le").rstrip("\0")
+
+        pos += length
+
+    return (label, partition, loader)
+
+class EFIBootManager(object):
+    """ Update the firmware boot entries with as few variable writes as
+        possible.
+
+        The Boot#### and BootOrder variables are read once from efivarfs.
+        Entries that already boot the wanted loader are kept, and the
+        changes are applied with efibootmgr only where the firmware state
+        differs from the wanted one. Writing a firmware variable can take
+        hundreds of milliseconds.
+    """
+    def __init__(self, efibootmgr, efivars_dir=EFIVARS_DIR):
+        """ Create a new manager.
+
+            :param efibootmgr: function running efibootmgr with the given
+                               arguments and returning its exit code
+            :param str efivars_dir: where efivarfs is mounted
+        """
+        self.efibootmgr = efibootmgr
+        self.efivars_dir = efivars_dir
+        self.entries = {}
+        self.boot_order = []
+
+    @property
+    def available(self):
+        """ Whether the firmware variables can be read. """
+        return os.path.isdir(self.efivars_dir)
+
+    def _read_variable(self, name):
+        path = "%s/%s-%s" % (self.efivars_dir, name, EFI_GLOBAL_GUID)
+        with open(path, "rb") as f:
+            # the first four bytes are the attributes of the variable
+            return f.read()[4:]
+
+    def read(self):
+        """ Read the boot entries and the boot order. """
+        self.entries = {}
+        self.boot_order = []
+
+        suffix = "-" + EFI_GLOBAL_GUID
+        for filename in os.listdir(self.efivars_dir):
+            if not filename.endswith(suffix):
+                continue
+
+            name = filename[:-len(suffix)]
+            if name == "BootOrder":
+                data = self._read_variable(name)
+                count = len(data) // 2
+                self.boot_order = ["%04X" % n for n in struct.unpack("<%dH" % count, data[:count * 2])]
+            elif re.match("^Boot[0-9A-Fa-f]{4}$", name):
+                slot = name[4:].upper()
+                try:
+                    (label, partition, loader) = parse_load_option(self._read_variable(name))
+                except (IOError, ValueError) as e:
+                    log.warning("failed to parse efi boot entry %s: %s", slot, e)
+                    continue
+
+                self.entries[slot] = EFIBootEntry(slot, label, partition, loader)
+
+    def _run(self, *args):
+        rc = self.efibootmgr(*args)
+        if rc:
+            raise EFIBootError("efibootmgr %s failed. This is most likely a "
+                               "kernel or firmware bug." % " ".join(args))
+
+    def _find(self, label, partition, loader):
+        for slot in sorted(self.entries):
+            if self.entries[slot].matches(label, partition, loader):
+                return slot
+
+        return None
+
+    def update(self, label, targets, keep_others=False):
+        """ Make the boot entries with the label boot the targets.
+
+            :param str label: description of the boot entries
+            :param targets: list of (disk path, partition, loader) tuples,
+                            where partition is the (number, start, size,
+                            signature) of the partition, see
+                            partition_signature
+            :param bool keep_others: keep the entries with the label that
+                                     don't boot one of the targets and leave
+                                     the boot order alone, new entries are
+                                     put at its end
+        """
+        found = [self._find(label, partition, loader)
+                 for (_disk, partition, loader) in targets]
+        boot_order = self.boot_order[:]
+        existing = set(self.entries)
+        if not keep_others:
+            for slot in sorted(self.entries):
+                if self.entries[slot].label == label and slot not in found:
+                    log.info("removing efi boot entry %s", slot)
+                    self._run("-b", slot, "-B")
+                    del self.entries[slot]
+                    if slot in self.boot_order:
+                        self.boot_order.remove(slot)
+
+        created = False
+        for (disk, partition, loader) in targets:
+            if self._find(label, partition, loader):
+                continue
+
+            log.info("adding efi boot entry for %s partition %d", disk, partition[0])
+            self._run("-c", "-w", "-L", label, "-d", disk,
+                      "-p", str(partition[0]), "-l", loader)
+            created = True
+
+        # efibootmgr puts the new entries first, the entries we kept may
+        # need to be moved there too
+        if created:
+            self.read()
+
+        slots = []
+        for (_disk, partition, loader) in targets:
+            slot = self._find(label, partition, loader)
+            if slot and slot not in slots:
+                slots.append(slot)
+
+        if keep_others:
+            # restore the original order, only adding the new entries
+            order = boot_order + [s for s in slots if s not in existing]
+        else:
+            order = slots + [s for s in self.boot_order if s not in slots]
+        if order != self.boot_order:
+            log.info("setting efi boot order to %s", ",".join(order))
+            self._run("-o", ",".join(order))
+            self.boot_order = order
@@ -71,6 +71,10 @@ class Flags(object):
         self.ksprompt = True
         self.rescue_mode = False
         self.noefi = False
+        # run commands in the target root through a persistent helper process
+        self.sysrootexec = False
+        # let grub2-mkconfig run os-prober instead of using the storage scan
+        self.osprober = False
         # parse the boot commandline
         self.cmdline = BootArgs()
         # Lock it down: no more creating new flags!
@@ -80,7 +84,7 @@ class Flags(object):
 
     def read_cmdline(self):
         for f in ("selinux", "debug", "leavebootorder", "testing", "extlinux",
-                  "nombr", "gpt", "dnf", "noefi"):
+                  "nombr", "gpt", "dnf", "noefi", "sysrootexec", "osprober"):
             self.set_cmdline_bool(f)
 
         if not selinux.is_selinux_enabled():
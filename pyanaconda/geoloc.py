@@ -39,6 +39,8 @@ This module currently supports three geolocation backends:
 * Hostip GeoIP
 * Google WiFi
 
+and a composite backend running the GeoIP backends at once.
+
 Fedora GeoIP backend
 This is the default backend. It queries the Fedora GeoIP API for location
 data based on current public IP address. The reply is JSON formated and
@@ -55,6 +57,16 @@ GeoIP results from Hostip contain the current public IP and an approximate
 address. To get this detail location info, use the get_result() method
 to get an instance of the LocationResult class, used to wrap the result.
 
+Composite backend
+Queries the Fedora GeoIP API, Hostip and optionally a GeoIP service with
+a Fedora GeoIP API compatible reply at an URL given by the geoloc-url option,
+all at the same time. The first result with a territory code is used and the
+other lookups are cancelled, so a slow or unavailable service doesn't delay
+the result. The last result is stored in a file together with the public IP
+address it was found for. When a service reports the same public IP address
+on the next run but no time zone (like Hostip), the time zone is taken from
+the stored result.
+
 Google WiFi backend
 This backend is probably the most accurate one, at least as long as the
 computer has a working WiFi hardware and there are some WiFi APs nearby.
@@ -104,6 +116,9 @@ import urllib
 import dbus
 import threading
 import time
+import json
+import re
+import Queue
 from pyanaconda import network
 
 import logging
@@ -118,8 +133,11 @@ location_info_instance = None
 refresh_condition = threading.Condition()
 refresh_in_progress = False
 
+# codes GeoIP services use for unknown or non-geographic locations
+NON_TERRITORY_CODES = {"XX", "ZZ", "EU", "AP", "A1", "A2", "O1"}
+
 
-def init_geolocation(provider_id=constants.GEOLOC_DEFAULT_PROVIDER):
+def init_geolocation(provider_id=constants.GEOLOC_DEFAULT_PROVIDER, local_url=None):
     """Prepare the geolocation module for handling geolocation queries.
     This method sets-up the GeoLocation instance with the given
     geolocation_provider (or using the default one if no provider
@@ -128,10 +146,12 @@ def init_geolocation(provider_id=constants.GEOLOC_DEFAULT_PROVIDER):
     to do that.
 
     :param provider_id: specifies what geolocation backend to use
+    :param local_url: URL of an additional GeoIP service used by the composite
+                      backend
     """
 
     global location_info_instance
-    location_info_instance = LocationInfo(provider_id=provider_id)
+    location_info_instance = LocationInfo(provider_id=provider_id, local_url=local_url)
 
 
 def refresh():
@@ -222,7 +242,8 @@ def get_provider_id_from_option(option_string):
 
     providers = {
         constants.GEOLOC_PROVIDER_FEDORA_GEOIP,
-        constants.GEOLOC_PROVIDER_HOSTIP
+        constants.GEOLOC_PROVIDER_HOSTIP,
+        constants.GEOLOC_PROVIDER_COMPOSITE
     }
     if option_string in providers:
         return option_string
@@ -231,14 +252,33 @@ def get_provider_id_from_option(option_string):
         return None
 
 
-def _get_provider(provider_id):
+def is_valid_territory_code(territory_code):
+    """Check if the territory code is a two letter code of a real territory
+
+    :param territory_code: territory code returned by a GeoIP service
+    :type territory_code: string or None
+    :rtype: bool
+    """
+    return bool(territory_code and re.match(r"^[A-Z]{2}$", territory_code)
+                and territory_code not in NON_TERRITORY_CODES)
+
+
+def _get_provider(provider_id, local_url=None):
     """Return GeoIP provider instance based on the provider id
     If the provider id is unknown, return the default provider.
 
+    :param local_url: URL of an additional GeoIP service used by the composite
+                      backend
     :return: GeolocationBackend subclass instance
     :rtype: GeolocationBackend subclass
     """
 
+    if provider_id == constants.GEOLOC_PROVIDER_COMPOSITE:
+        backends = [FedoraGeoIPProvider(), HostipGeoIPProvider()]
+        if local_url:
+            backends.append(FedoraGeoIPProvider(api_url=local_url))
+        return CompositeGeoIPProvider(backends)
+
     providers = {
         constants.GEOLOC_PROVIDER_FEDORA_GEOIP: FedoraGeoIPProvider,
         constants.GEOLOC_PROVIDER_HOSTIP: HostipGeoIPProvider,
@@ -309,14 +349,17 @@ class LocationInfo(object):
 
     def __init__(self,
                  provider_id=constants.GEOLOC_DEFAULT_PROVIDER,
-                 refresh_now=False):
+                 refresh_now=False,
+                 local_url=None):
         """
         :param provider_id: GeoIP provider id specified by module constant
         :param refresh_now: if a GeoIP information refresh should be done
         once the class is initialized
         :type refresh_now: bool
+        :param local_url: URL of an additional GeoIP service used by the
+                          composite backend
         """
-        self._provider = _get_provider(provider_id)
+        self._provider = _get_provider(provider_id, local_url)
         if refresh_now:
             self.refresh()
 
@@ -414,6 +457,10 @@ class LocationResult(object):
     def timezone(self):
         return self._timezone
 
+    @property
+    def timezone_source(self):
+        return self._timezone_source
+
     @property
     def public_ip_address(self):
         return self._public_ip_address
@@ -444,6 +491,7 @@ class GeolocationBackend(object):
     def __init__(self):
         self._result = None
         self._result_lock = threading.Lock()
+        self._cancelled = threading.Event()
 
     def get_name(self):
         """Get name of the backend
@@ -486,6 +534,29 @@ class GeolocationBackend(object):
     def _refresh(self):
         pass
 
+    def lookup(self):
+        """Do a lookup in the calling thread and return its result
+
+        Unlike refresh(), this doesn't make the callers of get_result(wait)
+        wait for the lookup.
+
+        :return: geolocation lookup result or None
+        :rtype: LocationResult
+        """
+        self._refresh()
+        return self.get_result()
+
+    def reset(self):
+        """Forget the result and the cancellation of the previous lookup
+
+        This has to be called before a new lookup is started, not by the
+        lookup itself, so that a cancel() done before the lookup starts
+        running isn't lost.
+        """
+        with self._result_lock:
+            self._result = None
+            self._cancelled.clear()
+
     def _set_result(self, result):
         """Set current location
 
@@ -495,7 +566,12 @@ class GeolocationBackend(object):
         # As the value is set from a thread but read from
         # the main thread, use a lock when accessing it
         with self._result_lock:
-            self._result = result
+            if not self._cancelled.is_set():
+                self._result = result
+
+    def cancel(self):
+        """Don't use the result of a lookup in progress"""
+        self._cancelled.set()
 
     def get_result(self):
         """Get current location
@@ -515,15 +591,22 @@ class FedoraGeoIPProvider(GeolocationBackend):
 
     API_URL = "https://geoip.fedoraproject.org/city"
 
-    def __init__(self):
+    def __init__(self, api_url=None):
+        """
+        :param api_url: URL of a service with a compatible reply to use
+                        instead of the Fedora GeoIP API
+        """
         GeolocationBackend.__init__(self)
+        self._api_url = api_url or self.API_URL
 
     def get_name(self):
+        if self._api_url != self.API_URL:
+            return "GeoIP at %s" % self._api_url
         return "Fedora GeoIP"
 
     def _refresh(self):
         try:
-            reply = requests.get(self.API_URL, timeout=constants.NETWORK_CONNECTION_TIMEOUT, verify=True)
+            reply = requests.get(self._api_url, timeout=constants.NETWORK_CONNECTION_TIMEOUT, verify=True)
             if reply.status_code == requests.codes.ok:
                 json_reply = reply.json()
                 territory = json_reply.get("country_code", None)
@@ -545,7 +628,8 @@ class FedoraGeoIPProvider(GeolocationBackend):
                     self._set_result(LocationResult(
                         territory_code=territory,
                         timezone=timezone_code,
-                        timezone_source=timezone_source))
+                        timezone_source=timezone_source,
+                        public_ip_address=json_reply.get("ip", None)))
             else:
                 log.error("Geoloc: Fedora GeoIP API lookup failed with status code: %s", reply.status_code)
         except requests.exceptions.RequestException as e:
@@ -589,6 +673,105 @@ class HostipGeoIPProvider(GeolocationBackend):
 
 
 
+class CompositeGeoIPProvider(GeolocationBackend):
+    """Runs several GeoIP providers at once and uses the first result"""
+
+    def __init__(self, providers, cache_file=constants.GEOLOC_CACHE_FILE):
+        """
+        :param providers: GeolocationBackend instances to run
+        :param cache_file: where the last result is stored
+        """
+        GeolocationBackend.__init__(self)
+        self._providers = providers
+        self._cache_file = cache_file
+
+    def get_name(self):
+        return "first of %s" % ", ".join(p.get_name() for p in self._providers)
+
+    def _refresh(self):
+        cached = self._read_cache()
+        results = Queue.Queue()
+        for provider in self._providers:
+            provider.reset()
+
+        for provider in self._providers:
+            threadMgr.add(AnacondaThread(prefix=constants.THREAD_GEOLOCATION_PROVIDER_PREFIX,
+                                         target=self._run_provider,
+                                         args=(provider, results)))
+
+        deadline = time.time() + constants.NETWORK_CONNECTION_TIMEOUT
+        for _i in range(len(self._providers)):
+            try:
+                (provider, result) = results.get(timeout=max(deadline - time.time(), 0))
+            except Queue.Empty:
+                break
+
+            if result is None:
+                continue
+            elif not is_valid_territory_code(result.territory_code):
+                log.debug("Geoloc: ignoring territory code %s from %s",
+                          result.territory_code, provider.get_name())
+                continue
+
+            result = self._complete_result(result, cached)
+            log.info("Geoloc: using the result of %s", provider.get_name())
+            self._set_result(result)
+            self._write_cache(result)
+            break
+
+        for provider in self._providers:
+            provider.cancel()
+
+    @staticmethod
+    def _run_provider(provider, results):
+        results.put((provider, provider.lookup()))
+
+    def _complete_result(self, result, cached):
+        """Fill in the time zone the provider didn't find
+
+        Use the time zone stored for the same public IP address or the
+        preferred time zone of the territory.
+        """
+        if result is None or result.timezone or not result.territory_code:
+            return result
+
+        ip_address = result.public_ip_address
+        territory = result.territory_code
+        if cached and ip_address and cached.get("ip") == ip_address \
+                and cached.get("territory") == territory and cached.get("timezone"):
+            timezone = cached["timezone"]
+            source = "cache"
+        else:
+            timezone = get_preferred_timezone(territory)
+            source = "territory code"
+
+        return LocationResult(territory_code=territory,
+                              timezone=timezone,
+                              timezone_source=source,
+                              public_ip_address=ip_address,
+                              city=result.city)
+
+    def _read_cache(self):
+        try:
+            with open(self._cache_file) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _write_cache(self, result):
+        if not result.public_ip_address:
+            return
+
+        cached = {"ip": result.public_ip_address,
+                  "territory": result.territory_code,
+                  "timezone": result.timezone}
+        try:
+            with open(self._cache_file, "w") as f:
+                json.dump(cached, f)
+        except IOError as e:
+            log.debug("Geoloc: can't store the result: %s", e)
+
+
 class GoogleWiFiLocationProvider(GeolocationBackend):
     """The Google WiFi location service provider"""
 
@@ -75,38 +75,49 @@ def doConfiguration(storage, payload, ksdata, instClass):
 
     progress_init(step_count)
 
-    # Now run the execute methods of ksdata that require an installed system
-    # to be present first.
-    with progress_report(_("Configuring installed system")):
-        ksdata.authconfig.execute(storage, ksdata, instClass)
-        ksdata.selinux.execute(storage, ksdata, instClass)
-        ksdata.firstboot.execute(storage, ksdata, instClass)
-        ksdata.services.execute(storage, ksdata, instClass)
-        ksdata.keyboard.execute(storage, ksdata, instClass)
-        ksdata.timezone.execute(storage, ksdata, instClass)
-        ksdata.lang.execute(storage, ksdata, instClass)
-        ksdata.firewall.execute(storage, ksdata, instClass)
-        ksdata.xconfig.execute(storage, ksdata, instClass)
-        ksdata.skipx.execute(storage, ksdata, instClass)
-
-    if willWriteNetwork:
-        with progress_report(_("Writing network configuration")):
-            ksdata.network.execute(storage, ksdata, instClass)
-
-    # Creating users and groups requires some pre-configuration.
-    with progress_report(_("Creating users")):
-        createLuserConf(iutil.getSysroot(), algoname=getPassAlgo(ksdata.authconfig.authconfig))
-        u = Users()
-        ksdata.rootpw.execute(storage, ksdata, instClass, u)
-        ksdata.group.execute(storage, ksdata, instClass, u)
-        ksdata.user.execute(storage, ksdata, instClass, u)
-        ksdata.sshkey.execute(storage, ksdata, instClass, u)
-
-    with progress_report(_("Configuring addons")):
-        ksdata.addons.execute(storage, ksdata, instClass, u)
-
-    with progress_report(_("Generating initramfs")):
-        payload.recreateInitrds()
+    # Most of the configuration steps run commands in the target root, let
+    # them share one chrooted helper process if requested. The helper exits
+    # on its own if anaconda goes away.
+    if flags.flags.sysrootexec:
+        iutil.startSysrootExecServer()
+
+    try:
+        # Now run the execute methods of ksdata that require an installed system
+        # to be present first.
+        with progress_report(_("Configuring installed system")):
+            ksdata.authconfig.execute(storage, ksdata, instClass)
+            ksdata.selinux.execute(storage, ksdata, instClass)
+            ksdata.firstboot.execute(storage, ksdata, instClass)
+            ksdata.services.execute(storage, ksdata, instClass)
+            ksdata.keyboard.execute(storage, ksdata, instClass)
+            ksdata.timezone.execute(storage, ksdata, instClass)
+            ksdata.lang.execute(storage, ksdata, instClass)
+            ksdata.firewall.execute(storage, ksdata, instClass)
+            ksdata.xconfig.execute(storage, ksdata, instClass)
+            ksdata.skipx.execute(storage, ksdata, instClass)
+
+        if willWriteNetwork:
+            with progress_report(_("Writing network configuration")):
+                ksdata.network.execute(storage, ksdata, instClass)
+
+        # Creating users and groups requires some pre-configuration.
+        with progress_report(_("Creating users")):
+            createLuserConf(iutil.getSysroot(), algoname=getPassAlgo(ksdata.authconfig.authconfig))
+            u = Users()
+            ksdata.rootpw.execute(storage, ksdata, instClass, u)
+            ksdata.group.execute(storage, ksdata, instClass, u)
+            ksdata.user.execute(storage, ksdata, instClass, u)
+            ksdata.sshkey.execute(storage, ksdata, instClass, u)
+
+        with progress_report(_("Configuring addons")):
+            ksdata.addons.execute(storage, ksdata, instClass, u)
+
+        with progress_report(_("Generating initramfs")):
+            payload.recreateInitrds()
+    finally:
+        # the helper keeps its working directory in the sysroot, it has to be
+        # gone before the sysroot can be unmounted
+        iutil.stopSysrootExecServer()
 
     # Work around rhbz#1200539, grubby doesn't handle grub2 missing initrd with /boot on btrfs
     # So rerun writing the bootloader if this is live and /boot is on btrfs
@@ -22,6 +22,7 @@
 
 import glob
 import os
+import sys
 import stat
 import os.path
 import errno
@@ -35,6 +36,11 @@ import re
 from urllib import quote, unquote
 import gettext
 import signal
+import socket
+import struct
+import threading
+import cPickle as pickle
+from multiprocessing.pool import ThreadPool
 
 from gi.repository import GLib
 
@@ -50,6 +56,18 @@ program_log = logging.getLogger("program")
 
 from pyanaconda.anaconda_log import program_log_lock
 
+# scandir returns the type of the entries along with their names, which saves
+# a stat call per entry when walking directory trees. Python 2 needs the
+# backport (python-scandir), the walk falls back to listdir and lstat without
+# it.
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
 _child_env = {}
 
 def setenv(name, value):
@@ -115,6 +133,12 @@ def setSysroot(path):
     global _sysroot
     _sysroot = path
 
+def _reset_ignored_signals():
+    """ Reset to SIG_DFL any signal handlers set to SIG_IGN. """
+    for signum in range(1, signal.NSIG):
+        if signal.getsignal(signum) == signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+
 def startProgram(argv, root='/', stdin=None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
         env_prune=None, env_add=None, reset_handlers=True, reset_lang=True, **kwargs):
     """ Start an external program and return the Popen object.
@@ -158,9 +182,7 @@ def startProgram(argv, root='/', stdin=None, stdout=subprocess.PIPE, stderr=subp
         # these to SIG_DFL if requested. In particular this will include the
         # SIGPIPE handler set by python.
         if reset_handlers:
-            for signum in range(1, signal.NSIG):
-                if signal.getsignal(signum) == signal.SIG_IGN:
-                    signal.signal(signum, signal.SIG_DFL)
+            _reset_ignored_signals()
 
         # If the user specified an additional preexec_fn argument, run it
         if preexec_fn is not None:
@@ -305,6 +327,29 @@ def execInSysroot(command, argv, stdin=None):
 
     return execWithRedirect(command, argv, stdin=stdin, root=getSysroot())
 
+def execInSysrootBatch(commands):
+    """ Run several external programs in the target root.
+
+        If the sysroot exec server is running, all of the commands are handed
+        to it in a single request, saving a fork and chroot per command.
+        Otherwise they are run one by one with execInSysroot. The output is
+        logged in both cases.
+
+        :param commands: list of (command, argv) tuples to run in order
+        :return: list of the return codes of the commands
+    """
+    if flags.testing:
+        for (command, argv) in commands:
+            log.info("not running command because we're testing: %s %s",
+                     command, " ".join(argv))
+        return [0] * len(commands)
+
+    server = _sysroot_exec_server
+    if server and server.running and server.root == getSysroot():
+        return server.run([[command] + argv for (command, argv) in commands])
+
+    return [execInSysroot(command, argv) for (command, argv) in commands]
+
 def execWithRedirect(command, argv, stdin=None, stdout=None,
                      root='/', env_prune=None, log_output=True, binary_output=False):
     """ Run an external program and redirect the output to a file.
@@ -424,6 +469,219 @@ def execConsole():
     except OSError as e:
         raise RuntimeError("Error running /bin/sh: " + e.strerror)
 
+def _send_message(sock, message):
+    """ Send a length-prefixed pickled message over a socket. """
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+def _recv_exactly(sock, size):
+    """ Read exactly size bytes from a socket, or None on EOF. """
+    chunks = []
+    while size > 0:
+        chunk = eintr_retry_call(sock.recv, size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+def _recv_message(sock):
+    """ Receive a message sent with _send_message, or None on EOF. """
+    header = _recv_exactly(sock, struct.calcsize("!I"))
+    if header is None:
+        return None
+
+    data = _recv_exactly(sock, struct.unpack("!I", header)[0])
+    if data is None:
+        return None
+
+    return pickle.loads(data)
+
+SYSROOT_EXEC_HELPER = "/usr/libexec/anaconda/anaconda-sysroot-exec"
+
+class SysrootExecServer(object):
+    """ A long-lived helper process chrooted into the target root.
+
+        The helper is started once and chroots once, and then runs batches of
+        commands sent to it over a socket. Output of the commands is streamed
+        back line by line and logged to program.log the same way
+        execWithRedirect does, followed by the return code of each command.
+
+        Commands needing stdin or their output returned should still use the
+        exec* functions.
+    """
+
+    def __init__(self, root, helper=SYSROOT_EXEC_HELPER):
+        """
+        :param str root: The directory the helper process chroots to
+        :param str helper: The script running the helper process
+        """
+        self.root = root
+        self.helper = helper
+        self._proc = None
+        self._sock = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._proc is not None
+
+    def start(self):
+        """ Start the helper process. """
+        if self.running:
+            return
+
+        # The helper is a separate program rather than a fork of this
+        # (threaded) process, which could inherit locks held by other threads.
+        # It gets its end of the socket as stdin.
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            proc = subprocess.Popen([sys.executable, self.helper, self.root],
+                                    stdin=child_sock.fileno(), close_fds=True,
+                                    preexec_fn=_reset_ignored_signals)
+        except OSError:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+
+        self._sock = parent_sock
+        self._proc = proc
+        log.debug("started sysroot exec server (pid %d) in %s", proc.pid, self.root)
+
+    def stop(self):
+        """ Make the helper process exit and reap it. """
+        with self._lock:
+            self._reap()
+
+    def _reap(self):
+        """ Close the socket, wait for the helper process to exit and mark the
+            server as not running. Must be called with self._lock held.
+        """
+        if not self.running:
+            return
+
+        # Closing our end of the socket makes the helper exit its loop
+        self._sock.close()
+        self._proc.wait()
+        log.debug("stopped sysroot exec server (pid %d)", self._proc.pid)
+        self._sock = None
+        self._proc = None
+
+    def run(self, commands):
+        """ Run a batch of commands in the helper process.
+
+            If the helper process exits, the server is stopped and the batch
+            fails with EPIPE.
+
+            :param commands: list of argv lists to run in order
+            :return: list of the return codes of the commands
+            :raise OSError: if a command could not be started, the
+                            following commands are not run
+        """
+        env = augmentEnv()
+        env.update({"LC_ALL": "C"})
+
+        with self._lock:
+            if not self.running:
+                raise OSError(errno.EPIPE, "sysroot exec server is not running")
+
+            try:
+                _send_message(self._sock, {"commands": commands, "env": env})
+            except socket.error as e:
+                log.error("sysroot exec server exited unexpectedly: %s", e)
+                self._reap()
+                raise OSError(errno.EPIPE, "sysroot exec server exited unexpectedly")
+
+            returncodes = []
+            for argv in commands:
+                with program_log_lock:
+                    program_log.info("Running... %s", " ".join(argv))
+
+                while True:
+                    message = _recv_message(self._sock)
+                    if message is None:
+                        log.error("sysroot exec server exited unexpectedly")
+                        self._reap()
+                        raise OSError(errno.EPIPE, "sysroot exec server exited unexpectedly")
+
+                    kind, value = message
+                    if kind == "output":
+                        with program_log_lock:
+                            program_log.info(value.strip())
+                    elif kind == "error":
+                        with program_log_lock:
+                            program_log.error("Error running %s: %s", argv[0], value[1])
+                        raise OSError(*value)
+                    else:
+                        with program_log_lock:
+                            program_log.debug("Return code: %d", value)
+                        returncodes.append(value)
+                        break
+
+        return returncodes
+
+def serveSysrootExec(sock, root):
+    """ The main loop of the sysroot exec server's helper process.
+
+        :param sock: the socket to read the requests from
+        :param str root: The directory to chroot to
+    """
+    if root and root != "/":
+        os.chroot(root)
+    os.chdir("/")
+
+    while True:
+        request = _recv_message(sock)
+        if request is None:
+            return
+
+        for argv in request["commands"]:
+            try:
+                proc = subprocess.Popen(argv, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        close_fds=True, cwd="/",
+                                        env=request["env"],
+                                        preexec_fn=_reset_ignored_signals)
+            except OSError as e:
+                _send_message(sock, ("error", (e.errno, e.strerror)))
+                break
+
+            for line in iter(proc.stdout.readline, ""):
+                _send_message(sock, ("output", line))
+
+            eintr_retry_call(proc.wait)
+            _send_message(sock, ("exit", proc.returncode))
+
+_sysroot_exec_server = None
+
+def startSysrootExecServer():
+    """ Start the sysroot exec server used by execInSysrootBatch.
+
+        The server is chrooted into the current sysroot, so this needs to be
+        called after the target filesystems are mounted.
+    """
+    global _sysroot_exec_server
+
+    if flags.testing:
+        return
+
+    if _sysroot_exec_server and _sysroot_exec_server.running:
+        if _sysroot_exec_server.root == getSysroot():
+            return
+        _sysroot_exec_server.stop()
+
+    _sysroot_exec_server = SysrootExecServer(getSysroot())
+    _sysroot_exec_server.start()
+
+def stopSysrootExecServer():
+    """ Stop the sysroot exec server if it is running. """
+    global _sysroot_exec_server
+
+    if _sysroot_exec_server:
+        _sysroot_exec_server.stop()
+        _sysroot_exec_server = None
+
 # Dictionary of processes to watch in the form {pid: [name, GLib event source id], ...}
 _forever_pids = {}
 # Set to True if process watching is handled by GLib
@@ -567,44 +825,23 @@ def unwatchAllProcesses():
             GLib.source_remove(_forever_pids[child_pid][1])
     _forever_pids = {}
 
-def getDirSize(directory):
+def getDirSize(directory, workers=None):
     """ Get the size of a directory and all its subdirectories.
+
+    Mount points and directories on other filesystems are not included.
+
     :param dir: The name of the directory to find the size of.
+    :param int workers: number of threads walking the subdirectories
     :return: The size of the directory in kilobytes.
     """
-    def getSubdirSize(directory):
+    def entry_size(entry):
         # returns size in bytes
-        try:
-            mydev = os.lstat(directory)[stat.ST_DEV]
-        except OSError as e:
-            log.debug("failed to stat %s: %s", directory, e)
-            return 0
-
-        try:
-            dirlist = os.listdir(directory)
-        except OSError as e:
-            log.debug("failed to listdir %s: %s", directory, e)
-            return 0
-
-        dsize = 0
-        for f in dirlist:
-            curpath = '%s/%s' % (directory, f)
-            try:
-                sinfo = os.lstat(curpath)
-            except OSError as e:
-                log.debug("failed to stat %s/%s: %s", directory, f, e)
-                continue
-
-            if stat.S_ISDIR(sinfo[stat.ST_MODE]):
-                if os.path.ismount(curpath):
-                    continue
-                if mydev == sinfo[stat.ST_DEV]:
-                    dsize += getSubdirSize(curpath)
-            elif stat.S_ISREG(sinfo[stat.ST_MODE]):
-                dsize += sinfo[stat.ST_SIZE]
+        if entry.is_file(follow_symlinks=False):
+            return entry.stat(follow_symlinks=False).st_size
+        return 0
 
-        return dsize
-    return getSubdirSize(directory)/1024
+    return walk_dir_tree(directory, entry_size, one_file_system=True,
+                         workers=workers or DIR_TREE_WORKERS)/1024
 
 ## Create a directory path.  Don't fail if the directory already exists.
 def mkdirChain(directory):
@@ -943,7 +1180,159 @@ def cmp_obj_attrs(obj1, obj2, attr_list):
             return False
     return True
 
-def dir_tree_map(root, func, files=True, dirs=True):
+# Number of threads used to walk the subdirectories of big directory trees
+DIR_TREE_WORKERS = 4
+
+class _PathEntry(object):
+    """ A minimal version of scandir's DirEntry for a given path.
+
+        Used for the root of a walked tree and for all entries if scandir is
+        not available. The results of stat calls are cached the same way
+        DirEntry caches them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = None
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks:
+            if self._stat is None:
+                self._stat = os.stat(self.path)
+            return self._stat
+        else:
+            if self._lstat is None:
+                self._lstat = os.lstat(self.path)
+            return self._lstat
+
+    def _test_mode(self, test, follow_symlinks=True):
+        try:
+            return test(self.stat(follow_symlinks=follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_dir(self, follow_symlinks=True):
+        return self._test_mode(stat.S_ISDIR, follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._test_mode(stat.S_ISREG, follow_symlinks)
+
+    def is_symlink(self):
+        return self._test_mode(stat.S_ISLNK, follow_symlinks=False)
+
+def _list_dir(path):
+    """ List the entries of a directory as DirEntry-like objects. """
+    if _scandir:
+        return list(_scandir(path))
+    else:
+        return [_PathEntry(os.path.join(path, name)) for name in os.listdir(path)]
+
+def _visit_entry(func, entry):
+    try:
+        return func(entry) or 0
+    except OSError as e:
+        log.debug("failed to process %s: %s", entry.path, e)
+        return 0
+
+def _descend_into(entry, parent_stat, one_file_system):
+    """ Whether a directory tree walk should continue into the given entry. """
+    try:
+        # never follow symlinks to directories, like os.walk
+        if not entry.is_dir(follow_symlinks=False):
+            return False
+
+        if one_file_system:
+            # a directory on another device or a bind mount, same
+            # checks as os.path.ismount does
+            entry_stat = entry.stat(follow_symlinks=False)
+            if entry_stat.st_dev != parent_stat.st_dev or \
+                    entry_stat.st_ino == parent_stat.st_ino:
+                return False
+    except OSError:
+        return False
+
+    return True
+
+def _walk_subtree(top, func, one_file_system):
+    """ Apply func to everything under the top entry (but not to the top
+        entry itself) and return the sum of the results.
+    """
+    total = 0
+    pending = [top]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = _list_dir(directory.path)
+            dir_stat = directory.stat(follow_symlinks=False) if one_file_system else None
+        except OSError as e:
+            log.debug("failed to list %s: %s", directory.path, e)
+            continue
+
+        for entry in entries:
+            total += _visit_entry(func, entry)
+            if _descend_into(entry, dir_stat, one_file_system):
+                pending.append(entry)
+
+    return total
+
+def walk_dir_tree(root, func, one_file_system=False, workers=1):
+    """
+    Apply the given function to the root directory and everything under it.
+
+    The function gets DirEntry-like objects (see os.scandir) with the path,
+    the name and usually the type of the entries, so telling files from
+    directories doesn't need a stat call. The stat information is not
+    prefetched, DirEntry.stat() makes the call on the first use and caches
+    the result. Symlinks are not followed and
+    OSErrors raised by the function are ignored. Subdirectories of the root
+    are walked in parallel if more workers are requested.
+
+    :param root: root of the directory tree to walk
+    :type root: str
+    :param func: a function taking the entry and returning a number or None
+    :type func: DirEntry -> int or None
+    :param one_file_system: whether to skip mount points and directories on
+                            other filesystems
+    :type one_file_system: bool
+    :param workers: number of threads walking the subdirectories of the root
+    :type workers: int
+    :return: the sum of the values returned by the function, 0 if the root
+             is not a directory that can be listed
+    :rtype: int
+
+    """
+
+    root_entry = _PathEntry(root)
+    try:
+        entries = _list_dir(root)
+        root_stat = root_entry.stat(follow_symlinks=False) if one_file_system else None
+    except OSError as e:
+        log.debug("failed to list %s: %s", root, e)
+        return 0
+
+    total = _visit_entry(func, root_entry)
+    subdirs = []
+    for entry in entries:
+        total += _visit_entry(func, entry)
+        if _descend_into(entry, root_stat, one_file_system):
+            subdirs.append(entry)
+
+    walk = lambda entry: _walk_subtree(entry, func, one_file_system)
+    if workers > 1 and len(subdirs) > 1:
+        pool = ThreadPool(min(workers, len(subdirs)))
+        try:
+            total += sum(pool.imap_unordered(walk, subdirs))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        total += sum(walk(entry) for entry in subdirs)
+
+    return total
+
+def dir_tree_map(root, func, files=True, dirs=True, workers=1):
     """
     Apply the given function to all files and directories in the directory tree
     under the given root directory.
@@ -956,31 +1345,29 @@ def dir_tree_map(root, func, files=True, dirs=True):
     :type files: bool
     :param dirs: whether to apply the function to the directories in the dir. tree
     :type dirs: bool
+    :param workers: number of threads walking the subdirectories of the root
+    :type workers: int
 
     TODO: allow using globs and thus more trees?
 
     """
 
-    for (dir_ent, _dir_items, file_items) in os.walk(root):
-        if dirs:
-            # try to call the function on the directory entry
-            try:
-                func(dir_ent)
-            except OSError:
-                pass
+    def apply_func(entry):
+        if entry.is_dir(follow_symlinks=False):
+            if not dirs:
+                return
+        elif entry.is_dir():
+            # symlinks to directories are neither files nor directories
+            # for os.walk that was used here before
+            return
+        elif not files:
+            return
 
-        if files:
-            # try to call the function on the files in the directory entry
-            for file_ent in (os.path.join(dir_ent, f) for f in file_items):
-                try:
-                    func(file_ent)
-                except OSError:
-                    pass
+        func(entry.path)
 
-        # directories under the directory entry will appear as directory entries
-        # in the loop
+    walk_dir_tree(root, apply_func, workers=workers)
 
-def chown_dir_tree(root, uid, gid, from_uid_only=None, from_gid_only=None):
+def chown_dir_tree(root, uid, gid, from_uid_only=None, from_gid_only=None, workers=None):
     """
     Change owner (uid and gid) of the files and directories under the given
     directory tree (recursively).
@@ -997,27 +1384,29 @@ def chown_dir_tree(root, uid, gid, from_uid_only=None, from_gid_only=None):
     :param from_gid_only: if given, the owner is changed only for the files and
                           directories owned by that GID
     :type from_gid_only: int or None
+    :param workers: number of threads walking the subdirectories of the root
+    :type workers: int or None
 
     """
 
-    def conditional_chown(path, uid, gid, from_uid=None, from_gid=None):
-        stats = os.stat(path)
-        if (from_uid and stats.st_uid != from_uid) or \
-                (from_gid and stats.st_gid != from_gid):
-            # owner UID or GID not matching, do nothing
+    def conditional_chown(entry):
+        if entry.is_symlink() and entry.is_dir():
+            # not part of the tree, see dir_tree_map
             return
 
+        if from_uid_only or from_gid_only:
+            # one stat call per entry like before, the walk itself doesn't
+            # stat anything (only with one_file_system)
+            stats = entry.stat()
+            if (from_uid_only and stats.st_uid != from_uid_only) or \
+                    (from_gid_only and stats.st_gid != from_gid_only):
+                # owner UID or GID not matching, do nothing
+                return
+
         # UID and GID matching or not required
-        eintr_retry_call(os.chown, path, uid, gid)
+        eintr_retry_call(os.chown, entry.path, uid, gid)
 
-    if not from_uid_only and not from_gid_only:
-        # the easy way
-        dir_tree_map(root, lambda path: eintr_retry_call(os.chown, path, uid, gid))
-    else:
-        # conditional chown
-        dir_tree_map(root, lambda path: conditional_chown(path, uid, gid,
-                                                          from_uid_only,
-                                                          from_gid_only))
+    walk_dir_tree(root, conditional_chown, workers=workers or DIR_TREE_WORKERS)
 
 def is_unsupported_hw():
     """ Check to see if the hardware is supported or not.
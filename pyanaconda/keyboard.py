@@ -29,11 +29,13 @@ mutually converting X layouts and VConsole keymaps.
 import os
 import re
 import shutil
+import threading
 
 from pyanaconda import iutil
 from pyanaconda import safe_dbus
-from pyanaconda.constants import DEFAULT_VC_FONT, DEFAULT_KEYBOARD
+from pyanaconda.constants import DEFAULT_VC_FONT, DEFAULT_KEYBOARD, THREAD_LOCALED_PREFIX
 from pyanaconda.flags import can_touch_runtime_system
+from pyanaconda.threads import threadMgr, AnacondaThread
 
 from gi.repository import GLib
 
@@ -213,17 +215,18 @@ def write_keyboard_config(keyboard, root, convert=True):
                                         options)
         else:
             try:
-                # just let systemd-localed write out the conf file
-                localed_wrapper.set_layouts(keyboard.x_layouts,
-                                            keyboard.switch_options)
+                # just let systemd-localed write out the conf file, X is
+                # started only after LocaledWrapper.wait_for_layouts()
+                localed_wrapper.set_layouts_async(keyboard.x_layouts,
+                                                  keyboard.switch_options)
             except InvalidLayoutVariantSpec as ilvs:
                 # some weird value appeared as a requested X layout
                 log.error("Failed to write out config file: %s", ilvs)
 
                 # try default
                 keyboard.x_layouts = [DEFAULT_KEYBOARD]
-                localed_wrapper.set_layouts(keyboard.x_layouts,
-                                            keyboard.switch_options)
+                localed_wrapper.set_layouts_async(keyboard.x_layouts,
+                                                  keyboard.switch_options)
 
     if keyboard.vc_keymap:
         try:
@@ -330,8 +333,27 @@ class LocaledWrapper(object):
     Class wrapping systemd-localed daemon functionality. By using safe_dbus
     module it tries to prevent failures related to threads and main loops.
 
+    systemd-localed can only convert keymaps and layouts by changing its
+    configuration, so the results of the conversions are remembered and
+    shared by all instances. Layouts can also be set from a separate thread
+    by set_layouts_async, requests made while a call is in progress are
+    coalesced into one call with the latest values. All the other methods
+    wait for such call to finish first so that they never see an older
+    configuration.
+
     """
 
+    # conversions done by systemd-localed (keymap -> layouts and layout -> keymap)
+    _conversions_lock = threading.Lock()
+    _keymap_conversions = dict()
+    _layout_conversions = dict()
+
+    # arguments for the next asynchronous SetX11Keyboard call and whether
+    # there is a thread doing the calls
+    _async_cond = threading.Condition()
+    _async_pending = None
+    _async_running = False
+
     def __init__(self):
         try:
             self._connection = safe_dbus.get_new_system_connection()
@@ -344,6 +366,7 @@ class LocaledWrapper(object):
 
     @property
     def keymap(self):
+        self.wait_for_layouts()
         try:
             keymap = safe_dbus.get_property_sync(LOCALED_SERVICE,
                                                  LOCALED_OBJECT_PATH,
@@ -361,6 +384,7 @@ class LocaledWrapper(object):
 
     @property
     def layouts_variants(self):
+        self.wait_for_layouts()
         try:
             layouts = safe_dbus.get_property_sync(LOCALED_SERVICE,
                                                   LOCALED_OBJECT_PATH,
@@ -399,6 +423,7 @@ class LocaledWrapper(object):
 
     @property
     def options(self):
+        self.wait_for_layouts()
         try:
             options = safe_dbus.get_property_sync(LOCALED_SERVICE,
                                                   LOCALED_OBJECT_PATH,
@@ -432,6 +457,7 @@ class LocaledWrapper(object):
         # should ask for credentials or not
         args = GLib.Variant('(ssbb)', (keymap, "", convert, False))
 
+        self.wait_for_layouts()
         try:
             safe_dbus.call_sync(LOCALED_SERVICE, LOCALED_OBJECT_PATH, LOCALED_IFACE,
                                 "SetVConsoleKeyboard", args, self._connection)
@@ -451,6 +477,11 @@ class LocaledWrapper(object):
 
         """
 
+        with LocaledWrapper._conversions_lock:
+            converted = LocaledWrapper._keymap_conversions.get(keymap)
+        if converted:
+            return converted
+
         # hack around systemd's lack of functionality -- no function to just
         # convert without changing keyboard configuration
         orig_keymap = self.keymap
@@ -472,7 +503,16 @@ class LocaledWrapper(object):
 
         self.set_keymap(keymap, convert=True)
 
-        return ",".join(self.layouts_variants)
+        converted = ",".join(self.layouts_variants)
+        self._remember_conversion(LocaledWrapper._keymap_conversions, keymap, converted)
+
+        return converted
+
+    def _remember_conversion(self, conversions, value, converted):
+        # empty result means systemd-localed failed, don't keep it
+        if converted:
+            with LocaledWrapper._conversions_lock:
+                conversions[value] = converted
 
     def set_layouts(self, layouts_variants, options=None, convert=False):
         """
@@ -490,6 +530,73 @@ class LocaledWrapper(object):
 
         """
 
+        args = self._get_x11_keyboard_args(layouts_variants, options, convert)
+
+        self.wait_for_layouts()
+        self._set_x11_keyboard(args)
+
+    def set_layouts_async(self, layouts_variants, options=None):
+        """
+        Method that sets X11 layouts and variants (for later X sessions) like
+        set_layouts, but from a separate thread. If the thread is already
+        running, only the values given by the last call are set after the
+        current DBus call finishes.
+
+        :param layout_variant: list of 'layout (variant)' or 'layout'
+                               specifications of layouts and variants
+        :type layout_variant: list of strings
+        :param options: list of X11 options that should be set
+        :type options: list of strings
+        :raise InvalidLayoutVariantSpec: if some of the layouts is invalid
+
+        """
+
+        args = self._get_x11_keyboard_args(layouts_variants, options, False)
+
+        with LocaledWrapper._async_cond:
+            LocaledWrapper._async_pending = args
+            if LocaledWrapper._async_running:
+                # the running thread picks the new values up
+                return
+            LocaledWrapper._async_running = True
+
+        threadMgr.add(AnacondaThread(prefix=THREAD_LOCALED_PREFIX,
+                                     target=self._set_pending_layouts))
+
+    @classmethod
+    def wait_for_layouts(cls):
+        """
+        Wait for the layouts set by set_layouts_async to be set. Doesn't need
+        a connection to systemd-localed, so it can be called on the class.
+
+        """
+
+        with cls._async_cond:
+            while cls._async_running:
+                cls._async_cond.wait()
+
+    def _set_pending_layouts(self):
+        cond = LocaledWrapper._async_cond
+        try:
+            while True:
+                with cond:
+                    args = LocaledWrapper._async_pending
+                    LocaledWrapper._async_pending = None
+                    if args is None:
+                        LocaledWrapper._async_running = False
+                        cond.notify_all()
+                        return
+
+                self._set_x11_keyboard(args)
+        except Exception:
+            # don't leave the waiting threads hanging
+            with cond:
+                LocaledWrapper._async_pending = None
+                LocaledWrapper._async_running = False
+                cond.notify_all()
+            raise
+
+    def _get_x11_keyboard_args(self, layouts_variants, options, convert):
         layouts = []
         variants = []
 
@@ -510,8 +617,10 @@ class LocaledWrapper(object):
         # where convert indicates whether the keymap should be converted
         # to X11 layout and user_interaction indicates whether PolicyKit
         # should ask for credentials or not
-        args = GLib.Variant("(ssssbb)", (layouts_str, "", variants_str, opts_str,
+        return GLib.Variant("(ssssbb)", (layouts_str, "", variants_str, opts_str,
                                          convert, False))
+
+    def _set_x11_keyboard(self, args):
         try:
             safe_dbus.call_sync(LOCALED_SERVICE, LOCALED_OBJECT_PATH, LOCALED_IFACE,
                                 "SetX11Keyboard", args, self._connection)
@@ -531,7 +640,10 @@ class LocaledWrapper(object):
 
         self.set_layouts([layout_variant], convert=True)
 
-        return self.keymap
+        converted = self.keymap
+        self._remember_conversion(LocaledWrapper._layout_conversions, layout_variant, converted)
+
+        return converted
 
     def convert_layout(self, layout_variant):
         """
@@ -545,6 +657,11 @@ class LocaledWrapper(object):
 
         """
 
+        with LocaledWrapper._conversions_lock:
+            converted = LocaledWrapper._layout_conversions.get(layout_variant)
+        if converted:
+            return converted
+
         # hack around systemd's lack of functionality -- no function to just
         # convert without changing keyboard configuration
         orig_layouts_variants = self.layouts_variants
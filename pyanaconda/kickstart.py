@@ -38,12 +38,15 @@ import blivet.zfcp
 import blivet.arch
 
 import glob
+import weakref
+from multiprocessing.pool import ThreadPool
 from pyanaconda import iutil
 import os
 import os.path
 import tempfile
 from pyanaconda.flags import flags, can_touch_runtime_system
-from pyanaconda.constants import ADDON_PATHS, IPMI_ABORTED
+from pyanaconda.constants import ADDON_PATHS, IPMI_ABORTED, MAX_PARALLEL_SCRIPTS
+from pyanaconda.constants import THREAD_ISCSI_STARTUP, THREAD_FCOE_STARTUP, THREAD_ZFCP_STARTUP
 import shlex
 import requests
 import sys
@@ -63,6 +66,7 @@ from pyanaconda.ui.common import collect
 from pyanaconda.addons import AddonSection, AddonData, AddonRegistry, collect_addon_paths
 from pyanaconda.bootloader import GRUB2, get_bootloader
 from pyanaconda.pwpolicy import F22_PwPolicy, F22_PwPolicyData
+from pyanaconda.threads import threadMgr, AnacondaThread
 
 from pykickstart.constants import CLEARPART_TYPE_NONE, FIRSTBOOT_SKIP, FIRSTBOOT_RECONFIG, KS_SCRIPT_POST, KS_SCRIPT_PRE, \
                                   KS_SCRIPT_TRACEBACK, SELINUX_DISABLED, SELINUX_ENFORCING, SELINUX_PERMISSIVE
@@ -89,10 +93,34 @@ class AnacondaKSScript(KSScript):
         Output is logged by the program logger, the path specified by --log
         or to /tmp/ks-script-*.log
     """
+    def __init__(self, *args, **kwargs):
+        KSScript.__init__(self, *args, **kwargs)
+        # Name of the --parallel group of a %post script, see runPostScripts
+        self.parallelGroup = None
+
+    def __str__(self):
+        retval = KSScript.__str__(self)
+        if self.parallelGroup:
+            # add the option to the end of the header line
+            header_end = retval.index("\n", 1)
+            retval = "%s --parallel=%s%s" % (retval[:header_end], self.parallelGroup,
+                                             retval[header_end:])
+        return retval
+
     def run(self, chroot):
         """ Run the kickstart script
             @param chroot directory path to chroot into before execution
         """
+        (rc, messages) = self.runScript(chroot)
+        self.checkResult(rc, messages)
+
+    def runScript(self, chroot):
+        """ Run the kickstart script without handling its failure, so that
+            it can be run from other threads.
+
+            @param chroot directory path to chroot into before execution
+            @return a tuple of the return code and the path of the script's log
+        """
         if self.inChroot:
             scriptRoot = chroot
         else:
@@ -130,6 +158,16 @@ class AnacondaKSScript(KSScript):
                                         root=scriptRoot,
                                         env_prune=env_prune)
 
+        return (rc, messages)
+
+    def checkResult(self, rc, messages):
+        """ Log a failure of the script and abort the installation if the
+            script was supposed to succeed. Not to be called from the worker
+            threads running a parallel group.
+
+            @param rc return code of the script
+            @param messages path to the script's log
+        """
         if rc != 0:
             log.error("Error code %s running the kickstart script at line %s", rc, self.lineno)
             if self.errorOnFail:
@@ -208,7 +246,7 @@ def deviceMatches(spec, devicetree=None):
     if devicetree is None:
         dev = udev.resolve_devspec(spec)
     else:
-        dev = getattr(devicetree.resolveDevice(spec), "name", None)
+        dev = getattr(resolveDevice(devicetree, spec), "name", None)
 
     # udev.resolve_devspec returns None if there's no match, but we don't
     # want that ending up in the list.
@@ -218,12 +256,183 @@ def deviceMatches(spec, devicetree=None):
     return matches
 
 def lookupAlias(devicetree, alias):
+    index = _device_indexes.get(devicetree)
+    if index:
+        dev = index.lookupAlias(alias)
+        if dev:
+            return dev
+
     for dev in devicetree.devices:
         if getattr(dev, "req_name", None) == alias:
             return dev
 
     return None
 
+def resolveDevice(devicetree, devspec):
+    """ Return the device matching the spec like DeviceTree.resolveDevice,
+        using the index of the devicetree while the kickstart storage
+        commands run.
+    """
+    index = _device_indexes.get(devicetree)
+    if index:
+        dev = index.lookup(devspec)
+        if dev:
+            return dev
+
+    return devicetree.resolveDevice(devspec)
+
+def getDeviceByName(devicetree, name):
+    """ Return the device with the name like DeviceTree.getDeviceByName,
+        using the index of the devicetree while the kickstart storage
+        commands run.
+    """
+    index = _device_indexes.get(devicetree)
+    if index and not name.startswith(("/", "UUID=", "LABEL=")):
+        dev = index.lookup(name)
+        if dev:
+            return dev
+
+    return devicetree.getDeviceByName(name)
+
+class DeviceSpecIndex(object):
+    """ Index of the devices of a devicetree by name, path, UUID=, LABEL=
+        and req_name.
+
+        Resolving a spec with the devicetree walks all of its devices and
+        the storage commands do it for every spec they refer to, which is
+        quadratic with many disks.  The index is dropped whenever an action
+        is registered or cancelled and after every storage command, and
+        built again on the next lookup.  Every hit is checked against the
+        spec, so a device renamed in the meantime isn't returned for its
+        old name.  Keys matching more than one device aren't indexed, the
+        lookup returns None for them and for the specs it doesn't know and
+        the caller asks the devicetree.
+    """
+
+    # marks keys matching several devices
+    _AMBIGUOUS = object()
+
+    def __init__(self, devicetree):
+        self.devicetree = devicetree
+        self._devices = None
+        self._aliases = None
+        self._methods = {}
+
+    def attach(self):
+        """ Drop the index whenever an action is registered or cancelled. """
+        for name in ("registerAction", "cancelAction"):
+            method = getattr(self.devicetree, name)
+            self._methods[name] = method
+            setattr(self.devicetree, name, self._invalidating(method))
+
+    def detach(self):
+        """ Stop watching the actions of the devicetree. """
+        for name in self._methods:
+            # the instance attribute shadows the method of the class
+            delattr(self.devicetree, name)
+        self._methods = {}
+
+    def _invalidating(self, method):
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.invalidate()
+
+        return wrapper
+
+    def invalidate(self):
+        """ Build the index again on the next lookup. """
+        self._devices = None
+        self._aliases = None
+
+    @staticmethod
+    def _keys(dev):
+        keys = [dev.name, dev.path]
+        if getattr(dev, "uuid", None):
+            keys.append("UUID=" + dev.uuid)
+        if getattr(dev.format, "uuid", None):
+            keys.append("UUID=" + dev.format.uuid)
+        if getattr(dev.format, "label", None):
+            keys.append("LABEL=" + dev.format.label)
+        return keys
+
+    def _add(self, index, key, dev):
+        if index.get(key, dev) is not dev:
+            dev = self._AMBIGUOUS
+        index[key] = dev
+
+    def _build(self):
+        self._devices = {}
+        self._aliases = {}
+        for dev in self.devicetree.devices:
+            if getattr(dev, "req_name", None):
+                self._add(self._aliases, dev.req_name, dev)
+
+            # like DeviceTree.getDeviceByName, skip incomplete devices
+            if not getattr(dev, "complete", True):
+                continue
+
+            for key in self._keys(dev):
+                self._add(self._devices, key, dev)
+
+    def lookup(self, devspec):
+        """ Return the device matching the spec or None if it's not known. """
+        if self._devices is None:
+            self._build()
+
+        dev = self._devices.get(devspec)
+        if dev is self._AMBIGUOUS or dev is None or devspec not in self._keys(dev):
+            return None
+
+        return dev
+
+    def lookupAlias(self, alias):
+        """ Return the device with the req_name or None if it's not known. """
+        if self._aliases is None:
+            self._build()
+
+        dev = self._aliases.get(alias)
+        if dev is self._AMBIGUOUS or dev is None or getattr(dev, "req_name", None) != alias:
+            return None
+
+        return dev
+
+# indexes of the devicetrees the storage commands are executed on, see
+# doKickstartStorage
+_device_indexes = weakref.WeakKeyDictionary()
+
+# Threads starting the storage subsystems that can online disks, see
+# startStorageSubsystems
+_storage_startups = {
+    THREAD_ISCSI_STARTUP: lambda: blivet.iscsi.iscsi().startup(),
+    THREAD_FCOE_STARTUP: lambda: blivet.fcoe.fcoe().startup(),
+    THREAD_ZFCP_STARTUP: lambda: blivet.zfcp.ZFCP().startup(),
+}
+
+def startStorageSubsystems():
+    """ Start iSCSI, FCoE and zFCP in parallel threads.
+
+        Each of them can take tens of seconds on SAN-attached hosts, so they
+        run concurrently with each other and with the kickstart parsing. Use
+        waitForStorageSubsystems before touching a subsystem or resolving
+        devices.
+    """
+    for (name, startup) in _storage_startups.items():
+        if not threadMgr.exists(name):
+            threadMgr.add(AnacondaThread(name=name, target=startup, fatal=False))
+
+def waitForStorageSubsystems(*names):
+    """ Wait for the storage subsystems started by startStorageSubsystems.
+
+        Errors from the startups are re-raised in the waiting thread.
+
+        :param names: names of the startup threads to wait for, all of them
+                      if none are given
+    """
+    for name in names or _storage_startups.keys():
+        threadMgr.wait(name)
+
 # Remove any existing formatting on a device, but do not remove the partition
 # itself.  This sets up an existing device to be used in a --onpart option.
 def removeExistingFormat(device, storage):
@@ -421,7 +630,7 @@ class Bootloader(commands.bootloader.F21_Bootloader):
         else:
             self.bootDrive = disk_names[0]
 
-        drive = storage.devicetree.resolveDevice(self.bootDrive)
+        drive = resolveDevice(storage.devicetree, self.bootDrive)
         storage.bootloader.stage1_disk = drive
 
         if self.leavebootorder:
@@ -445,11 +654,11 @@ class BTRFSData(commands.btrfs.F17_BTRFSData):
 
         # Get a list of all the devices that make up this volume.
         for member in self.devices:
-            dev = devicetree.resolveDevice(member)
+            dev = resolveDevice(devicetree, member)
             if not dev:
                 # if using --onpart, use original device
                 member_name = ksdata.onPart.get(member, member)
-                dev = devicetree.resolveDevice(member_name) or lookupAlias(devicetree, member)
+                dev = resolveDevice(devicetree, member_name) or lookupAlias(devicetree, member)
 
             if dev and dev.format.type == "luks":
                 try:
@@ -498,7 +707,7 @@ class BTRFSData(commands.btrfs.F17_BTRFSData):
             pass
 
         if self.preexist:
-            device = devicetree.resolveDevice(self.name)
+            device = resolveDevice(devicetree, self.name)
             if not device:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Btrfs volume \"%s\" specified with --useexisting does not exist.") % self.name))
@@ -592,6 +801,7 @@ class ClearPart(commands.clearpart.F21_ClearPart):
 
         # Do any glob expansion now, since we need to have the real list of
         # disks available before the execute methods run.
+        waitForStorageSubsystems()
         drives = []
         for spec in self.drives:
             matched = deviceMatches(spec)
@@ -636,6 +846,7 @@ class ClearPart(commands.clearpart.F21_ClearPart):
 class Fcoe(commands.fcoe.F13_Fcoe):
     def parse(self, args):
         fc = commands.fcoe.F13_Fcoe.parse(self, args)
+        waitForStorageSubsystems(THREAD_FCOE_STARTUP)
 
         if fc.nic not in nm.nm_devices():
             raise KickstartValueError(formatErrorMsg(self.lineno,
@@ -731,6 +942,7 @@ class IgnoreDisk(commands.ignoredisk.RHEL6_IgnoreDisk):
         retval = commands.ignoredisk.RHEL6_IgnoreDisk.parse(self, args)
 
         # See comment in ClearPart.parse
+        waitForStorageSubsystems()
         drives = []
         for spec in self.ignoredisk:
             matched = deviceMatches(spec)
@@ -758,6 +970,7 @@ class IgnoreDisk(commands.ignoredisk.RHEL6_IgnoreDisk):
 class Iscsi(commands.iscsi.F17_Iscsi):
     def parse(self, args):
         tg = commands.iscsi.F17_Iscsi.parse(self, args)
+        waitForStorageSubsystems(THREAD_ISCSI_STARTUP)
 
         if tg.iface:
             if not network.wait_for_network_devices([tg.iface]):
@@ -791,6 +1004,7 @@ class Iscsi(commands.iscsi.F17_Iscsi):
 class IscsiName(commands.iscsiname.FC6_IscsiName):
     def parse(self, args):
         retval = commands.iscsiname.FC6_IscsiName.parse(self, args)
+        waitForStorageSubsystems(THREAD_ISCSI_STARTUP)
 
         blivet.iscsi.iscsi().initiator = self.iscsiname
         return retval
@@ -862,14 +1076,14 @@ class LogVolData(commands.logvol.F21_LogVolData):
                     msg=_("The mount point \"%s\" is not valid.  It must start with a /.") % self.mountpoint))
 
         # Check that the VG this LV is a member of has already been specified.
-        vg = devicetree.getDeviceByName(vgname)
+        vg = getDeviceByName(devicetree, vgname)
         if not vg:
             raise KickstartValueError(formatErrorMsg(self.lineno,
                     msg=_("No volume group exists with the name \"%s\".  Specify volume groups before logical volumes.") % self.vgname))
 
         pool = None
         if self.thin_volume:
-            pool = devicetree.getDeviceByName("%s-%s" % (vg.name, self.pool_name))
+            pool = getDeviceByName(devicetree, "%s-%s" % (vg.name, self.pool_name))
             if not pool:
                 err = formatErrorMsg(self.lineno,
                                      msg=_("No thin pool exists with the name \"%s\". Specify thin pools before thin volumes.") % self.pool_name)
@@ -882,7 +1096,7 @@ class LogVolData(commands.logvol.F21_LogVolData):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("logvol --noformat must also use the --name= option.")))
 
-            dev = devicetree.getDeviceByName("%s-%s" % (vg.name, self.name))
+            dev = getDeviceByName(devicetree, "%s-%s" % (vg.name, self.name))
             if not dev:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Logical volume \"%s\" given in logvol command does not exist.") % self.name))
@@ -916,7 +1130,7 @@ class LogVolData(commands.logvol.F21_LogVolData):
 
         # Make sure this LV name is not already used in the requested VG.
         if not self.preexist:
-            tmp = devicetree.getDeviceByName("%s-%s" % (vg.name, self.name))
+            tmp = getDeviceByName(devicetree, "%s-%s" % (vg.name, self.name))
             if tmp:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Logical volume name \"%(logvol)s\" is already in use in volume group \"%(volgroup)s\".") %
@@ -943,7 +1157,7 @@ class LogVolData(commands.logvol.F21_LogVolData):
         # to take place there.  Also, we only support a subset of all the
         # options on pre-existing LVs.
         if self.preexist:
-            device = devicetree.getDeviceByName("%s-%s" % (vg.name, self.name))
+            device = getDeviceByName(devicetree, "%s-%s" % (vg.name, self.name))
             if not device:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Logical volume \"%s\" given in logvol command does not exist.") % self.name))
@@ -1146,7 +1360,7 @@ class PartitionData(commands.partition.F18_PartData):
             kwargs["name"] = self.mountpoint
             self.mountpoint = ""
 
-            if devicetree.getDeviceByName(kwargs["name"]):
+            if getDeviceByName(devicetree, kwargs["name"]):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("RAID partition \"%s\" is defined multiple times.") % kwargs["name"]))
 
@@ -1157,7 +1371,7 @@ class PartitionData(commands.partition.F18_PartData):
             kwargs["name"] = self.mountpoint
             self.mountpoint = ""
 
-            if devicetree.getDeviceByName(kwargs["name"]):
+            if getDeviceByName(devicetree, kwargs["name"]):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("PV partition \"%s\" is defined multiple times.") % kwargs["name"]))
 
@@ -1168,7 +1382,7 @@ class PartitionData(commands.partition.F18_PartData):
             kwargs["name"] = self.mountpoint
             self.mountpoint = ""
 
-            if devicetree.getDeviceByName(kwargs["name"]):
+            if getDeviceByName(devicetree, kwargs["name"]):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Btrfs partition \"%s\" is defined multiple times.") % kwargs["name"]))
 
@@ -1202,7 +1416,7 @@ class PartitionData(commands.partition.F18_PartData):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("part --noformat must also use the --onpart option.")))
 
-            dev = devicetree.resolveDevice(self.onPart)
+            dev = resolveDevice(devicetree, self.onPart)
             if not dev:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Partition \"%s\" given in part command does not exist.") % self.onPart))
@@ -1249,7 +1463,7 @@ class PartitionData(commands.partition.F18_PartData):
         # that it exists first.  If it doesn't exist, see if it exists with
         # mapper/ on the front.  If that doesn't exist either, it's an error.
         if self.disk:
-            disk = devicetree.resolveDevice(self.disk)
+            disk = resolveDevice(devicetree, self.disk)
             # if this is a multipath member promote it to the real mpath
             if disk and disk.format.type == "multipath_member":
                 mpath_device = storage.devicetree.getChildren(disk)[0]
@@ -1295,7 +1509,7 @@ class PartitionData(commands.partition.F18_PartData):
         # take place there.  Also, we only support a subset of all the options
         # on pre-existing partitions.
         if self.onPart:
-            device = devicetree.resolveDevice(self.onPart)
+            device = resolveDevice(devicetree, self.onPart)
             if not device:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Partition \"%s\" given in part command does not exist.") % self.onPart))
@@ -1396,7 +1610,7 @@ class RaidData(commands.raid.F18_RaidData):
         devicetree = storage.devicetree
         devicename = self.device
         if self.preexist:
-            device = devicetree.resolveDevice(devicename)
+            device = resolveDevice(devicetree, devicename)
             if device:
                 devicename = device.name
 
@@ -1412,7 +1626,7 @@ class RaidData(commands.raid.F18_RaidData):
             kwargs["name"] = self.mountpoint
             ksdata.onPart[kwargs["name"]] = devicename
 
-            if devicetree.getDeviceByName(kwargs["name"]):
+            if getDeviceByName(devicetree, kwargs["name"]):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("PV partition \"%s\" is defined multiple times.") % kwargs["name"]))
 
@@ -1422,7 +1636,7 @@ class RaidData(commands.raid.F18_RaidData):
             kwargs["name"] = self.mountpoint
             ksdata.onPart[kwargs["name"]] = devicename
 
-            if devicetree.getDeviceByName(kwargs["name"]):
+            if getDeviceByName(devicetree, kwargs["name"]):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Btrfs partition \"%s\" is defined multiple times.") % kwargs["name"]))
 
@@ -1448,7 +1662,7 @@ class RaidData(commands.raid.F18_RaidData):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("raid --noformat must also use the --device option.")))
 
-            dev = devicetree.getDeviceByName(devicename)
+            dev = getDeviceByName(devicetree, devicename)
             if not dev:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("RAID device  \"%s\" given in raid command does not exist.") % devicename))
@@ -1459,11 +1673,11 @@ class RaidData(commands.raid.F18_RaidData):
 
         # Get a list of all the RAID members.
         for member in self.members:
-            dev = devicetree.resolveDevice(member)
+            dev = resolveDevice(devicetree, member)
             if not dev:
                 # if member is using --onpart, use original device
                 mem = ksdata.onPart.get(member, member)
-                dev = devicetree.resolveDevice(mem) or lookupAlias(devicetree, member)
+                dev = resolveDevice(devicetree, mem) or lookupAlias(devicetree, member)
             if dev and dev.format.type == "luks":
                 try:
                     dev = devicetree.getChildren(dev)[0]
@@ -1502,7 +1716,7 @@ class RaidData(commands.raid.F18_RaidData):
         # to take place there.  Also, we only support a subset of all the
         # options on pre-existing RAIDs.
         if self.preexist:
-            device = devicetree.getDeviceByName(devicename)
+            device = getDeviceByName(devicetree, devicename)
             if not device:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("RAID volume \"%s\" specified with --useexisting does not exist.") % devicename))
@@ -1597,17 +1811,15 @@ class SELinux(commands.selinux.FC3_SELinux):
 
 class Services(commands.services.FC6_Services):
     def execute(self, storage, ksdata, instClass):
-        for svc in self.disabled:
-            if not svc.endswith(".service"):
-                svc += ".service"
+        systemctl_calls = []
+        for (action, services) in (("disable", self.disabled), ("enable", self.enabled)):
+            for svc in services:
+                if not svc.endswith(".service"):
+                    svc += ".service"
 
-            iutil.execInSysroot("systemctl", ["disable", svc])
+                systemctl_calls.append(("systemctl", [action, svc]))
 
-        for svc in self.enabled:
-            if not svc.endswith(".service"):
-                svc += ".service"
-
-            iutil.execInSysroot("systemctl", ["enable", svc])
+        iutil.execInSysrootBatch(systemctl_calls)
 
 class SshKey(commands.sshkey.F22_SshKey):
     def execute(self, storage, ksdata, instClass, users):
@@ -1714,11 +1926,11 @@ class VolGroupData(commands.volgroup.F21_VolGroupData):
 
         # Get a list of all the physical volume devices that make up this VG.
         for pv in self.physvols:
-            dev = devicetree.resolveDevice(pv)
+            dev = resolveDevice(devicetree, pv)
             if not dev:
                 # if pv is using --onpart, use original device
                 pv_name = ksdata.onPart.get(pv, pv)
-                dev = devicetree.resolveDevice(pv_name) or lookupAlias(devicetree, pv)
+                dev = resolveDevice(devicetree, pv_name) or lookupAlias(devicetree, pv)
             if dev and dev.format.type == "luks":
                 try:
                     dev = devicetree.getChildren(dev)[0]
@@ -1757,7 +1969,7 @@ class VolGroupData(commands.volgroup.F21_VolGroupData):
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("volgroup --noformat and volgroup --useexisting must also use the --name= option.")))
 
-            dev = devicetree.getDeviceByName(self.vgname)
+            dev = getDeviceByName(devicetree, self.vgname)
             if not dev:
                 raise KickstartValueError(formatErrorMsg(self.lineno,
                         msg=_("Volume group \"%s\" given in volgroup command does not exist.") % self.vgname))
@@ -1803,6 +2015,7 @@ class SkipX(commands.skipx.FC3_SkipX):
 class ZFCP(commands.zfcp.F14_ZFCP):
     def parse(self, args):
         fcp = commands.zfcp.F14_ZFCP.parse(self, args)
+        waitForStorageSubsystems(THREAD_ZFCP_STARTUP)
         try:
             blivet.zfcp.ZFCP().addFCP(fcp.devnum, fcp.wwpn, fcp.fcplun)
         except ValueError as e:
@@ -1976,9 +2189,39 @@ class AnacondaKSHandler(superclass):
     def __str__(self):
         return superclass.__str__(self) + "\n" + str(self.addons) + str(self.anaconda)
 
+class AnacondaPostScriptSection(PostScriptSection):
+    """ A %post section that also accepts --parallel=GROUP. Adjacent scripts
+        in the same group are run at the same time.
+    """
+    def _getParser(self):
+        op = PostScriptSection._getParser(self)
+        op.add_option("--parallel", dest="parallel", default=None)
+        return op
+
+    def _resetScript(self):
+        PostScriptSection._resetScript(self)
+        self._script["parallel"] = None
+
+    def handleHeader(self, lineno, args):
+        PostScriptSection.handleHeader(self, lineno, args)
+        (opts, _extra) = self._getParser().parse_args(args=args[1:], lineno=lineno)
+        self._script["parallel"] = opts.parallel
+
+    def finalize(self):
+        # the script is appended to the handler and the state is reset here
+        parallel = self._script["parallel"]
+        script_count = len(self.handler.scripts)
+
+        PostScriptSection.finalize(self)
+
+        if len(self.handler.scripts) > script_count:
+            self.handler.scripts[-1].parallelGroup = parallel
+
 class AnacondaPreParser(KickstartParser):
     # A subclass of KickstartParser that only looks for %pre scripts and
     # sets them up to be run.  All other scripts and commands are ignored.
+    # What it reads can't be reused by parseKickstart, because the %pre
+    # scripts may write the files the kickstart includes.
     def __init__(self, handler, followIncludes=True, errorsAreFatal=True,
                  missingIncludeIsFatal=True):
         KickstartParser.__init__(self, handler, missingIncludeIsFatal=False)
@@ -1986,6 +2229,41 @@ class AnacondaPreParser(KickstartParser):
     def handleCommand(self, lineno, args):
         pass
 
+    def readKickstartFromString(self, s, reset=True):
+        # This is also called for every included file. Only the %pre scripts
+        # matter in this pass, so don't make pykickstart tokenize the rest of
+        # the (possibly huge) kickstart just to throw it away.
+        KickstartParser.readKickstartFromString(self, self._preScriptText(s), reset=reset)
+
+    def _preScriptText(self, s):
+        """Return the kickstart text with everything but the %pre sections
+           and the top level %include lines replaced by empty lines, so that
+           the line numbers in error messages stay the same.
+        """
+        lines = []
+        section = None
+        for line in s.splitlines(True):
+            words = line.split()
+            first = words[0] if words else ""
+
+            if first in ("%include", "%ksappend"):
+                # includes are only processed outside of sections, the %pre
+                # scripts may contain such lines too (e.g. in a heredoc)
+                keep = section in (None, "%pre")
+            elif first == "%end" and section:
+                keep = section == "%pre"
+                section = None
+            elif self._validState(first):
+                # a new section, possibly right after an unterminated one
+                section = first
+                keep = section == "%pre"
+            else:
+                keep = section == "%pre"
+
+            lines.append(line if keep else "\n")
+
+        return "".join(lines)
+
     def setupSections(self):
         self.registerSection(PreScriptSection(self.handler, dataObj=AnacondaKSScript))
         self.registerSection(NullSection(self.handler, sectionOpen="%post"))
@@ -2009,7 +2287,7 @@ class AnacondaKSParser(KickstartParser):
 
     def setupSections(self):
         self.registerSection(PreScriptSection(self.handler, dataObj=self.scriptClass))
-        self.registerSection(PostScriptSection(self.handler, dataObj=self.scriptClass))
+        self.registerSection(AnacondaPostScriptSection(self.handler, dataObj=self.scriptClass))
         self.registerSection(TracebackScriptSection(self.handler, dataObj=self.scriptClass))
         self.registerSection(PackageSection(self.handler))
         self.registerSection(AddonSection(self.handler))
@@ -2042,10 +2320,9 @@ def parseKickstart(f):
 
     # We need this so all the /dev/disk/* stuff is set up before parsing.
     udev.trigger(subsystem="block", action="change")
-    # So that drives onlined by these can be used in the ks file
-    blivet.iscsi.iscsi().startup()
-    blivet.fcoe.fcoe().startup()
-    blivet.zfcp.ZFCP().startup()
+    # So that drives onlined by these can be used in the ks file. The parse
+    # methods wait for the subsystems they need.
+    startStorageSubsystems()
     # Note we do NOT call dasd.startup() here, that does not online drives, but
     # only checks if they need formatting, which requires zerombr to be known
 
@@ -2058,6 +2335,9 @@ def parseKickstart(f):
         iutil.ipmi_report(IPMI_ABORTED)
         sys.exit(1)
 
+    # Everything after parsing expects the subsystems to be up
+    waitForStorageSubsystems()
+
     return handler
 
 def appendPostScripts(ksdata):
@@ -2076,6 +2356,22 @@ def appendPostScripts(ksdata):
     ksparser = AnacondaKSParser(ksdata, scriptClass=AnacondaInternalScript)
     ksparser.readKickstartFromString(scripts, reset=False)
 
+def _runParallelScripts(scripts, chroot):
+    log.info("Running %d kickstart scripts of the '%s' group in parallel",
+             len(scripts), scripts[0].parallelGroup)
+
+    pool = ThreadPool(min(len(scripts), MAX_PARALLEL_SCRIPTS))
+    try:
+        results = pool.map(lambda s: s.runScript(chroot), scripts)
+    finally:
+        pool.close()
+        pool.join()
+
+    # --erroronfail has to be handled in this thread, do it in the
+    # kickstart order
+    for (script, (rc, messages)) in zip(scripts, results):
+        script.checkResult(rc, messages)
+
 def runPostScripts(scripts):
     postScripts = [s for s in scripts if s.type == KS_SCRIPT_POST]
 
@@ -2083,7 +2379,23 @@ def runPostScripts(scripts):
         return
 
     log.info("Running kickstart %%post script(s)")
-    map(lambda s: s.run(iutil.getSysroot()), postScripts)
+
+    # Adjacent scripts with the same --parallel group run at the same time,
+    # all the others one by one in the kickstart order.
+    batches = []
+    for script in postScripts:
+        if batches and script.parallelGroup and \
+                batches[-1][0].parallelGroup == script.parallelGroup:
+            batches[-1].append(script)
+        else:
+            batches.append([script])
+
+    for batch in batches:
+        if len(batch) == 1:
+            batch[0].run(iutil.getSysroot())
+        else:
+            _runParallelScripts(batch, iutil.getSysroot())
+
     log.info("All kickstart %%post script(s) have been run")
 
 def runPreScripts(scripts):
@@ -2121,13 +2433,21 @@ def doKickstartStorage(storage, ksdata, instClass):
     # snapshot free space now so that we know how much we had available
     storage.createFreeSpaceSnapshot()
 
-    ksdata.bootloader.execute(storage, ksdata, instClass)
-    ksdata.autopart.execute(storage, ksdata, instClass)
-    ksdata.partition.execute(storage, ksdata, instClass)
-    ksdata.raid.execute(storage, ksdata, instClass)
-    ksdata.volgroup.execute(storage, ksdata, instClass)
-    ksdata.logvol.execute(storage, ksdata, instClass)
-    ksdata.btrfs.execute(storage, ksdata, instClass)
-    # also calls ksdata.bootloader.execute
-    storage.setUpBootLoader()
+    # the commands below look up the devices they refer to in the index
+    index = DeviceSpecIndex(storage.devicetree)
+    index.attach()
+    _device_indexes[storage.devicetree] = index
+    try:
+        for command in (ksdata.bootloader, ksdata.autopart, ksdata.partition,
+                        ksdata.raid, ksdata.volgroup, ksdata.logvol, ksdata.btrfs):
+            command.execute(storage, ksdata, instClass)
+            # autopart, doPartitioning and growLVM rename devices without
+            # registering actions
+            index.invalidate()
+
+        # also calls ksdata.bootloader.execute
+        storage.setUpBootLoader()
+    finally:
+        del _device_indexes[storage.devicetree]
+        index.detach()
 
@@ -42,6 +42,27 @@ LANGCODE_RE = re.compile(r'(?P<language>[A-Za-z]+)'
                          r'(\.(?P<encoding>[-A-Za-z0-9]+))?'
                          r'(@(?P<script>[-A-Za-z0-9]+))?')
 
+# results of the langtable queries, its data don't change while running
+_langtable_results = {}
+
+def _langtable_query(func, *args, **kwargs):
+    """
+    Return the result of the langtable function for the arguments, calling it
+    only the first time.
+
+    langtable looks the results up in its data every time, which adds up when
+    the language and time zone lists are populated.
+
+    """
+
+    key = (func.__name__, args, tuple(sorted(kwargs.items())))
+    try:
+        return _langtable_results[key]
+    except KeyError:
+        result = func(*args, **kwargs)
+        _langtable_results[key] = result
+        return result
+
 class LocalizationConfigError(Exception):
     """Exception class for localization configuration related problems"""
 
@@ -220,10 +241,11 @@ def get_english_name(locale):
     if "language" not in parts:
         raise InvalidLocaleSpec("'%s' is not a valid locale" % locale)
 
-    name = langtable.language_name(languageId=parts["language"],
-                                   territoryId=parts.get("territory", ""),
-                                   scriptId=parts.get("script", ""),
-                                   languageIdQuery="en")
+    name = _langtable_query(langtable.language_name,
+                            languageId=parts["language"],
+                            territoryId=parts.get("territory", ""),
+                            scriptId=parts.get("script", ""),
+                            languageIdQuery="en")
 
     return upcase_first_letter(name)
 
@@ -243,12 +265,13 @@ def get_native_name(locale):
     if "language" not in parts:
         raise InvalidLocaleSpec("'%s' is not a valid locale" % locale)
 
-    name = langtable.language_name(languageId=parts["language"],
-                                   territoryId=parts.get("territory", ""),
-                                   scriptId=parts.get("script", ""),
-                                   languageIdQuery=parts["language"],
-                                   territoryIdQuery=parts.get("territory", ""),
-                                   scriptIdQuery=parts.get("script", ""))
+    name = _langtable_query(langtable.language_name,
+                            languageId=parts["language"],
+                            territoryId=parts.get("territory", ""),
+                            scriptId=parts.get("script", ""),
+                            languageIdQuery=parts["language"],
+                            territoryIdQuery=parts.get("territory", ""),
+                            scriptIdQuery=parts.get("script", ""))
 
     return upcase_first_letter(name)
 
@@ -300,9 +323,10 @@ def get_language_locales(lang):
     if "language" not in parts:
         raise InvalidLocaleSpec("'%s' is not a valid language" % lang)
 
-    return langtable.list_locales(languageId=parts["language"],
-                                  territoryId=parts.get("territory", ""),
-                                  scriptId=parts.get("script", ""))
+    return list(_langtable_query(langtable.list_locales,
+                                 languageId=parts["language"],
+                                 territoryId=parts.get("territory", ""),
+                                 scriptId=parts.get("script", "")))
 
 def get_territory_locales(territory):
     """
@@ -317,7 +341,7 @@ def get_territory_locales(territory):
 
     """
 
-    return langtable.list_locales(territoryId=territory)
+    return list(_langtable_query(langtable.list_locales, territoryId=territory))
 
 def get_locale_keyboards(locale):
     """
@@ -335,9 +359,10 @@ def get_locale_keyboards(locale):
     if "language" not in parts:
         raise InvalidLocaleSpec("'%s' is not a valid locale" % locale)
 
-    return langtable.list_keyboards(languageId=parts["language"],
-                                    territoryId=parts.get("territory", ""),
-                                    scriptId=parts.get("script", ""))
+    return list(_langtable_query(langtable.list_keyboards,
+                                 languageId=parts["language"],
+                                 territoryId=parts.get("territory", ""),
+                                 scriptId=parts.get("script", "")))
 
 def get_locale_timezones(locale):
     """
@@ -355,9 +380,10 @@ def get_locale_timezones(locale):
     if "language" not in parts:
         raise InvalidLocaleSpec("'%s' is not a valid locale" % locale)
 
-    return langtable.list_timezones(languageId=parts["language"],
-                                    territoryId=parts.get("territory", ""),
-                                    scriptId=parts.get("script", ""))
+    return list(_langtable_query(langtable.list_timezones,
+                                 languageId=parts["language"],
+                                 territoryId=parts.get("territory", ""),
+                                 scriptId=parts.get("script", "")))
 
 def get_locale_territory(locale):
     """
@@ -394,9 +420,10 @@ def get_xlated_timezone(tz_spec_part):
     if "language" not in parts:
         raise InvalidLocaleSpec("'%s' is not a valid locale" % locale)
 
-    xlated = langtable.timezone_name(tz_spec_part, languageIdQuery=parts["language"],
-                                     territoryIdQuery=parts.get("territory", ""),
-                                     scriptIdQuery=parts.get("script", ""))
+    xlated = _langtable_query(langtable.timezone_name, tz_spec_part,
+                              languageIdQuery=parts["language"],
+                              territoryIdQuery=parts.get("territory", ""),
+                              scriptIdQuery=parts.get("script", ""))
 
     return xlated.encode("utf-8")
 
@@ -43,6 +43,7 @@ import blivet.arch
 from pyanaconda import nm
 from pyanaconda import constants
 from pyanaconda.flags import flags, can_touch_runtime_system
+from pyanaconda.threads import threadMgr, AnacondaThread
 from pyanaconda.i18n import _
 from pyanaconda.regexes import HOSTNAME_PATTERN_WITHOUT_ANCHORS
 
@@ -226,6 +227,7 @@ class IfcfgFile(SimpleConfigFile):
             ifcfglog.debug("IfcfgFile.write %s:\n%s", self.filename, self.__str__())
             SimpleConfigFile.write(self, filename, use_tmp=use_tmp)
             self._dirty = False
+            _invalidate_ifcfg_indexes(filename or self.filename)
 
     def set(self, *args):
         for (key, data) in args:
@@ -247,6 +249,173 @@ class IfcfgFile(SimpleConfigFile):
         ifcfglog.debug("IfcfgFile.unset %s: %s", self.filename, args)
         SimpleConfigFile.unset(self, *args)
 
+class IfcfgIndex(object):
+    """ Values of the ifcfg files in a directory, indexed by the keys the
+        files are looked up by.
+
+        Every lookup checks the mtime of the directory and the stat of the
+        files, and only the files that changed are parsed again.
+    """
+    INDEXED_KEYS = ("DEVICE", "HWADDR", "ESSID", "MASTER", "TEAM_MASTER",
+                    "BRIDGE", "UUID")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._dir_mtime = None
+        self._paths = []
+        # path -> (stat stamp, values of the file)
+        self._files = {}
+        # key -> {value: set of paths}
+        self._index = dict((key, {}) for key in self.INDEXED_KEYS)
+
+    @staticmethod
+    def _normalize(key, value):
+        # mac addresses are compared case insensitively
+        if key == "HWADDR":
+            return value.upper()
+        return value
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime, st.st_size)
+
+    def _add(self, path, values):
+        for key in self.INDEXED_KEYS:
+            value = values.get(key)
+            if value:
+                self._index[key].setdefault(self._normalize(key, value), set()).add(path)
+
+    def _remove(self, path):
+        (_stamp, values) = self._files.pop(path)
+        for key in self.INDEXED_KEYS:
+            value = values.get(key)
+            if value:
+                self._index[key][self._normalize(key, value)].discard(path)
+
+    def _refresh(self):
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            dir_mtime = None
+
+        if dir_mtime != self._dir_mtime:
+            self._dir_mtime = dir_mtime
+            self._paths = _ifcfg_files(self.directory) if dir_mtime is not None else []
+
+        paths = []
+        for path in self._paths:
+            try:
+                stamp = self._stamp(path)
+            except OSError:
+                stamp = None
+
+            cached = self._files.get(path)
+            if cached and cached[0] == stamp:
+                paths.append(path)
+                continue
+
+            if cached:
+                self._remove(path)
+            if stamp is None:
+                continue
+
+            ifcfg = SimpleConfigFile(filename=path)
+            try:
+                ifcfg.read()
+            except IOError as e:
+                log.debug("can't read %s: %s", path, e)
+                continue
+            self._files[path] = (stamp, ifcfg.info)
+            self._add(path, ifcfg.info)
+            paths.append(path)
+
+        for path in set(self._files) - set(paths):
+            self._remove(path)
+        self._paths = paths
+
+    def invalidate(self, path=None):
+        """ Make the next lookup read the file (or all the files) again. """
+        with self._lock:
+            if path is None or os.path.dirname(os.path.normpath(path)) == self.directory:
+                self._dir_mtime = None
+                if path in self._files:
+                    self._remove(path)
+
+    def find(self, values):
+        """ Return the path of the first file matching the values.
+
+            :param values: list of (key, value) pairs, value can be a function
+                           checking the value of the key in the file
+            :returns: path of the file or None
+        """
+        for (path, _values) in self.find_all(values):
+            return path
+        return None
+
+    def find_all(self, values):
+        """ Return the (path, values) of all the files matching the values.
+
+            :param values: list of (key, value) pairs like in find, value can
+                           also be a list of values the key can have
+            :returns: list of (path, values of the file) in the order of the
+                      files in the directory, the values must not be modified
+        """
+        checks = []
+        for (key, value) in values:
+            key = key.upper()
+            if not callable(value):
+                if not isinstance(value, (list, tuple, set, frozenset)):
+                    value = [value]
+                value = set(self._normalize(key, v) for v in value)
+            checks.append((key, value))
+
+        with self._lock:
+            self._refresh()
+
+            # empty values are not indexed, files without the key have them
+            candidates = None
+            for (key, value) in checks:
+                if key in self._index and not callable(value) and all(value):
+                    paths = set()
+                    for v in value:
+                        paths.update(self._index[key].get(v, ()))
+                    candidates = paths if candidates is None else candidates & paths
+
+            rv = []
+            for path in self._paths:
+                if candidates is not None and path not in candidates:
+                    continue
+                file_values = self._files[path][1]
+                for (key, value) in checks:
+                    file_value = file_values.get(key, "")
+                    if callable(value):
+                        if not value(file_value):
+                            break
+                    elif self._normalize(key, file_value) not in value:
+                        break
+                else:
+                    rv.append((path, file_values))
+            return rv
+
+_ifcfg_indexes = {}
+_ifcfg_indexes_lock = threading.Lock()
+
+def ifcfg_index(root_path=""):
+    """ Return the IfcfgIndex of the ifcfg files in root_path. """
+    directory = os.path.normpath(root_path + netscriptsDir)
+    with _ifcfg_indexes_lock:
+        if directory not in _ifcfg_indexes:
+            _ifcfg_indexes[directory] = IfcfgIndex(directory)
+        return _ifcfg_indexes[directory]
+
+def _invalidate_ifcfg_indexes(path):
+    with _ifcfg_indexes_lock:
+        indexes = list(_ifcfg_indexes.values())
+    for index in indexes:
+        index.invalidate(path)
+
 def dumpMissingDefaultIfcfgs():
     """
     Dump missing default ifcfg file for wired devices.
@@ -779,41 +948,28 @@ def find_ifcfg_file_of_device(devname, root_path=""):
         except nm.PropertyNotFoundError:
             hwaddr = None
         if hwaddr:
-            hwaddr_check = lambda mac: mac.upper() == hwaddr.upper()
             nonempty = lambda x: x
             # slave configration created in GUI takes precedence
-            ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr_check),
+            ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr),
                                           ("MASTER", nonempty)],
                                          root_path)
             if not ifcfg_path:
-                ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr_check),
+                ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr),
                                               ("TEAM_MASTER", nonempty)],
                                              root_path)
             if not ifcfg_path:
-                ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr_check),
+                ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr),
                                               ("BRIDGE", nonempty)],
                                              root_path)
             if not ifcfg_path:
-                ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr_check)], root_path)
+                ifcfg_path = find_ifcfg_file([("HWADDR", hwaddr)], root_path)
         if not ifcfg_path:
             ifcfg_path = find_ifcfg_file([("DEVICE", devname)], root_path)
 
     return ifcfg_path
 
 def find_ifcfg_file(values, root_path=""):
-    for filepath in _ifcfg_files(os.path.normpath(root_path+netscriptsDir)):
-        ifcfg = IfcfgFile(filepath)
-        ifcfg.read()
-        for key, value in values:
-            if callable(value):
-                if not value(ifcfg.get(key)):
-                    break
-            else:
-                if ifcfg.get(key) != value:
-                    break
-        else:
-            return filepath
-    return None
+    return ifcfg_index(root_path).find(values)
 
 def get_slaves_from_ifcfgs(master_option, master_specs):
     """List of slaves of master specified by master_specs in master_option.
@@ -824,25 +980,21 @@ def get_slaves_from_ifcfgs(master_option, master_specs):
     """
     slaves = []
 
-    for filepath in _ifcfg_files(netscriptsDir):
-        ifcfg = IfcfgFile(filepath)
-        ifcfg.read()
-        master = ifcfg.get(master_option)
-        if master in master_specs:
-            device = ifcfg.get("DEVICE")
-            if device:
-                slaves.append(device)
-            else:
-                hwaddr = ifcfg.get("HWADDR")
-                for devname in nm.nm_devices():
-                    try:
-                        h = nm.nm_device_property(devname, "PermHwAddress")
-                    except nm.PropertyNotFoundError:
-                        log.debug("can't get PermHwAddress of devname %s", devname)
-                        continue
-                    if h.upper() == hwaddr.upper():
-                        slaves.append(devname)
-                        break
+    for _path, values in ifcfg_index().find_all([(master_option, master_specs)]):
+        device = values.get("DEVICE")
+        if device:
+            slaves.append(device)
+        else:
+            hwaddr = values.get("HWADDR", "")
+            for devname in nm.nm_devices():
+                try:
+                    h = nm.nm_device_property(devname, "PermHwAddress")
+                except nm.PropertyNotFoundError:
+                    log.debug("can't get PermHwAddress of devname %s", devname)
+                    continue
+                if h.upper() == hwaddr.upper():
+                    slaves.append(devname)
+                    break
     return slaves
 
 # why not from ifcfg? because we want config json value without escapes
@@ -1141,8 +1293,52 @@ def setOnboot(ksdata):
             log.debug("setOnboot: %s", e)
     return updated_devices
 
+def _activate_connection(con_uuid, dev_name):
+    try:
+        nm.nm_activate_device_connection(dev_name, con_uuid)
+    except (nm.UnknownConnectionError, nm.UnknownDeviceError) as e:
+        log.warning("network: kickstart: can't activate connection %s on %s: %s",
+                    con_uuid, dev_name, e)
+
+def _activate_stacked_connections(stacked, deadline):
+    for (con_uuid, dev_name, parent) in stacked:
+        if not nm.nm_wait_for(lambda parent=parent: parent in nm.nm_activated_devices(),
+                              max(deadline - time.time(), 0)):
+            log.debug("network: kickstart - %s not activated, activating %s anyway",
+                      parent, con_uuid)
+        _activate_connection(con_uuid, dev_name)
+
+def _activate_connections(activations, timeout=constants.NETWORK_CONNECTION_TIMEOUT):
+    """Activate connections added for kickstart.
+
+       NM brings the devices up in parallel, so the connections are activated
+       without waiting for each other, masters before their slaves.  A
+       connection of a device stacked on another activated device (vlan) is
+       activated in a thread once the other device is activated or the
+       timeout, shared by all the connections, passes.
+
+       :param activations: list of (connection uuid, device name or None for
+                           virtual devices, name of the device the connection
+                           needs activated or None)
+    """
+    deadline = time.time() + timeout
+    devices = set(dev_name for (_con_uuid, dev_name, _parent) in activations)
+    stacked = []
+    for (con_uuid, dev_name, parent) in activations:
+        if parent and parent in devices:
+            stacked.append((con_uuid, dev_name, parent))
+        else:
+            _activate_connection(con_uuid, dev_name)
+
+    if stacked:
+        threadMgr.add(AnacondaThread(name=constants.THREAD_NETWORK_STACKED,
+                                     target=_activate_stacked_connections,
+                                     args=(stacked, deadline)))
+
 def apply_kickstart(ksdata):
     applied_devices = []
+    # all the connections are added before any of them is activated
+    activations = []
 
     for i, network_data in enumerate(ksdata.network.network):
 
@@ -1170,11 +1366,7 @@ def apply_kickstart(ksdata):
                             # apply it overriding configuration generated by NM
                             # taking over connection activated in initramfs
                             log.debug("network: kickstart - reactivating device %s with %s", dev_name, con_uuid)
-                            try:
-                                nm.nm_activate_device_connection(dev_name, con_uuid)
-                            except nm.UnknownConnectionError:
-                                log.warning("network: kickstart - can't activate connection %s on %s",
-                                            con_uuid, dev_name)
+                            activations.append((con_uuid, dev_name, None))
                     continue
 
         # If we don't have kickstart ifcfg from initramfs the command was added
@@ -1191,12 +1383,10 @@ def apply_kickstart(ksdata):
             added_connections = add_connection_for_ksdata(network_data, dev_name)
 
         if network_data.activate:
-            for con_uuid, dev_name in added_connections:
-                try:
-                    nm.nm_activate_device_connection(dev_name, con_uuid)
-                except (nm.UnknownConnectionError, nm.UnknownDeviceError) as e:
-                    log.warning("network: pre kickstart: can't activate connection %s on %s: %s",
-                                con_uuid, dev_name, e)
+            parent = network_data.parent if network_data.vlanid else None
+            activations.extend((con_uuid, name, parent) for (con_uuid, name) in added_connections)
+
+    _activate_connections(activations)
     return applied_devices
 
 def networkInitialize(ksdata):
@@ -1263,31 +1453,30 @@ def _wait_for_connecting_NM():
     else:
         return False
 
-    i = 0
-    while nm.nm_is_connecting() and i < constants.NETWORK_CONNECTION_TIMEOUT:
-        i += constants.NETWORK_CONNECTED_CHECK_INTERVAL
-        time.sleep(constants.NETWORK_CONNECTED_CHECK_INTERVAL)
-        if nm.nm_is_connected():
-            log.debug("connected, waited %d seconds", i)
-            return True
+    start = time.time()
+    nm.nm_wait_for(lambda: not nm.nm_is_connecting(),
+                   constants.NETWORK_CONNECTION_TIMEOUT,
+                   constants.NETWORK_CONNECTED_CHECK_INTERVAL)
+    waited = time.time() - start
+    if nm.nm_is_connected():
+        log.debug("connected, waited %d seconds", waited)
+        return True
 
-    log.debug("not connected, waited %d of %d secs", i, constants.NETWORK_CONNECTION_TIMEOUT)
+    log.debug("not connected, waited %d of %d secs", waited, constants.NETWORK_CONNECTION_TIMEOUT)
     return False
 
 def wait_for_network_devices(devices, timeout=constants.NETWORK_CONNECTION_TIMEOUT):
     devices = set(devices)
-    i = 0
     log.debug("waiting for connection of devices %s for iscsi", devices)
-    while  i < timeout:
-        if not devices - set(nm.nm_activated_devices()):
-            return True
-        i += 1
-        time.sleep(1)
-    return False
+    return nm.nm_wait_for(lambda: not devices - set(nm.nm_activated_devices()), timeout)
 
 def wait_for_connecting_NM_thread(ksdata):
     """This function is called from a thread which is run at startup
     to wait for Network Manager to connect."""
+    # the connections of stacked devices (vlan) may still be waiting for
+    # activation
+    threadMgr.wait(constants.THREAD_NETWORK_STACKED)
+
     # connection (e.g. auto default dhcp) is activated by NM service
     connected = _wait_for_connecting_NM()
     if connected:
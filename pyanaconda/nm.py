@@ -23,6 +23,8 @@ from gi.repository import Gio, GLib
 from gi.repository import NetworkManager
 import struct
 import socket
+import threading
+import time
 import logging
 log = logging.getLogger("anaconda")
 
@@ -84,13 +86,212 @@ class AddConnectionError(Exception):
 class BondOptionsError(AddConnectionError):
     pass
 
-def _get_proxy(bus_type=Gio.BusType.SYSTEM,
-               proxy_flags=Gio.DBusProxyFlags.NONE,
-               info=None,
-               name="org.freedesktop.NetworkManager",
-               object_path="/org/freedesktop/NetworkManager",
-               interface_name="org.freedesktop.NetworkManager",
-               cancellable=None):
+NM_SERVICE = "org.freedesktop.NetworkManager"
+NM_OBJECT_PATH = "/org/freedesktop/NetworkManager"
+NM_DEVICES_PATH = "/org/freedesktop/NetworkManager/Devices/"
+
+class NMObjectCache(object):
+    """Cache of the NetworkManager D-Bus objects used by this module.
+
+    Creating a proxy and getting a property are both synchronous D-Bus
+    round trips, which adds up on hosts with many devices.  Proxies are
+    kept per object path and interface.  The properties of devices are
+    fetched per interface at once with GetAll and kept current by the
+    PropertiesChanged and StateChanged signals of NetworkManager.  The
+    device paths by name are kept until a device is added or removed.
+
+    The signals are received in a thread running its own main loop, so the
+    cache doesn't depend on a main loop run by the UI.  If they can't be
+    subscribed, only the proxies are cached.  The signals also wake up the
+    threads waiting in wait_for.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._proxies = {}
+        # {object path: {interface: {property: value}}}
+        self._properties = {}
+        # number of signals received for an object path, to find out if a
+        # GetAll result may be outdated by the time it's stored
+        self._generations = {}
+        self._type_interfaces = {}
+        self._device_paths = {}
+        self._subscribed = None
+        self._signals = threading.Condition(self._lock)
+        self._signal_count = 0
+
+    def get_proxy(self, key, create):
+        """Return the cached proxy for key or create it with create()."""
+        with self._lock:
+            proxy = self._proxies.get(key)
+        if proxy is None:
+            proxy = create()
+            if proxy is not None:
+                with self._lock:
+                    self._proxies[key] = proxy
+        return proxy
+
+    @property
+    def subscribed(self):
+        """Whether the cache receives the signals of NetworkManager."""
+        with self._lock:
+            if self._subscribed is None:
+                self._subscribed = self._subscribe()
+            return self._subscribed
+
+    def _subscribe(self):
+        try:
+            connection = Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
+        except GLib.GError as e:
+            log.debug("not caching NM properties: %s", e)
+            return False
+
+        # the callbacks are run in the context that is the thread default
+        # when subscribing
+        context = GLib.MainContext.new()
+        context.push_thread_default()
+        try:
+            connection.signal_subscribe(NM_SERVICE, None, None, None, None,
+                                        Gio.DBusSignalFlags.NONE, self._on_signal, None)
+        finally:
+            context.pop_thread_default()
+
+        # the loop never finishes, so the thread isn't managed by threadMgr
+        loop = GLib.MainLoop(context)
+        thread = threading.Thread(name="AnaNMSignalThread", target=loop.run)
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _on_signal(self, connection, sender, object_path, interface, signal, parameters, *args):
+        if signal == "PropertiesChanged":
+            if interface == "org.freedesktop.DBus.Properties":
+                (changed_interface, changed, invalidated) = parameters.unpack()
+                self._update(object_path, changed, invalidated, changed_interface)
+            else:
+                # NM also emits the changes of the properties of all the
+                # interfaces of an object on its most specific interface
+                self._update(object_path, parameters.unpack()[0], [], None)
+        elif signal == "StateChanged" and interface == NM_SERVICE + ".Device":
+            self._update(object_path, {"State": parameters.unpack()[0]}, [], None)
+        elif signal in ("DeviceAdded", "DeviceRemoved") and object_path == NM_OBJECT_PATH:
+            with self._lock:
+                self._device_paths = {}
+            if signal == "DeviceRemoved":
+                self.forget(parameters.unpack()[0])
+        elif signal == "Removed":
+            self.forget(object_path)
+
+        with self._lock:
+            self._signal_count += 1
+            self._signals.notify_all()
+
+    def _update(self, object_path, changed, invalidated, interface):
+        with self._lock:
+            self._generations[object_path] = self._generations.get(object_path, 0) + 1
+            interfaces = self._properties.get(object_path, {})
+            for (iface, props) in interfaces.items():
+                if interface and iface != interface:
+                    continue
+                if invalidated:
+                    # the new values aren't known, get all of them again
+                    del interfaces[iface]
+                    continue
+                for (prop, value) in changed.items():
+                    if prop in props:
+                        props[prop] = value
+
+    def forget(self, object_path):
+        """Drop everything cached for the object."""
+        with self._lock:
+            self._properties.pop(object_path, None)
+            self._type_interfaces.pop(object_path, None)
+            for key in [k for k in self._proxies if k[3] == object_path]:
+                del self._proxies[key]
+
+    def get_property(self, object_path, interface_name, prop):
+        """Return (True, value) of the property of the device, with None as
+           the value of a property the interface doesn't have, or (False, None)
+           if the properties of the interface can't be cached.
+        """
+        if not object_path.startswith(NM_DEVICES_PATH) or not self.subscribed:
+            return (False, None)
+
+        with self._lock:
+            props = self._properties.get(object_path, {}).get(interface_name)
+            if props is not None:
+                return (True, props.get(prop))
+            generation = self._generations.get(object_path, 0)
+
+        proxy = _get_proxy(object_path=object_path, interface_name="org.freedesktop.DBus.Properties")
+        if not proxy:
+            return (False, None)
+
+        try:
+            props = proxy.GetAll('(s)', interface_name)
+        except GLib.GError as e:
+            log.debug("GetAll of %s on %s failed: %s", interface_name, object_path, e)
+            return (False, None)
+
+        with self._lock:
+            # don't cache values that may have changed meanwhile
+            if self._generations.get(object_path, 0) == generation:
+                self._properties.setdefault(object_path, {})[interface_name] = props
+        return (True, props.get(prop))
+
+    def device_path(self, name, lookup):
+        """Return the object path of the device with the name, found by
+           lookup(name) if not cached.
+        """
+        with self._lock:
+            path = self._device_paths.get(name)
+        if path is None:
+            path = lookup(name)
+            if self.subscribed:
+                with self._lock:
+                    self._device_paths[name] = path
+        return path
+
+    def type_interface(self, object_path, lookup):
+        """Return the device type specific interface of the device, found by
+           lookup(object_path) if not cached.
+        """
+        with self._lock:
+            if object_path in self._type_interfaces:
+                return self._type_interfaces[object_path]
+        interface = lookup(object_path)
+        if self.subscribed:
+            with self._lock:
+                self._type_interfaces[object_path] = interface
+        return interface
+
+    def wait_for(self, check, timeout, poll_interval=1):
+        """Wait until check() returns a true value or timeout seconds pass.
+
+        check is called again after every signal of NetworkManager, or every
+        poll_interval seconds if the signals can't be received.
+
+        :return: the last value returned by check
+        """
+        deadline = time.time() + timeout
+        subscribed = self.subscribed
+        while True:
+            with self._lock:
+                count = self._signal_count
+
+            result = check()
+            remaining = deadline - time.time()
+            if result or remaining <= 0:
+                return result
+
+            with self._lock:
+                # a signal may have come while checking
+                if self._signal_count == count:
+                    self._signals.wait(remaining if subscribed else min(remaining, poll_interval))
+
+_nm_cache = NMObjectCache()
+
+def _new_proxy(bus_type, proxy_flags, info, name, object_path, interface_name, cancellable):
     try:
         proxy = Gio.DBusProxy.new_for_bus_sync(bus_type,
                                                proxy_flags,
@@ -108,8 +309,27 @@ def _get_proxy(bus_type=Gio.BusType.SYSTEM,
 
     return proxy
 
+def _get_proxy(bus_type=Gio.BusType.SYSTEM,
+               proxy_flags=Gio.DBusProxyFlags.NONE,
+               info=None,
+               name="org.freedesktop.NetworkManager",
+               object_path="/org/freedesktop/NetworkManager",
+               interface_name="org.freedesktop.NetworkManager",
+               cancellable=None):
+    args = (bus_type, proxy_flags, info, name, object_path, interface_name, cancellable)
+    if info is not None or cancellable is not None:
+        return _new_proxy(*args)
+
+    return _nm_cache.get_proxy((bus_type, proxy_flags, name, object_path, interface_name),
+                               lambda: _new_proxy(*args))
+
 def _get_property(object_path, prop, interface_name_suffix=""):
     interface_name = "org.freedesktop.NetworkManager" + interface_name_suffix
+
+    (cached, value) = _nm_cache.get_property(object_path, interface_name, prop)
+    if cached:
+        return value
+
     proxy = _get_proxy(object_path=object_path, interface_name="org.freedesktop.DBus.Properties")
     if not proxy:
         return None
@@ -162,6 +382,19 @@ def nm_is_connecting():
     """
     return nm_state() == NetworkManager.State.CONNECTING
 
+def nm_wait_for(check, timeout, poll_interval=1):
+    """Wait until check() returns a true value or timeout seconds pass.
+
+    The check is repeated whenever NetworkManager emits a signal, or every
+    poll_interval seconds if the signals can't be received.
+
+    :param check: function checking the state of NetworkManager
+    :param timeout: how long to wait in seconds
+    :param poll_interval: how often to check without the signals in seconds
+    :return: the last value returned by check
+    """
+    return _nm_cache.wait_for(check, timeout, poll_interval)
+
 def nm_devices():
     """Return names of network devices supported in installer.
 
@@ -228,13 +461,25 @@ def _get_object_iface_names(object_path):
     node_info = Gio.DBusNodeInfo.new_for_xml(res_xml[0])
     return [iface.name for iface in node_info.interfaces]
 
-def _device_type_specific_interface(device):
+def _find_device_type_specific_interface(device):
     ifaces = _get_object_iface_names(device)
     for iface in ifaces:
         if iface.startswith("org.freedesktop.NetworkManager.Device."):
             return iface
     return None
 
+def _device_type_specific_interface(device):
+    return _nm_cache.type_interface(device, _find_device_type_specific_interface)
+
+def _get_device_by_ip_iface(name):
+    proxy = _get_proxy()
+    try:
+        return proxy.GetDeviceByIpIface('(s)', name)
+    except GLib.GError as e:
+        if "org.freedesktop.NetworkManager.UnknownDevice" in e.message:
+            raise UnknownDeviceError(name, e)
+        raise
+
 def nm_device_property(name, prop):
     """Return value of device NM property
 
@@ -250,13 +495,7 @@ def nm_device_property(name, prop):
 
     retval = None
 
-    proxy = _get_proxy()
-    try:
-        device = proxy.GetDeviceByIpIface('(s)', name)
-    except GLib.GError as e:
-        if "org.freedesktop.NetworkManager.UnknownDevice" in e.message:
-            raise UnknownDeviceError(name, e)
-        raise
+    device = _nm_cache.device_path(name, _get_device_by_ip_iface)
 
     retval = _get_property(device, prop, ".Device")
     if not retval:
@@ -766,13 +1005,7 @@ def nm_disconnect_device(name):
 
        :raise UnknownDeviceError: if device is not found
     """
-    proxy = _get_proxy()
-    try:
-        device = proxy.GetDeviceByIpIface('(s)', name)
-    except GLib.GError as e:
-        if "org.freedesktop.NetworkManager.UnknownDevice" in e.message:
-            raise UnknownDeviceError(name, e)
-        raise
+    device = _nm_cache.device_path(name, _get_device_by_ip_iface)
 
     device_proxy = _get_proxy(object_path=device, interface_name="org.freedesktop.NetworkManager.Device")
     try:
@@ -800,13 +1033,7 @@ def nm_activate_device_connection(dev_name, con_uuid):
         # virtual devices (eg bond, vlan)
         device_path = "/"
     else:
-        proxy = _get_proxy()
-        try:
-            device_path = proxy.GetDeviceByIpIface('(s)', dev_name)
-        except Exception as e:
-            if "org.freedesktop.NetworkManager.UnknownDevice" in e.message:
-                raise UnknownDeviceError(dev_name, e)
-            raise
+        device_path = _nm_cache.device_path(dev_name, _get_device_by_ip_iface)
 
     con_paths = _find_settings(con_uuid, 'connection', 'uuid')
     if not con_paths:
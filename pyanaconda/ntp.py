@@ -29,6 +29,8 @@ import tempfile
 import shutil
 import ntplib
 import socket
+import threading
+import time
 
 from pyanaconda import isys
 from pyanaconda import iutil
@@ -41,16 +43,22 @@ NTP_CONFIG_FILE = "/etc/chrony.conf"
 #server 0.fedora.pool.ntp.org iburst
 SRV_LINE_REGEXP = re.compile(r"^\s*server\s*([-a-zA-Z.0-9]+)\s*[a-zA-Z]+\s*$")
 
+# how long (in seconds) the result of checking a server is valid
+NTP_WORKING_TTL = 300
+NTP_NOT_WORKING_TTL = 30
+
 class NTPconfigError(Exception):
     """Exception class for NTP related problems"""
     pass
 
-def ntp_server_working(server):
+def ntp_server_working(server, port="ntp", timeout=5):
     """
     Tries to do an NTP request to the $server (timeout may take some time).
 
     :param server: hostname or IP address of an NTP server
     :type server: string
+    :param port: port (or service name) of the server
+    :param timeout: how long to wait for the reply in seconds
     :return: True if the given server is reachable and working, False otherwise
     :rtype: bool
 
@@ -59,7 +67,7 @@ def ntp_server_working(server):
     client = ntplib.NTPClient()
 
     try:
-        client.request(server)
+        client.request(server, port=port, timeout=timeout)
     except ntplib.NTPException:
         return False
     # address related error
@@ -72,6 +80,88 @@ def ntp_server_working(server):
 
     return True
 
+class NTPServerStatus(object):
+    """
+    Results of checking NTP servers, which are checked in background threads,
+    all at the same time. A result is kept for NTP_WORKING_TTL seconds if the
+    server is working and for NTP_NOT_WORKING_TTL seconds if it isn't.
+
+    The callbacks are called as callback(server, working) from the threads
+    checking the servers.
+
+    """
+
+    def __init__(self, port="ntp", timeout=5):
+        self.port = port
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # server -> (working, time of the check)
+        self._results = {}
+        self._checking = set()
+        self._callbacks = []
+
+    def get(self, server):
+        """
+        :return: True or False if the server was checked recently, None if the
+                 result is not known (yet)
+        """
+
+        with self._lock:
+            return self._get(server)
+
+    def _get(self, server):
+        if server not in self._results:
+            return None
+
+        (working, checked) = self._results[server]
+        ttl = NTP_WORKING_TTL if working else NTP_NOT_WORKING_TTL
+        if time.time() - checked > ttl:
+            return None
+
+        return working
+
+    def add_callback(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self, servers, force=False):
+        """
+        Start checking the servers with no recent result.
+
+        :param servers: hostnames or IP addresses of NTP servers
+        :param force: check also the servers with a recent result
+
+        """
+
+        with self._lock:
+            for server in servers:
+                if server in self._checking:
+                    continue
+                if not force and self._get(server) is not None:
+                    continue
+
+                self._checking.add(server)
+                threadMgr.add(AnacondaThread(prefix="AnaNTPserver",
+                                             target=self._check_server,
+                                             args=(server,)))
+
+    def _check_server(self, server):
+        working = ntp_server_working(server, self.port, self.timeout)
+        with self._lock:
+            self._results[server] = (working, time.time())
+            self._checking.discard(server)
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            callback(server, working)
+
+server_status = NTPServerStatus()
+
 def get_servers_from_config(conf_file_path=NTP_CONFIG_FILE,
                             srv_regexp=SRV_LINE_REGEXP):
     """
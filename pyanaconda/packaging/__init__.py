@@ -522,20 +522,23 @@ class Payload(object):
             log.error("new-kernel-pkg does not exist - grubby wasn't installed?  skipping")
             return
 
+        commands = []
         for kernel in self.kernelVersionList:
             log.info("recreating initrd for %s", kernel)
             if not flags.imageInstall:
-                iutil.execInSysroot("new-kernel-pkg",
-                                    ["--mkinitrd", "--dracut",
-                                    "--depmod", "--update", kernel])
+                commands.append(("new-kernel-pkg",
+                                 ["--mkinitrd", "--dracut",
+                                  "--depmod", "--update", kernel]))
             else:
                 # hostonly is not sensible for disk image installations
                 # using /dev/disk/by-uuid/ is necessary due to disk image naming
-                iutil.execInSysroot("dracut",
-                                    ["-N",
-                                     "--persistent-policy", "by-uuid",
-                                     "-f", "/boot/initramfs-%s.img" % kernel,
-                                    kernel])
+                commands.append(("dracut",
+                                 ["-N",
+                                  "--persistent-policy", "by-uuid",
+                                  "-f", "/boot/initramfs-%s.img" % kernel,
+                                  kernel]))
+
+        iutil.execInSysrootBatch(commands)
 
     def _setDefaultBootTarget(self):
         """ Set the default systemd target for the system. """
@@ -22,7 +22,10 @@
 
 import re
 import locale
+import threading
+import weakref
 
+from collections import deque, namedtuple
 from contextlib import contextmanager
 
 from blivet import arch
@@ -35,10 +38,12 @@ from blivet.devicefactory import DEVICE_TYPE_BTRFS
 from blivet.devicefactory import DEVICE_TYPE_MD
 from blivet.devicefactory import DEVICE_TYPE_PARTITION
 from blivet.devicefactory import DEVICE_TYPE_DISK
+from blivet.errors import StorageError
 
 from pyanaconda.i18n import _, N_
 from pyanaconda import isys
-from pyanaconda.constants import productName
+from pyanaconda.constants import productName, THREAD_RESIZE_INFO_PREFIX
+from pyanaconda.threads import threadMgr, AnacondaThread
 
 from pykickstart.constants import AUTOPART_TYPE_PLAIN, AUTOPART_TYPE_BTRFS
 from pykickstart.constants import AUTOPART_TYPE_LVM, AUTOPART_TYPE_LVM_THINP
@@ -151,45 +156,87 @@ class SanityWarning(SanityException):
 class LUKSDeviceWithoutKeyError(SanityError):
     pass
 
-def sanity_check(storage, min_ram=isys.MIN_RAM):
+CHECK_SIZES = [('/usr', Size("250 MiB")), ('/tmp', Size("50 MiB")), ('/var', Size("384 MiB")),
+               ('/home', Size("100 MiB")), ('/boot', Size("200 MiB"))]
+MUST_BE_ON_LINUXFS = ['/', '/var', '/tmp', '/usr', '/home', '/usr/share', '/usr/lib']
+MUST_BE_ON_ROOT = ['/bin', '/dev', '/sbin', '/etc', '/lib', '/root', '/mnt', 'lost+found', '/proc']
+
+class SanityRule(object):
     """
-    Run a series of tests to verify the storage configuration.
+    One of the checks done by sanity_check.
 
-    This function is called at the end of partitioning so that
-    we can make sure you don't have anything silly (like no /,
-    a really small /, etc).
+    The inputs function returns a hashable value describing everything the
+    check looks at.  The result of the check is cached per storage and the
+    check is only run again if its inputs changed since the last run, so
+    that checking a big storage configuration after a small change doesn't
+    redo all the checks.
+    """
 
-    :param storage: an instance of the :class:`blivet.Blivet` class to check
-    :param min_ram: minimum RAM (in MiB) needed for the installation with swap
-                    space available
-    :rtype: a list of SanityExceptions
-    :return: a list of accumulated errors and warnings
+    def __init__(self, inputs, check):
+        """
+        :param inputs: function taking the storage and min_ram and returning
+                       the inputs of the check
+        :param check: function taking the storage and min_ram and returning
+                      an iterable of SanityExceptions
+        """
+        self.inputs = inputs
+        self.check = check
+        self._results = weakref.WeakKeyDictionary()
+
+    def run(self, storage, min_ram):
+        """Return the list of SanityExceptions found by the check."""
+        inputs = self.inputs(storage, min_ram)
+        cached = self._results.get(storage)
+        if cached is not None and cached[0] == inputs:
+            return cached[1]
+
+        exns = list(self.check(storage, min_ram))
+        self._results[storage] = (inputs, exns)
+        return exns
+
+def _device_state(device):
+    """Return the state of the device the sanity checks depend on."""
+    if device is None:
+        return None
 
-    """
+    geometry = None
+    if device.type == "partition" and device.partedPartition:
+        geometry = (device.partedPartition.number,
+                    device.partedPartition.geometry.start,
+                    device.partedPartition.geometry.end)
 
-    exns = []
+    fmt = device.format
+    return (id(device), device.type, device.size, device.exists,
+            device.protected, geometry, getattr(device, "isPrimary", None),
+            getattr(device, "level", None), id(fmt), fmt.type, fmt.exists,
+            getattr(fmt, "mountpoint", None), getattr(fmt, "label", None),
+            getattr(fmt, "labelType", None))
 
-    checkSizes = [('/usr', Size("250 MiB")), ('/tmp', Size("50 MiB")), ('/var', Size("384 MiB")),
-                  ('/home', Size("100 MiB")), ('/boot', Size("200 MiB"))]
-    mustbeonlinuxfs = ['/', '/var', '/tmp', '/usr', '/home', '/usr/share', '/usr/lib']
-    mustbeonroot = ['/bin', '/dev', '/sbin', '/etc', '/lib', '/root', '/mnt', 'lost+found', '/proc']
+def _mountpoints_state(storage, min_ram):
+    return sorted((mount, _device_state(device))
+                  for (mount, device) in storage.mountpoints.items())
 
-    filesystems = storage.mountpoints
-    root = storage.fsset.rootDevice
-    swaps = storage.fsset.swapDevices
+def _root_state(storage, min_ram):
+    return _device_state(storage.fsset.rootDevice)
 
+def _check_root(storage, min_ram):
+    root = storage.fsset.rootDevice
     if root:
         if root.size < Size("250 MiB"):
-            exns.append(
-               SanityWarning(_("Your root partition is less than 250 "
-                              "megabytes which is usually too small to "
-                              "install %s.") % (productName,)))
+            yield SanityWarning(_("Your root partition is less than 250 "
+                                  "megabytes which is usually too small to "
+                                  "install %s.") % (productName,))
     else:
-        exns.append(
-           SanityError(_("You have not defined a root partition (/), "
-                        "which is required for installation of %s "
-                        "to continue.") % (productName,)))
+        yield SanityError(_("You have not defined a root partition (/), "
+                            "which is required for installation of %s "
+                            "to continue.") % (productName,))
+
+def _s390_boot_state(storage, min_ram):
+    root = storage.fsset.rootDevice
+    return ('/boot' in storage.mountpoints, _device_state(root),
+            getattr(root, "singlePV", None))
 
+def _check_s390_boot(storage, min_ram):
     # Prevent users from installing on s390x with (a) no /boot volume, (b) the
     # root volume on LVM, and (c) the root volume not restricted to a single
     # PV
@@ -197,127 +244,184 @@ def sanity_check(storage, min_ram=isys.MIN_RAM):
     # restricted to a single PV.  The backend support is there, but there are
     # no UI hook-ups to drive that functionality, but I do not personally
     # care.  --dcantrell
+    root = storage.fsset.rootDevice
     if arch.isS390() and '/boot' not in storage.mountpoints and root:
         if root.type == 'lvmlv' and not root.singlePV:
-            exns.append(
-               SanityError(_("This platform requires /boot on a dedicated "
-                            "partition or logical volume.  If you do not "
-                            "want a /boot volume, you must place / on a "
-                            "dedicated non-LVM partition.")))
+            yield SanityError(_("This platform requires /boot on a dedicated "
+                                "partition or logical volume.  If you do not "
+                                "want a /boot volume, you must place / on a "
+                                "dedicated non-LVM partition."))
 
+def _check_mountpoint_sizes(storage, min_ram):
     # FIXME: put a check here for enough space on the filesystems. maybe?
-
-    for (mount, size) in checkSizes:
+    filesystems = storage.mountpoints
+    for (mount, size) in CHECK_SIZES:
         if mount in filesystems and filesystems[mount].size < size:
-            exns.append(
-               SanityWarning(_("Your %(mount)s partition is less than "
-                              "%(size)s which is lower than recommended "
-                              "for a normal %(productName)s install.")
-                            % {'mount': mount, 'size': size,
-                               'productName': productName}))
+            yield SanityWarning(_("Your %(mount)s partition is less than "
+                                  "%(size)s which is lower than recommended "
+                                  "for a normal %(productName)s install.")
+                                % {'mount': mount, 'size': size,
+                                   'productName': productName})
 
     for (mount, device) in filesystems.items():
-        problem = filesystems[mount].checkSize()
+        problem = device.checkSize()
         if problem < 0:
-            exns.append(
-               SanityError(_("Your %(mount)s partition is too small for %(format)s formatting "
-                            "(allowable size is %(minSize)s to %(maxSize)s)")
-                          % {"mount": mount, "format": device.format.name,
-                             "minSize": device.minSize, "maxSize": device.maxSize}))
+            yield SanityError(_("Your %(mount)s partition is too small for %(format)s formatting "
+                                "(allowable size is %(minSize)s to %(maxSize)s)")
+                              % {"mount": mount, "format": device.format.name,
+                                 "minSize": device.minSize, "maxSize": device.maxSize})
         elif problem > 0:
-            exns.append(
-               SanityError(_("Your %(mount)s partition is too large for %(format)s formatting "
-                            "(allowable size is %(minSize)s to %(maxSize)s)")
-                          % {"mount":mount, "format": device.format.name,
-                             "minSize": device.minSize, "maxSize": device.maxSize}))
-
-    if storage.bootloader and not storage.bootloader.skip_bootloader:
-        stage1 = storage.bootloader.stage1_device
-        if not stage1:
-            exns.append(
-               SanityError(_("No valid boot loader target device found. "
-                            "See below for details.")))
-            pe = _platform.stage1MissingError
-            if pe:
-                exns.append(SanityError(_(pe)))
-        else:
-            storage.bootloader.is_valid_stage1_device(stage1)
-            exns.extend(SanityError(msg) for msg in storage.bootloader.errors)
-            exns.extend(SanityWarning(msg) for msg in storage.bootloader.warnings)
+            yield SanityError(_("Your %(mount)s partition is too large for %(format)s formatting "
+                                "(allowable size is %(minSize)s to %(maxSize)s)")
+                              % {"mount":mount, "format": device.format.name,
+                                 "minSize": device.minSize, "maxSize": device.maxSize})
+
+def _bootloader_state(storage, min_ram):
+    # the boot loader checks look at the stage1 and stage2 candidates, their
+    # disks and containers, so any change of the devices counts
+    bootloader = storage.bootloader
+    if not bootloader or bootloader.skip_bootloader:
+        return None
 
-        stage2 = storage.bootloader.stage2_device
-        if stage1 and not stage2:
-            exns.append(SanityError(_("You have not created a bootable partition.")))
-        else:
-            storage.bootloader.is_valid_stage2_device(stage2)
-            exns.extend(SanityError(msg) for msg in storage.bootloader.errors)
-            exns.extend(SanityWarning(msg) for msg in storage.bootloader.warnings)
-            if not storage.bootloader.check():
-                exns.extend(SanityError(msg) for msg in storage.bootloader.errors)
-
-        #
-        # check that GPT boot disk on BIOS system has a BIOS boot partition
-        #
-        if _platform.weight(fstype="biosboot") and \
-           stage1 and stage1.isDisk and \
-           getattr(stage1.format, "labelType", None) == "gpt":
-            missing = True
-            for part in [p for p in storage.partitions if p.disk == stage1]:
-                if part.format.type == "biosboot":
-                    missing = False
-                    break
-
-            if missing:
-                exns.append(
-                   SanityError(_("Your BIOS-based system needs a special "
+    return (id(bootloader), id(bootloader.stage1_disk), id(bootloader.stage1_device),
+            tuple(id(disk) for disk in bootloader.disks),
+            tuple(_device_state(device) for device in storage.devices))
+
+def _check_bootloader(storage, min_ram):
+    if not storage.bootloader or storage.bootloader.skip_bootloader:
+        return
+
+    stage1 = storage.bootloader.stage1_device
+    if not stage1:
+        yield SanityError(_("No valid boot loader target device found. "
+                            "See below for details."))
+        pe = _platform.stage1MissingError
+        if pe:
+            yield SanityError(_(pe))
+    else:
+        storage.bootloader.is_valid_stage1_device(stage1)
+        for msg in storage.bootloader.errors:
+            yield SanityError(msg)
+        for msg in storage.bootloader.warnings:
+            yield SanityWarning(msg)
+
+    stage2 = storage.bootloader.stage2_device
+    if stage1 and not stage2:
+        yield SanityError(_("You have not created a bootable partition."))
+    else:
+        storage.bootloader.is_valid_stage2_device(stage2)
+        for msg in storage.bootloader.errors:
+            yield SanityError(msg)
+        for msg in storage.bootloader.warnings:
+            yield SanityWarning(msg)
+        if not storage.bootloader.check():
+            for msg in storage.bootloader.errors:
+                yield SanityError(msg)
+
+    #
+    # check that GPT boot disk on BIOS system has a BIOS boot partition
+    #
+    if _platform.weight(fstype="biosboot") and \
+       stage1 and stage1.isDisk and \
+       getattr(stage1.format, "labelType", None) == "gpt":
+        missing = True
+        for part in [p for p in storage.partitions if p.disk == stage1]:
+            if part.format.type == "biosboot":
+                missing = False
+                break
+
+        if missing:
+            yield SanityError(_("Your BIOS-based system needs a special "
                                 "partition to boot from a GPT disk label. "
                                 "To continue, please create a 1MiB "
-                                "'biosboot' type partition.")))
+                                "'biosboot' type partition."))
+
+def _swap_state(storage, min_ram):
+    return (min_ram, tuple((_device_state(swap), swap.format.uuid)
+                           for swap in storage.fsset.swapDevices))
 
+def _check_swap(storage, min_ram):
+    swaps = storage.fsset.swapDevices
     if not swaps:
         installed = util.total_memory()
         required = Size("%s MiB" % (min_ram + isys.NO_SWAP_EXTRA_RAM))
 
         if installed < required:
-            exns.append(
-               SanityError(_("You have not specified a swap partition.  "
-                            "%(requiredMem)s of memory is required to continue installation "
-                            "without a swap partition, but you only have %(installedMem)s.")
-                          % {"requiredMem": required,
-                             "installedMem": installed}))
+            yield SanityError(_("You have not specified a swap partition.  "
+                                "%(requiredMem)s of memory is required to continue installation "
+                                "without a swap partition, but you only have %(installedMem)s.")
+                              % {"requiredMem": required,
+                                 "installedMem": installed})
         else:
-            exns.append(
-               SanityWarning(_("You have not specified a swap partition.  "
-                              "Although not strictly required in all cases, "
-                              "it will significantly improve performance "
-                              "for most installations.")))
+            yield SanityWarning(_("You have not specified a swap partition.  "
+                                  "Although not strictly required in all cases, "
+                                  "it will significantly improve performance "
+                                  "for most installations."))
     no_uuid = [s for s in swaps if s.format.exists and not s.format.uuid]
     if no_uuid:
-        exns.append(
-           SanityWarning(_("At least one of your swap devices does not have "
-                          "a UUID, which is common in swap space created "
-                          "using older versions of mkswap. These devices "
-                          "will be referred to by device path in "
-                          "/etc/fstab, which is not ideal since device "
-                          "paths can change under a variety of "
-                          "circumstances. ")))
-
-    for (mountpoint, dev) in filesystems.items():
-        if mountpoint in mustbeonroot:
-            exns.append(
-               SanityError(_("This mount point is invalid.  The %s directory must "
-                            "be on the / file system.") % mountpoint))
-
-        if mountpoint in mustbeonlinuxfs and (not dev.format.mountable or not dev.format.linuxNative):
-            exns.append(
-               SanityError(_("The mount point %s must be on a linux file system.") % mountpoint))
-
+        yield SanityWarning(_("At least one of your swap devices does not have "
+                              "a UUID, which is common in swap space created "
+                              "using older versions of mkswap. These devices "
+                              "will be referred to by device path in "
+                              "/etc/fstab, which is not ideal since device "
+                              "paths can change under a variety of "
+                              "circumstances. "))
+
+def _check_mountpoint_locations(storage, min_ram):
+    for (mountpoint, dev) in storage.mountpoints.items():
+        if mountpoint in MUST_BE_ON_ROOT:
+            yield SanityError(_("This mount point is invalid.  The %s directory must "
+                                "be on the / file system.") % mountpoint)
+
+        if mountpoint in MUST_BE_ON_LINUXFS and (not dev.format.mountable or not dev.format.linuxNative):
+            yield SanityError(_("The mount point %s must be on a linux file system.") % mountpoint)
+
+def _root_format_state(storage, min_ram):
+    return (_device_state(storage.rootDevice), _mountpoints_state(storage, min_ram))
+
+def _check_root_format(storage, min_ram):
     if storage.rootDevice and storage.rootDevice.format.exists:
         e = storage.mustFormat(storage.rootDevice)
         if e:
-            exns.append(SanityError(e))
+            yield SanityError(e)
+
+def _luks_state(storage, min_ram):
+    return tuple((id(d), d.format.exists, d.format.hasKey)
+                 for d in storage.devices if d.format.type == "luks")
+
+def _check_luks(storage, min_ram):
+    return verify_LUKS_devices_have_key(storage)
+
+# the rules run by sanity_check, in the order their results are reported
+SANITY_RULES = [SanityRule(_root_state, _check_root),
+                SanityRule(_s390_boot_state, _check_s390_boot),
+                SanityRule(_mountpoints_state, _check_mountpoint_sizes),
+                SanityRule(_bootloader_state, _check_bootloader),
+                SanityRule(_swap_state, _check_swap),
+                SanityRule(_mountpoints_state, _check_mountpoint_locations),
+                SanityRule(_root_format_state, _check_root_format),
+                SanityRule(_luks_state, _check_luks)]
+
+def sanity_check(storage, min_ram=isys.MIN_RAM):
+    """
+    Run a series of tests to verify the storage configuration.
+
+    This function is called at the end of partitioning so that
+    we can make sure you don't have anything silly (like no /,
+    a really small /, etc).  Only the rules whose inputs changed since the
+    last check of the same storage are run again.
+
+    :param storage: an instance of the :class:`blivet.Blivet` class to check
+    :param min_ram: minimum RAM (in MiB) needed for the installation with swap
+                    space available
+    :rtype: a list of SanityExceptions
+    :return: a list of accumulated errors and warnings
+
+    """
 
-    exns += verify_LUKS_devices_have_key(storage)
+    exns = []
+    for rule in SANITY_RULES:
+        exns.extend(rule.run(storage, min_ram))
 
     return exns
 
@@ -380,3 +484,103 @@ def bound_size(size, device, old_size):
             size = min_size
 
     return size
+
+# how many devices are examined at once by ResizeInfoCache
+RESIZE_INFO_WORKERS = 4
+
+ResizeInfo = namedtuple("ResizeInfo", ["resizable", "min_size"])
+
+class ResizeInfoCache(object):
+    """ Whether existing devices can be shrunk and to what size.
+
+        Finding out the minimum size of a file system runs the file system's
+        tools (resize2fs -P, ntfsresize --info,...) which can take a while.
+        The values are computed by a pool of worker threads and cached per
+        format, so a rescan of the storage (which creates new formats)
+        invalidates them.
+    """
+
+    def __init__(self, workers=RESIZE_INFO_WORKERS):
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._info = weakref.WeakKeyDictionary()
+        self._queue = deque()
+        self._queued = weakref.WeakKeyDictionary()
+        self._running = 0
+        self._callbacks = []
+
+    def get(self, device):
+        """ Return the ResizeInfo of the device or None if not known yet. """
+        with self._lock:
+            return self._info.get(device.format)
+
+    def add_callback(self, callback):
+        """ Call callback(device, info) whenever the info of a device is found
+            out. The callback is run in one of the worker threads.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def prefetch(self, devices):
+        """ Start finding out the info of the devices not known yet. """
+        with self._lock:
+            for device in devices:
+                if device.format in self._info or device.format in self._queued:
+                    continue
+
+                self._queue.append((device, device.format))
+                self._queued[device.format] = True
+
+            while self._running < min(self._workers, len(self._queue)):
+                self._running += 1
+                threadMgr.add(AnacondaThread(prefix=THREAD_RESIZE_INFO_PREFIX, target=self._work))
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._running -= 1
+                    return
+
+                (device, fmt) = self._queue.popleft()
+
+            try:
+                resizable = device.resizable
+                min_size = device.minSize if resizable else device.size
+            except StorageError as e:
+                log.warning("failed to get the minimum size of %s: %s", device.name, e)
+                resizable = False
+                min_size = device.size
+
+            info = ResizeInfo(resizable, min_size)
+            with self._lock:
+                self._info[fmt] = info
+                self._queued.pop(fmt, None)
+                callbacks = self._callbacks[:]
+
+            for callback in callbacks:
+                callback(device, info)
+
+resize_info = ResizeInfoCache()
+
+def resizable_devices(storage, disks):
+    """ Return the devices on the disks the reclaim space dialog offers to
+        shrink.
+    """
+    devices = []
+    for disk in disks:
+        if not disk.partitioned:
+            continue
+
+        for dev in storage.devicetree.getChildren(disk):
+            if dev.isExtended and disk.format.logicalPartitions:
+                continue
+
+            devices.append(dev)
+
+    return devices
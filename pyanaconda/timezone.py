@@ -47,6 +47,12 @@ ETC_ZONES = ['GMT+1', 'GMT+2', 'GMT+3', 'GMT+4', 'GMT+5', 'GMT+6', 'GMT+7',
              'GMT-8', 'GMT-9', 'GMT-10', 'GMT-11', 'GMT-12', 'GMT-13',
              'GMT-14', 'UTC', 'GMT']
 
+# the names accepted by is_valid_timezone, created when first needed
+_valid_timezones = None
+
+# territory -> its preferred timezone
+_preferred_timezones = {}
+
 NTP_PACKAGE = "chrony"
 NTP_SERVICE = "chronyd"
 
@@ -175,11 +181,11 @@ def get_preferred_timezone(territory):
 
     """
 
-    timezones = langtable.list_timezones(territoryId=territory)
-    if not timezones:
-        return None
+    if territory not in _preferred_timezones:
+        timezones = langtable.list_timezones(territoryId=territory)
+        _preferred_timezones[territory] = timezones[0] if timezones else None
 
-    return timezones[0]
+    return _preferred_timezones[territory]
 
 def get_all_regions_and_timezones():
     """
@@ -211,9 +217,12 @@ def is_valid_timezone(timezone):
 
     """
 
-    etc_zones = ["Etc/" + zone for zone in ETC_ZONES]
+    global _valid_timezones
+    if _valid_timezones is None:
+        _valid_timezones = frozenset(list(pytz.common_timezones) +
+                                     ["Etc/" + zone for zone in ETC_ZONES])
 
-    return timezone in pytz.common_timezones + etc_zones
+    return timezone in _valid_timezones
 
 def get_timezone(timezone):
     """
@@ -469,8 +469,9 @@ class CustomPartitioningSpoke(NormalSpoke, StorageChecker):
         return new_devices
 
     def _populate_accordion(self):
-        # Make sure we start with a clean state.
-        self._accordion.removeAllPages()
+        # Work out which pages and selectors should be shown and let the
+        # accordion reuse the ones it already has.
+        layout = []
 
         new_devices = self.get_new_devices()
 
@@ -484,11 +485,10 @@ class CustomPartitioningSpoke(NormalSpoke, StorageChecker):
         # If we've not yet run autopart, add an instance of CreateNewPage.  This
         # ensures it's only added once.
         if not new_devices:
-            page = CreateNewPage(translated_new_install_name(),
-                                 self.on_create_clicked,
-                                 self._change_autopart_type,
-                                 partitionsToReuse=bool(ui_roots) or bool(self.unusedDevices))
-            self._accordion.addPage(page, cb=self.on_page_clicked)
+            kwargs = {"createClickedCB": self.on_create_clicked,
+                      "autopartTypeChangedCB": self._change_autopart_type,
+                      "partitionsToReuse": bool(ui_roots) or bool(self.unusedDevices)}
+            layout.append((CreateNewPage, translated_new_install_name(), [], kwargs))
 
             self._partitionsNotebook.set_current_page(NOTEBOOK_LABEL_PAGE)
             self._whenCreateLabel.set_text(_("When you create mount points for "
@@ -516,38 +516,30 @@ class CustomPartitioningSpoke(NormalSpoke, StorageChecker):
                            (root.name == translated_new_install_name() or d.format.exists)):
                 continue
 
-            page = Page(root.name)
-
+            entries = []
             for (mountpoint, device) in root.mounts.items():
                 if device not in self._devices or \
                    not device.disks or \
                    (root.name != translated_new_install_name() and not device.format.exists):
                     continue
 
-                selector = page.addSelector(device, self.on_selector_clicked,
-                                            mountpoint=mountpoint)
-                selector.root = root
+                entries.append((device, mountpoint, root))
 
             for device in root.swaps:
                 if device not in self._devices or \
                    (root.name != translated_new_install_name() and not device.format.exists):
                     continue
 
-                selector = page.addSelector(device, self.on_selector_clicked)
-                selector.root = root
+                entries.append((device, "", root))
 
-            page.show_all()
-            self._accordion.addPage(page, cb=self.on_page_clicked)
+            layout.append((Page, root.name, entries, {}))
 
         # Anything that doesn't go with an OS we understand?  Put it in the Other box.
         if self.unusedDevices:
-            page = UnknownPage(_("Unknown"))
-
-            for u in sorted(self.unusedDevices, key=lambda d: d.name):
-                page.addSelector(u, self.on_selector_clicked)
+            entries = [(u, "", None) for u in sorted(self.unusedDevices, key=lambda d: d.name)]
+            layout.append((UnknownPage, _("Unknown"), entries, {}))
 
-            page.show_all()
-            self._accordion.addPage(page, cb=self.on_page_clicked)
+        self._accordion.updatePages(layout, self.on_page_clicked, self.on_selector_clicked)
 
     def _do_refresh(self, mountpointToShow=None):
         # block mountpoint selector signal handler for now
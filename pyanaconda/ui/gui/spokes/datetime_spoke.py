@@ -47,7 +47,6 @@ from pyanaconda.threads import threadMgr, AnacondaThread
 
 import datetime
 import re
-import threading
 import locale as locale_mod
 
 __all__ = ["DatetimeSpoke"]
@@ -142,10 +141,6 @@ class NTPconfigDialog(GUIObject, GUIDialogInputCheckHandler):
         GUIObject.__init__(self, *args)
         GUIDialogInputCheckHandler.__init__(self)
 
-        #epoch is increased when serversStore is repopulated
-        self._epoch = 0
-        self._epoch_lock = threading.Lock()
-
     @property
     def working_server(self):
         for row in self._serversStore:
@@ -166,6 +161,11 @@ class NTPconfigDialog(GUIObject, GUIDialogInputCheckHandler):
 
         return ret
 
+    @property
+    def checking(self):
+        """Whether some of the used servers are still being checked."""
+        return any(row[1] == SERVER_QUERY and row[2] for row in self._serversStore)
+
     def _render_working(self, column, renderer, model, itr, user_data=None):
         #get the value in the second column
         value = model[itr][1]
@@ -194,6 +194,7 @@ class NTPconfigDialog(GUIObject, GUIDialogInputCheckHandler):
         self._serverCheck = self.add_check(self._serverEntry, self._validateServer)
         self._serverCheck.update_check_status()
 
+        ntp.server_status.add_callback(self._on_server_status)
         self._initialize_store_from_config()
 
     def _initialize_store_from_config(self):
@@ -234,10 +235,8 @@ class NTPconfigDialog(GUIObject, GUIDialogInputCheckHandler):
         self._serverEntry.grab_focus()
 
     def refresh_servers_state(self):
-        itr = self._serversStore.get_iter_first()
-        while itr:
-            self._refresh_server_working(itr)
-            itr = self._serversStore.iter_next(itr)
+        for row in self._serversStore:
+            self._refresh_server_working(row.iter)
 
     def run(self):
         self.window.show()
@@ -259,65 +258,28 @@ class NTPconfigDialog(GUIObject, GUIDialogInputCheckHandler):
 
         #Cancel clicked, window destroyed...
         else:
-            self._epoch_lock.acquire()
-            self._epoch += 1
-            self._epoch_lock.release()
-
             self._initialize_store_from_config()
 
         return rc
 
-    def _set_server_ok_nok(self, itr, epoch_started):
-        """
-        If the server is working, set its data to SERVER_OK, otherwise set its
-        data to SERVER_NOK.
-
-        :param itr: iterator of the $server's row in the self._serversStore
-
-        """
-
-        @gtk_action_nowait
-        def set_store_value(arg_tuple):
-            """
-            We need a function for this, because this way it can be added to
-            the MainLoop with thread-safe GLib.idle_add (but only with one
-            argument).
-
-            :param arg_tuple: (store, itr, column, value)
-
-            """
-
-            (store, itr, column, value) = arg_tuple
-            store.set_value(itr, column, value)
-
-        orig_hostname = self._serversStore[itr][0]
-        server_working = ntp.ntp_server_working(self._serversStore[itr][0])
-
-        #do not let dialog change epoch while we are modifying data
-        self._epoch_lock.acquire()
-
-        #check if we are in the same epoch as the dialog (and the serversStore)
-        #and if the server wasn't changed meanwhile
-        if epoch_started == self._epoch:
-            actual_hostname = self._serversStore[itr][0]
+    @gtk_action_nowait
+    def _on_server_status(self, server, working):
+        """ Show the result of checking the server in all its rows. """
 
-            if orig_hostname == actual_hostname:
-                if server_working:
-                    set_store_value((self._serversStore,
-                                    itr, 1, SERVER_OK))
-                else:
-                    set_store_value((self._serversStore,
-                                    itr, 1, SERVER_NOK))
-        self._epoch_lock.release()
+        for row in self._serversStore:
+            if row[0] == server:
+                row[1] = SERVER_OK if working else SERVER_NOK
 
-    @gtk_action_nowait
     def _refresh_server_working(self, itr):
-        """ Runs a new thread with _set_server_ok_nok(itr) as a taget. """
+        """ Shows the known state of the server and checks it if needed. """
 
-        self._serversStore.set_value(itr, 1, SERVER_QUERY)
-        threadMgr.add(AnacondaThread(prefix="AnaNTPserver",
-                                     target=self._set_server_ok_nok,
-                                     args=(itr, self._epoch)))
+        server = self._serversStore[itr][0]
+        working = ntp.server_status.get(server)
+        if working is None:
+            self._serversStore.set_value(itr, 1, SERVER_QUERY)
+            ntp.server_status.check([server])
+        else:
+            self._serversStore.set_value(itr, 1, SERVER_OK if working else SERVER_NOK)
 
     def _add_server(self, server):
         """
@@ -334,8 +296,6 @@ class NTPconfigDialog(GUIObject, GUIDialogInputCheckHandler):
                 return
 
         itr = self._serversStore.append([server, SERVER_QUERY, True])
-
-        #do not block UI while starting thread (may take some time)
         self._refresh_server_working(itr)
 
     def on_entry_activated(self, entry, *args):
@@ -368,8 +328,6 @@ class NTPconfigDialog(GUIObject, GUIDialogInputCheckHandler):
             return
 
         self._serversStore.set_value(itr, 0, new_text)
-        self._serversStore.set_value(itr, 1, SERVER_QUERY)
-
         self._refresh_server_working(itr)
 
 class DatetimeSpoke(FirstbootSpokeMixIn, NormalSpoke):
@@ -470,6 +428,7 @@ class DatetimeSpoke(FirstbootSpokeMixIn, NormalSpoke):
 
         self._config_dialog = NTPconfigDialog(self.data)
         self._config_dialog.initialize()
+        ntp.server_status.add_callback(self._on_ntp_server_status)
 
         threadMgr.add(AnacondaThread(name=constants.THREAD_DATE_TIME,
                                      target=self._initialize))
@@ -1054,6 +1013,17 @@ class DatetimeSpoke(FirstbootSpokeMixIn, NormalSpoke):
     def _show_no_ntp_server_warning(self):
         self.set_warning(_("You have no working NTP server configured"))
 
+    @gtk_action_nowait
+    def _on_ntp_server_status(self, server, working):
+        # the dialog has updated its servers before this runs
+        if not self._shown or not self._ntpSwitch.get_active():
+            return
+
+        if self._config_dialog.working_server is not None:
+            self.clear_info()
+        elif not self._config_dialog.checking:
+            self._show_no_ntp_server_warning()
+
     def on_ntp_switched(self, switch, *args):
         if switch.get_active():
             #turned ON
@@ -29,9 +29,11 @@ from blivet.fcoe import has_fcoe
 
 from pyanaconda.flags import flags
 from pyanaconda.i18n import CN_, CP_
+from pyanaconda.threads import threadMgr, AnacondaThread
+from pyanaconda.constants import THREAD_FILTER_INDEX
 
 from pyanaconda.ui.lib.disks import getDisks
-from pyanaconda.ui.gui.utils import timed_action
+from pyanaconda.ui.gui.utils import timed_action, gtk_action_nowait
 from pyanaconda.ui.gui.spokes import NormalSpoke
 from pyanaconda.ui.gui.spokes.advstorage.fcoe import FCoEDialog
 from pyanaconda.ui.gui.spokes.advstorage.iscsi import ISCSIDialog
@@ -48,6 +50,8 @@ DiskStoreRow = namedtuple("DiskStoreRow", ["visible", "selected", "mutable",
                                            "wwid", "paths", "port", "target",
                                            "lun", "ccw", "wwpn"])
 
+NAME_COLUMN = DiskStoreRow._fields.index("name")
+
 class FilterPage(object):
     """A FilterPage is the logic behind one of the notebook tabs on the filter
        UI spoke.  Each page has its own specific filtered model overlaid on top
@@ -71,8 +75,8 @@ class FilterPage(object):
            builder      -- A reference to the Gtk.Builder instance containing
                            this page's UI elements.
            filterActive -- Whether the user has chosen to filter results down
-                           on this page.  If set, visible_func should take the
-                           filter UI elements into account.
+                           on this page.  If set, apply_filter takes the filter
+                           UI elements into account.
            storage      -- An instance of a blivet object.
         """
         self.builder = builder
@@ -81,6 +85,12 @@ class FilterPage(object):
 
         self.filterActive = False
 
+        # names of the disks on this page, the search fields of each of them
+        # and the names of the disks matching the filter (None for all)
+        self._members = set()
+        self._index = {}
+        self._visible = None
+
     def ismember(self, device):
         """Does device belong on this page?  This function should taken into
            account what kind of thing device is.  It should not be concerned
@@ -110,18 +120,65 @@ class FilterPage(object):
         """
         pass
 
+    def reset(self, disks):
+        """Forget the search index and the filter results and remember which
+           disks belong on this page.  This is called before setup, every time
+           the filter spoke is revisited.  If the filter is active, no disks
+           are displayed until it is applied to the new search index.
+        """
+        self._members = set(d.name for d in disks)
+        self._index = {}
+        if self.filterActive:
+            self._visible = set()
+        else:
+            self._visible = None
+
+    def index_fields(self, device):
+        """Return a dict of the values the filters of this page look at for
+           the device.  This is called for every disk on the page when the
+           search index is built, which happens outside of the main thread.
+        """
+        return {}
+
+    def build_index(self, disks):
+        """Build the search index for the disks on this page."""
+        self._index = dict((d.name, self.index_fields(d)) for d in disks)
+
+    def _make_filter(self):
+        """Return a function taking the index fields of a disk and returning
+           whether it matches the filter UI elements, or None if every disk
+           matches.  The UI elements are read only once, here.
+        """
+        return None
+
+    def apply_filter(self):
+        """Work out the disks to display from the search index, so that
+           visible_func only has to look the row up in a set.
+        """
+        matches = None
+        if self.filterActive:
+            matches = self._make_filter()
+
+        if matches is None:
+            self._visible = None
+        else:
+            self._visible = set(name for (name, fields) in self._index.items()
+                                if matches(fields))
+
     def visible_func(self, model, itr, *args):
         """This method is called for every row (disk) in the store, in order to
-           determine if it should be displayed on this page or not.  This method
-           should take into account whether filterActive is set, perhaps whether
-           something in pyanaconda.flags is setup, and other settings to make
-           a final decision.  Because filtering can be complicated, many pages
-           will want to farm this decision out to another method.
+           determine if it should be displayed on this page or not.  The
+           decision is made from the page members and the result of the last
+           apply_filter call.
 
            The return value is a boolean indicating whether the row is visible
            or not.
         """
-        return True
+        name = model.get_value(itr, NAME_COLUMN)
+        if name not in self._members:
+            return False
+
+        return self._visible is None or name in self._visible
 
     def setupCombo(self, combo, items):
         """Populate a given GtkComboBoxText instance with a list of items.  The
@@ -177,49 +234,55 @@ class SearchPage(FilterPage):
         self._targetEntry.set_text("")
         self._wwidEntry.set_text("")
 
-    def _port_equal(self, device):
-        active = self._portCombo.get_active_text()
-        if active and hasattr(device, "node"):
-            return device.node.port == active
+    def index_fields(self, device):
+        fields = {"port": None, "tpgt": None,
+                  "target": getattr(device, "initiator", ""),
+                  "fcp_lun": getattr(device, "fcp_lun", None),
+                  "wwid": getattr(device, "wwid", None) or self._long_identifier(device)}
+        if hasattr(device, "node"):
+            fields["port"] = str(device.node.port)
+            fields["tpgt"] = device.node.tpgt
+
+        return fields
+
+    def _port_equal(self, fields, active):
+        if active and fields["port"] is not None:
+            return fields["port"] == active
         else:
             return True
 
-    def _target_equal(self, device):
-        active = self._targetEntry.get_text().strip()
+    def _target_equal(self, fields, active):
         if active:
-            return active in getattr(device, "initiator", "")
+            return active in fields["target"]
         else:
             return True
 
-    def _lun_equal(self, device):
-        active = self._lunEntry.get_text().strip()
-        if active and hasattr(device, "node"):
+    def _lun_equal(self, fields, active):
+        if active and fields["tpgt"] is not None:
             try:
-                return int(active) == device.node.tpgt
+                return int(active) == fields["tpgt"]
             except ValueError:
                 return True
-        elif active and hasattr(device, "fcp_lun"):
-            return active in device.fcp_lun
+        elif active and fields["fcp_lun"] is not None:
+            return active in fields["fcp_lun"]
         else:
             return True
 
-    def _filter_func(self, device):
-        if not self.filterActive:
-            return True
-
+    def _make_filter(self):
         filterBy = self._combo.get_active()
 
-        if filterBy == 0:
-            return True
-        elif filterBy == 1:
-            return self._port_equal(device) and self._target_equal(device) and self._lun_equal(device)
+        if filterBy == 1:
+            port = self._portCombo.get_active_text()
+            target = self._targetEntry.get_text().strip()
+            lun = self._lunEntry.get_text().strip()
+            return lambda fields: (self._port_equal(fields, port) and
+                                   self._target_equal(fields, target) and
+                                   self._lun_equal(fields, lun))
         elif filterBy == 2:
-            return self._wwidEntry.get_text() in getattr(device, "wwid", self._long_identifier(device))
+            wwid = self._wwidEntry.get_text()
+            return lambda fields: wwid in fields["wwid"]
 
-    def visible_func(self, model, itr, *args):
-        obj = DiskStoreRow(*model[itr])
-        device = self.storage.devicetree.getDeviceByName(obj.name, hidden=True)
-        return self._filter_func(device)
+        return None
 
 class MultipathPage(FilterPage):
     def __init__(self, storage, builder):
@@ -265,28 +328,29 @@ class MultipathPage(FilterPage):
         self._vendorCombo.set_active(0)
         self._wwidEntry.set_text("")
 
-    def _filter_func(self, device):
-        if not self.filterActive:
-            return True
+    def index_fields(self, device):
+        return {"vendor": device.vendor, "bus": device.bus, "wwid": device.wwid}
 
+    def _make_filter(self):
         filterBy = self._combo.get_active()
 
-        if filterBy == 0:
-            return True
-        elif filterBy == 1:
-            return device.vendor == self._vendorCombo.get_active_text()
+        if filterBy == 1:
+            vendor = self._vendorCombo.get_active_text()
+            return lambda fields: fields["vendor"] == vendor
         elif filterBy == 2:
-            return device.bus == self._icCombo.get_active_text()
+            bus = self._icCombo.get_active_text()
+            return lambda fields: fields["bus"] == bus
         elif filterBy == 3:
-            return self._wwidEntry.get_text() in device.wwid
+            wwid = self._wwidEntry.get_text()
+            return lambda fields: wwid in fields["wwid"]
+
+        return None
 
     def visible_func(self, model, itr, *args):
         if not flags.mpath:
             return False
 
-        obj = DiskStoreRow(*model[itr])
-        device = self.storage.devicetree.getDeviceByName(obj.name, hidden=True)
-        return self.ismember(device) and self._filter_func(device)
+        return FilterPage.visible_func(self, model, itr, *args)
 
 class OtherPage(FilterPage):
     def __init__(self, storage, builder):
@@ -340,29 +404,29 @@ class OtherPage(FilterPage):
         self._idEntry.set_text("")
         self._vendorCombo.set_active(0)
 
-    def _filter_func(self, device):
-        if not self.filterActive:
-            return True
+    def index_fields(self, device):
+        by_path = None
+        for link in device.deviceLinks:
+            if "by-path" in link:
+                by_path = link
+                break
 
+        return {"vendor": device.vendor, "bus": device.bus, "by_path": by_path}
+
+    def _make_filter(self):
         filterBy = self._combo.get_active()
 
-        if filterBy == 0:
-            return True
-        elif filterBy == 1:
-            return device.vendor == self._vendorCombo.get_active_text()
+        if filterBy == 1:
+            vendor = self._vendorCombo.get_active_text()
+            return lambda fields: fields["vendor"] == vendor
         elif filterBy == 2:
-            return device.bus == self._icCombo.get_active_text()
+            bus = self._icCombo.get_active_text()
+            return lambda fields: fields["bus"] == bus
         elif filterBy == 3:
-            for link in device.deviceLinks:
-                if "by-path" in link:
-                    return self._idEntry.get_text().strip() in link
+            ident = self._idEntry.get_text().strip()
+            return lambda fields: fields["by_path"] is not None and ident in fields["by_path"]
 
-            return False
-
-    def visible_func(self, model, itr, *args):
-        obj = DiskStoreRow(*model[itr])
-        device = self.storage.devicetree.getDeviceByName(obj.name, hidden=True)
-        return self.ismember(device) and self._filter_func(device)
+        return None
 
 class ZPage(FilterPage):
     def __init__(self, storage, builder):
@@ -417,27 +481,27 @@ class ZPage(FilterPage):
                                   disk.vendor, disk.bus, disk.serial, "", "\n".join(paths),
                                   "", "", disk.fcp_lun, disk.hba_id, disk.wwpn])
 
-    def _filter_func(self, device):
-        if not self.filterActive:
-            return True
+    def index_fields(self, device):
+        return {"hba_id": getattr(device, "hba_id", ""),
+                "wwpn": getattr(device, "wwpn", ""),
+                "fcp_lun": getattr(device, "fcp_lun", "")}
 
+    def _make_filter(self):
         filterBy = self._combo.get_active()
 
         if filterBy == 0:
-            return True
-        elif filterBy == 1:
-            return self._ccwEntry.get_text() in device.hba_id
+            return None
+
+        if filterBy == 1:
+            (key, text) = ("hba_id", self._ccwEntry.get_text())
         elif filterBy == 2:
-            return self._wwpnEntry.get_text() in device.wwpn
+            (key, text) = ("wwpn", self._wwpnEntry.get_text())
         elif filterBy == 3:
-            return self._lunEntry.get_text() in device.fcp_lun
-
-        return False
+            (key, text) = ("fcp_lun", self._lunEntry.get_text())
+        else:
+            return lambda fields: False
 
-    def visible_func(self, model, itr, *args):
-        obj = DiskStoreRow(*model[itr])
-        device = self.storage.devicetree.getDeviceByName(obj.name, hidden=True)
-        return self.ismember(device) and self._filter_func(device)
+        return lambda fields: text in fields[key]
 
 class FilterSpoke(NormalSpoke):
     builderObjects = ["diskStore", "filterWindow",
@@ -523,9 +587,30 @@ class FilterSpoke(NormalSpoke):
         # itself from this list.
         return [d for d in disk.ancestors if d.name != disk.name]
 
+    def _build_index(self, pageDisks):
+        for (page, disks) in zip(self.pages, pageDisks):
+            page.build_index(disks)
+
+        self._reapply_filters()
+
+    @gtk_action_nowait
+    def _reapply_filters(self):
+        # the filters the user applied on a previous visit need to be applied
+        # to the new search index
+        for page in self.pages:
+            if page.filterActive:
+                page.apply_filter()
+                page.model.refilter()
+
+    def _apply_filter(self, page):
+        # the search index is built in the background by refresh
+        threadMgr.wait(THREAD_FILTER_INDEX)
+        page.apply_filter()
+
     def refresh(self):
         NormalSpoke.refresh(self)
 
+        threadMgr.wait(THREAD_FILTER_INDEX)
         self.disks = getDisks(self.storage.devicetree)
         self.selected_disks = self.data.ignoredisk.onlyuse[:]
 
@@ -553,10 +638,18 @@ class FilterSpoke(NormalSpoke):
 
             allDisks.append(disk)
 
-        self.pages[0].setup(self._store, self.selected_disks, allDisks)
-        self.pages[1].setup(self._store, self.selected_disks, multipathDisks)
-        self.pages[2].setup(self._store, self.selected_disks, otherDisks)
-        self.pages[3].setup(self._store, self.selected_disks, zDisks)
+        pageDisks = [allDisks, multipathDisks, otherDisks, zDisks]
+        for (page, disks) in zip(self.pages, pageDisks):
+            page.reset(disks)
+
+        # Filtering looks at the search index instead of the devices, build it
+        # while the store is being filled.
+        threadMgr.add(AnacondaThread(name=THREAD_FILTER_INDEX,
+                                     target=self._build_index,
+                                     args=(pageDisks,)))
+
+        for (page, disks) in zip(self.pages, pageDisks):
+            page.setup(self._store, self.selected_disks, disks)
 
         self._update_summary()
 
@@ -599,6 +692,7 @@ class FilterSpoke(NormalSpoke):
     def on_find_clicked(self, button):
         n = self._notebook.get_current_page()
         self.pages[n].filterActive = True
+        self._apply_filter(self.pages[n])
         self.pages[n].model.refilter()
 
     def on_clear_icon_clicked(self, entry, icon_pos, event):
@@ -606,6 +700,7 @@ class FilterSpoke(NormalSpoke):
             entry.set_text("")
 
     def on_page_switched(self, notebook, newPage, newPageNum, *args):
+        self._apply_filter(self.pages[newPageNum])
         self.pages[newPageNum].model.refilter()
         notebook.get_nth_page(newPageNum).show_all()
 
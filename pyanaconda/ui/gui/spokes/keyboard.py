@@ -33,9 +33,7 @@ from pyanaconda import flags
 from pyanaconda.i18n import _, N_, CN_
 from pyanaconda.constants import DEFAULT_KEYBOARD, THREAD_KEYBOARD_INIT, THREAD_ADD_LAYOUTS_INIT
 from pyanaconda.ui.communication import hubQ
-from pyanaconda.iutil import strip_accents
 from pyanaconda.threads import threadMgr, AnacondaThread
-from pyanaconda.iutil import have_word_match
 
 import locale as locale_mod
 
@@ -68,21 +66,15 @@ class AddLayoutDialog(GUIObject):
         GUIObject.__init__(self, *args)
         self._xkl_wrapper = XklWrapper.get_instance()
         self._chosen_layouts = []
+        # layouts matching the text in the entry, None if everything matches
+        self._matching_layouts = None
 
     def matches_entry(self, model, itr, user_data=None):
-        entry_text = self._entry.get_text()
-        if not entry_text:
+        if self._matching_layouts is None:
             # everything matches empty string
             return True
 
-        value = model[itr][0]
-        eng_value = self._xkl_wrapper.get_layout_variant_description(value, xlated=False)
-        xlated_value = self._xkl_wrapper.get_layout_variant_description(value)
-        translit_value = strip_accents(xlated_value).lower()
-        entry_text = unicode(entry_text, "utf-8").lower()
-
-        return have_word_match(entry_text, eng_value) or have_word_match(entry_text, xlated_value) \
-            or have_word_match(entry_text, translit_value)
+        return model[itr][0] in self._matching_layouts
 
     def compare_layouts(self, model, itr1, itr2, user_data=None):
         """
@@ -155,6 +147,12 @@ class AddLayoutDialog(GUIObject):
 
     @timed_action()
     def on_entry_changed(self, *args):
+        entry_text = self._entry.get_text()
+        if entry_text:
+            self._matching_layouts = self._xkl_wrapper.search_layouts(entry_text)
+        else:
+            self._matching_layouts = None
+
         self._treeModelFilter.refilter()
 
     def on_entry_icon_clicked(self, *args):
@@ -60,9 +60,13 @@ def updateSelectorFromDevice(selector, device, mountpoint=""):
     else:
         mp = _("Unknown")
 
-    selector.props.name = device.name
-    selector.props.size = str(device.size)
-    selector.props.mountpoint = mp
+    # only touch the properties that changed, every change redraws the widget
+    if selector.props.name != device.name:
+        selector.props.name = device.name
+    if selector.props.size != str(device.size):
+        selector.props.size = str(device.size)
+    if selector.props.mountpoint != mp:
+        selector.props.mountpoint = mp
     selector.device = device
 
 def newSelectorFromDevice(device, mountpoint=""):
@@ -141,6 +145,48 @@ class Accordion(Gtk.Box):
 
         self._expanders = []
 
+    def updatePages(self, layout, cb, selectorCB):
+        """Make the accordion show the given pages, in the given order.
+
+           The layout is a list of (pageClass, title, entries, kwargs) tuples,
+           where entries is a list of (device, mountpoint, root) tuples for the
+           selectors of the page and kwargs are passed to the page class when
+           a new page needs to be created.  Pages of the same class and title
+           and the selectors of their devices are reused, so only the entries
+           that changed cost any widget work.  All the pages are collapsed
+           afterwards, just like newly added ones.
+        """
+        old_expanders = self._expanders[:]
+        self._expanders = []
+
+        for (pageClass, title, entries, kwargs) in layout:
+            expander = None
+            # a CreateNewPage has no selectors worth keeping
+            if pageClass is not CreateNewPage:
+                for e in old_expanders:
+                    page = e.get_child()
+                    if type(page) is pageClass and page.pageTitle == title:
+                        expander = e
+                        old_expanders.remove(e)
+                        break
+
+            if expander:
+                expander.set_expanded(False)
+                self._expanders.append(expander)
+                page = expander.get_child()
+                page.updateSelectors(entries, selectorCB)
+                page.show_all()
+            else:
+                page = pageClass(title, **kwargs)
+                page.updateSelectors(entries, selectorCB)
+                page.show_all()
+                self.addPage(page, cb)
+
+            self.reorder_child(self._expanders[-1], len(self._expanders) - 1)
+
+        for e in old_expanders:
+            self.remove(e)
+
     def _onExpanded(self, obj, cb=None):
         if cb:
             cb(obj.get_child())
@@ -198,12 +244,61 @@ class Page(Gtk.Box):
         return selector
 
     def removeSelector(self, selector):
+        # the mountpoint may have changed since the selector was added, so
+        # remove it from the box it is in
+        selector.get_parent().remove(selector)
+        self.members.remove(selector)
+
+    def _updateSelector(self, selector, device, mountpoint):
+        updateSelectorFromDevice(selector, device, mountpoint)
+
+        # pylint: disable=no-member
         if self._mountpointType(selector.props.mountpoint) == DATA_DEVICE:
-            self._dataBox.remove(selector)
+            box = self._dataBox
         else:
-            self._systemBox.remove(selector)
-
-        self.members.remove(selector)
+            box = self._systemBox
+
+        if selector.get_parent() is not box:
+            selector.get_parent().remove(selector)
+            box.add(selector)
+
+    def updateSelectors(self, entries, cb):
+        """Make the page show selectors for the given devices.
+
+           The entries are (device, mountpoint, root) tuples.  Selectors of
+           devices already on the page are updated in place, the ones for
+           devices no longer in the entries are removed and new ones are
+           added for the rest.  The selectors end up in the order of the
+           entries.
+        """
+        current = {}
+        for selector in self.members:
+            current.setdefault(selector.device.id, []).append(selector)
+
+        selectors = []
+        for (device, mountpoint, root) in entries:
+            if current.get(device.id):
+                selector = current[device.id].pop(0)
+                self._updateSelector(selector, device, mountpoint)
+            else:
+                selector = self.addSelector(device, cb, mountpoint=mountpoint)
+            selector.root = root
+            selectors.append(selector)
+
+        for unused in current.values():
+            for selector in unused:
+                self.removeSelector(selector)
+
+        self.members = selectors
+        self._reorderSelectors(selectors)
+
+    def _reorderSelectors(self, selectors):
+        # the category labels stay first in the boxes
+        positions = {self._dataBox: 1, self._systemBox: 1}
+        for selector in selectors:
+            box = selector.get_parent()
+            box.reorder_child(selector, positions[box])
+            positions[box] += 1
 
     def _mountpointType(self, mountpoint):
         if not mountpoint or mountpoint in ["/", "/boot", "/boot/efi", "/tmp", "/usr", "/var",
@@ -262,6 +357,13 @@ class UnknownPage(Page):
         self.remove(selector)
         self.members.remove(selector)
 
+    def _updateSelector(self, selector, device, mountpoint):
+        updateSelectorFromDevice(selector, device, mountpoint)
+
+    def _reorderSelectors(self, selectors):
+        for (position, selector) in enumerate(selectors):
+            self.reorder_child(selector, position)
+
 # This is a special Page that is displayed when no new installation has been automatically
 # created, and shows the user how to go about doing that.  The intention is that an instance
 # of this class will be packed into the Accordion first and then when the new installation
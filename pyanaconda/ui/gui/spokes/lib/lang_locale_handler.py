@@ -62,14 +62,24 @@ class LangLocaleHandler(object):
                                "pixbuf", self._render_lang_selected)
 
         # fill the list with available translations
+        self._add_languages()
+
+        # make filtering work
+        self._languageStoreFilter.set_visible_func(self._matches_entry, None)
+
+    def _add_languages(self):
+        """Add all available translations to the language store.
+
+        Override this method to fill the store in a different way (e.g. in a
+        separate thread).
+
+        """
+
         for lang in localization.get_available_translations():
             self._add_language(self._languageStore,
                                localization.get_native_name(lang),
                                localization.get_english_name(lang), lang)
 
-        # make filtering work
-        self._languageStoreFilter.set_visible_func(self._matches_entry, None)
-
     def _matches_entry(self, model, itr, *args):
         # Nothing in the text entry?  Display everything.
         entry = self._languageEntry.get_text().strip()
@@ -26,7 +26,8 @@ from gi.repository import Gdk, Gtk
 
 from pyanaconda.i18n import _, C_, N_, P_
 from pyanaconda.ui.gui import GUIObject
-from pyanaconda.ui.gui.utils import blockedHandler, escape_markup, timed_action
+from pyanaconda.ui.gui.utils import blockedHandler, escape_markup, timed_action, gtk_action_nowait
+from pyanaconda.storage_utils import resize_info, resizable_devices
 from blivet.size import Size
 
 __all__ = ["ResizeDialog"]
@@ -68,6 +69,14 @@ class ResizeDialog(GUIObject):
         self._initialFreeSpace = Size(0)
         self._selectedReclaimableSpace = Size(0)
 
+        # reclaimable space by device id, None for the partitions whose
+        # resize info is not known yet
+        self._reclaimable = {}
+        self._diskParts = {}
+        self._diskRows = {}
+        self._partRows = {}
+        self._canShrinkSomething = False
+
         self._actionStore = self.builder.get_object("actionStore")
         self._diskStore = self.builder.get_object("diskStore")
 
@@ -115,14 +124,101 @@ class ResizeDialog(GUIObject):
         else:
             return None
 
-    def populate(self, disks):
-        totalDisks = 0
-        totalReclaimableSpace = Size(0)
+    def _resize_columns(self, dev):
+        """Return the reclaimable space of the partition and its description
+           for the reclaimable column.  The space is None if the resize info
+           of the partition is not known yet.
+        """
+        info = resize_info.get(dev)
+        if info is None:
+            return (None, "<span foreground='grey' style='italic'>%s</span>" % \
+                    escape_markup(_("Calculating...")))
+
+        # Devices that are not resizable are still deletable.
+        if info.resizable:
+            freeSize = dev.size - info.min_size
+            resizeString = _("%(freeSize)s of %(devSize)s") \
+                           % {"freeSize": freeSize.humanReadable(max_places=1), "devSize": dev.size.humanReadable(max_places=1)}
+            if not dev.protected:
+                self._canShrinkSomething = True
+        else:
+            freeSize = dev.size
+            resizeString = "<span foreground='grey'>%s</span>" % \
+                    escape_markup(_("Not resizeable"))
+
+        return (freeSize, resizeString)
+
+    def _update_disk_reclaimable(self, disk_id):
+        """Fill in the total reclaimable space of the disk once the
+           reclaimable space of all its partitions is known.
+        """
+        if any(self._reclaimable[part_id] is None for part_id in self._diskParts[disk_id]):
+            markup = "<span foreground='grey' style='italic'>%s</span>" % \
+                    escape_markup(_("Calculating..."))
+        else:
+            markup = "<span foreground='grey' style='italic'>%s total</span>" % \
+                    escape_markup(self._disk_reclaimable(disk_id))
+
+        self._diskStore[self._diskRows[disk_id]][RECLAIMABLE_COL] = markup
+
+    def _disk_reclaimable(self, disk_id):
+        """Return the reclaimable space of the disk known so far."""
+        return sum((self._reclaimable[dev_id] or Size(0) for dev_id in self._diskParts[disk_id]),
+                   self._reclaimable[disk_id])
+
+    def _update_description(self):
+        description = _("You can remove existing file systems you no longer need to free up space "
+                        "for this installation.  Removing a file system will permanently delete all "
+                        "of the data it contains.")
+
+        if self._canShrinkSomething:
+            description += "\n\n"
+            description += _("There is also free space available in pre-existing file systems.  "
+                             "While it's risky and we recommend you back up your data first, you "
+                             "can recover that free disk space and make it available for this "
+                             "installation below.")
+
+        self._reclaimDescLabel.set_text(description)
+
+    def _total_reclaimable(self):
+        return sum((self._disk_reclaimable(disk_id) for disk_id in self._diskParts), Size(0))
 
+    @gtk_action_nowait
+    def _on_resize_info(self, device, info):
+        # called from the resize info workers, the partition may not be shown
+        if device.id not in self._partRows:
+            return
+
+        itr = self._partRows.pop(device.id)
+        (freeSize, resizeString) = self._resize_columns(device)
+        self._reclaimable[device.id] = freeSize
+        self._diskStore[itr][RECLAIMABLE_COL] = resizeString
+
+        disk_id = self._diskStore[self._diskStore.iter_parent(itr)][DEVICE_ID_COL]
+        self._update_disk_reclaimable(disk_id)
+
+        self._update_labels(len(self._diskParts), self._total_reclaimable())
+        self._update_description()
+
+        # the shrink button and slider depend on the info
+        selected = self._selection.get_selected()[1]
+        if selected and self._diskStore[selected][DEVICE_ID_COL] == device.id:
+            self._update_action_buttons(self._diskStore[selected])
+
+    def populate(self, disks):
         self._initialFreeSpace = Size(0)
         self._selectedReclaimableSpace = Size(0)
 
-        canShrinkSomething = False
+        self._reclaimable = {}
+        self._diskParts = {}
+        self._diskRows = {}
+        self._partRows = {}
+        self._canShrinkSomething = False
+
+        # The resize info is usually prefetched by the storage spoke.  The
+        # partitions it is not known for yet show a placeholder that is
+        # filled in by _on_resize_info.
+        resize_info.add_callback(self._on_resize_info)
 
         free_space = self.storage.getFreeSpace(disks=disks)
 
@@ -132,15 +228,15 @@ class ResizeDialog(GUIObject):
 
             if disk.partitioned:
                 fstype = ""
-                diskReclaimableSpace = Size(0)
+                self._reclaimable[disk.id] = Size(0)
             else:
                 fstype = disk.format.name
-                diskReclaimableSpace = disk.size
+                self._reclaimable[disk.id] = disk.size
 
             itr = self._diskStore.append(None, [disk.id,
                                                 "%s %s" % (disk.size.humanReadable(max_places=1), disk.description),
                                                 fstype,
-                                                "<span foreground='grey' style='italic'>%s total</span>",
+                                                "",
                                                 _(PRESERVE),
                                                 editable,
                                                 TY_NORMAL,
@@ -148,40 +244,32 @@ class ResizeDialog(GUIObject):
                                                 int(disk.size),
                                                 disk.name])
 
-            if disk.partitioned:
-                # Then add all its partitions.
-                for dev in self.storage.devicetree.getChildren(disk):
-                    if dev.isExtended and disk.format.logicalPartitions:
-                        continue
-
-                    # Devices that are not resizable are still deletable.
-                    if dev.resizable:
-                        freeSize = dev.size - dev.minSize
-                        resizeString = _("%(freeSize)s of %(devSize)s") \
-                                       % {"freeSize": freeSize.humanReadable(max_places=1), "devSize": dev.size.humanReadable(max_places=1)}
-                        if not dev.protected:
-                            canShrinkSomething = True
-                    else:
-                        freeSize = dev.size
-                        resizeString = "<span foreground='grey'>%s</span>" % \
-                                escape_markup(_("Not resizeable"))
-
-                    if dev.protected:
-                        ty = TY_PROTECTED
-                    else:
-                        ty = TY_NORMAL
-
-                    self._diskStore.append(itr, [dev.id,
-                                                 self._description(dev),
-                                                 dev.format.name,
-                                                 resizeString,
-                                                 _(PRESERVE),
-                                                 not dev.protected,
-                                                 ty,
-                                                 self._get_tooltip(dev),
-                                                 int(dev.size),
-                                                 dev.name])
-                    diskReclaimableSpace += freeSize
+            self._diskRows[disk.id] = itr
+            self._diskParts[disk.id] = []
+
+            # Then add all its partitions.
+            for dev in resizable_devices(self.storage, [disk]):
+                (freeSize, resizeString) = self._resize_columns(dev)
+
+                if dev.protected:
+                    ty = TY_PROTECTED
+                else:
+                    ty = TY_NORMAL
+
+                partItr = self._diskStore.append(itr, [dev.id,
+                                                       self._description(dev),
+                                                       dev.format.name,
+                                                       resizeString,
+                                                       _(PRESERVE),
+                                                       not dev.protected,
+                                                       ty,
+                                                       self._get_tooltip(dev),
+                                                       int(dev.size),
+                                                       dev.name])
+                self._diskParts[disk.id].append(dev.id)
+                self._reclaimable[dev.id] = freeSize
+                if freeSize is None:
+                    self._partRows[dev.id] = partItr
 
             # And then add another uneditable line that lists how much space is
             # already free in the disk.
@@ -202,28 +290,16 @@ class ResizeDialog(GUIObject):
                 self._initialFreeSpace += diskFree
 
             # And then go back and fill in the total reclaimable space for the
-            # disk, now that we know what each partition has reclaimable.
-            self._diskStore[itr][RECLAIMABLE_COL] = self._diskStore[itr][RECLAIMABLE_COL] % diskReclaimableSpace
+            # disk, if we know what each partition has reclaimable.
+            self._update_disk_reclaimable(disk.id)
 
-            totalDisks += 1
-            totalReclaimableSpace += diskReclaimableSpace
-
-        self._update_labels(totalDisks, totalReclaimableSpace, 0)
-
-        description = _("You can remove existing file systems you no longer need to free up space "
-                        "for this installation.  Removing a file system will permanently delete all "
-                        "of the data it contains.")
-
-        if canShrinkSomething:
-            description += "\n\n"
-            description += _("There is also free space available in pre-existing file systems.  "
-                             "While it's risky and we recommend you back up your data first, you "
-                             "can recover that free disk space and make it available for this "
-                             "installation below.")
-
-        self._reclaimDescLabel.set_text(description)
+        self._update_labels(len(self._diskParts), self._total_reclaimable(), 0)
+        self._update_description()
         self._update_reclaim_button(Size(0))
 
+        resize_info.prefetch(self.storage.devicetree.getDeviceByID(part_id)
+                             for part_id in self._partRows)
+
     def _update_labels(self, nDisks=None, totalReclaimable=None, selectedReclaimable=None):
         if nDisks is not None and totalReclaimable is not None:
             text = P_("<b>%(count)s disk; %(size)s reclaimable space</b> (in file systems)",
@@ -237,7 +313,7 @@ class ResizeDialog(GUIObject):
                     escape_markup(selectedReclaimable)
             self._selected_label.set_markup(text)
 
-    def _setup_slider(self, device, value):
+    def _setup_slider(self, device, min_size, value):
         """Set up the slider for this device, pulling out any previously given
            shrink value as the default.  This also sets up the ticks on the
            slider and keyboard support.  Any devices that are not resizable
@@ -246,11 +322,13 @@ class ResizeDialog(GUIObject):
 
            :param device: The device
            :type device: PartitionDevice
+           :param min_size: the minimum size of the device
+           :type min_size: Size
            :param value: default value to set
            :type value: Size
         """
         # Convert the Sizes to ints
-        minSize = int(device.minSize)
+        minSize = int(min_size)
         size = int(device.size)
         default_value = int(value)
 
@@ -275,7 +353,7 @@ class ResizeDialog(GUIObject):
             self._resizeSlider.add_mark(minSize + i * twentyPercent, Gtk.PositionType.BOTTOM, None)
 
         # Finally, add tick marks for the ends.
-        self._resizeSlider.add_mark(minSize, Gtk.PositionType.BOTTOM, str(device.minSize))
+        self._resizeSlider.add_mark(minSize, Gtk.PositionType.BOTTOM, str(min_size))
         self._resizeSlider.add_mark(size, Gtk.PositionType.BOTTOM, str(device.size))
 
     def _update_action_buttons(self, row):
@@ -292,12 +370,14 @@ class ResizeDialog(GUIObject):
         if not obj.editable:
             return
 
-        # If the selected filesystem does not support shrinking, make that
-        # button insensitive.
-        self._shrinkButton.set_sensitive(device.resizable)
+        # If the selected filesystem does not support shrinking or we don't
+        # know yet, make that button insensitive.
+        info = resize_info.get(device)
+        resizable = info is not None and info.resizable
+        self._shrinkButton.set_sensitive(resizable)
 
-        if device.resizable:
-            self._setup_slider(device, Size(obj.target))
+        if resizable:
+            self._setup_slider(device, info.min_size, Size(obj.target))
 
         # Then, disable the button for whatever action is currently selected.
         # It doesn't make a lot of sense to allow clicking that.
@@ -325,6 +405,7 @@ class ResizeDialog(GUIObject):
     def run(self):
         rc = self.window.run()
         self.window.destroy()
+        resize_info.remove_callback(self._on_resize_info)
         return rc
 
     # Signal handlers.
@@ -434,7 +515,9 @@ class ResizeDialog(GUIObject):
         if obj.action == _(PRESERVE):
             return False
         elif obj.action == _(SHRINK) and int(device.size) != int(obj.target):
-            if device.resizable:
+            # shrinking can only be chosen once the resize info is known
+            info = resize_info.get(device)
+            if info and info.resizable:
                 aligned = device.alignTargetSize(Size(obj.target))
                 self.storage.resizeDevice(device, aligned)
             else:
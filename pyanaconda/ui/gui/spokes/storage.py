@@ -51,7 +51,8 @@ from pyanaconda.ui.gui.spokes.lib.detailederror import DetailedErrorDialog
 from pyanaconda.ui.gui.spokes.lib.resize import ResizeDialog
 from pyanaconda.ui.gui.spokes.lib.dasdfmt import DasdFormatDialog
 from pyanaconda.ui.categories.system import SystemCategory
-from pyanaconda.ui.gui.utils import escape_markup, gtk_action_nowait, ignoreEscape
+from pyanaconda.ui.gui.utils import escape_markup, gtk_action_nowait, ignoreEscape, gtk_batch_map
+from pyanaconda.ui.gui.utils import timed_action
 from pyanaconda.ui.helpers import StorageChecker
 
 from pyanaconda.kickstart import doKickstartStorage, refreshAutoSwapSize, resetCustomStorageData
@@ -62,17 +63,21 @@ from blivet.devices import MultipathDevice, ZFCPDiskDevice
 from blivet.errors import StorageError, DasdFormatError
 from blivet.platform import platform
 from blivet.devicelibs.dasd import make_unformatted_dasd_list, format_dasd
+from blivet.devicelibs import lvm
 from pyanaconda.threads import threadMgr, AnacondaThread
 from pyanaconda.product import productName
 from pyanaconda.flags import flags
 from pyanaconda.i18n import _, C_, CN_, P_
 from pyanaconda import constants, iutil, isys
 from pyanaconda.bootloader import BootLoaderError
+from pyanaconda.storage_utils import resize_info, resizable_devices
 
 from pykickstart.constants import CLEARPART_TYPE_NONE, AUTOPART_TYPE_LVM
 from pykickstart.errors import KickstartValueError
 
+import copy
 import sys
+import threading
 
 import logging
 log = logging.getLogger("anaconda")
@@ -85,6 +90,144 @@ RESPONSE_MODIFY_SW = 2
 RESPONSE_RECLAIM = 3
 RESPONSE_QUIT = 4
 
+# how many disk overviews are created at once, more are created when the disk
+# box is scrolled close to its end
+DISK_OVERVIEW_BATCH = 16
+
+class AutopartProposal(object):
+    """The result of autopartitioning computed in the background on a copy
+       of the storage and ksdata for the choices made in the spoke when the
+       proposal was started. The copies are made by the thread computing it.
+    """
+
+    def __init__(self, key, selected_disks, autopart_type, clearpart_type,
+                 passphrase):
+        self.key = key
+        self.selected_disks = selected_disks
+        self.autopart_type = autopart_type
+        self.clearpart_type = clearpart_type
+        self.passphrase = passphrase
+        self.data = None
+        self.storage = None
+        self.computed = False
+        self.thread_name = None
+        self.cancelled = threading.Event()
+
+class DiskOverviewList(object):
+    """The disk overviews shown in one of the disk boxes of the spoke.
+
+       The disks are kept as an ordered list of names together with the data
+       of their overviews, and whether a disk is chosen is asked from the
+       spoke, so neither depends on the widgets.  Overviews are only created
+       for the disks scrolled into view and one more screen of them, in
+       batches run from the main loop by gtk_batch_map.  They are kept across
+       refreshes as long as the data of their disk doesn't change.
+    """
+
+    def __init__(self, box, adjustment, is_chosen, setup_overview):
+        """
+        :param box: the box the overviews are packed into
+        :param adjustment: the adjustment of the viewport the box is in
+        :param is_chosen: function returning whether the disk with the given
+                          name is chosen
+        :param setup_overview: function connecting the signal handlers of a
+                               new overview
+        """
+        self.box = box
+        self.names = []
+        self._is_chosen = is_chosen
+        self._setup_overview = setup_overview
+
+        self._data = {}
+        self._overviews = {}
+        self._pending = set()
+        self._wanted = 0
+
+        # other children of the box (like the add button) stay in front
+        self._offset = len(box.get_children())
+
+        adjustment.connect("changed", self._on_adjustment_changed)
+        adjustment.connect("value-changed", self._on_adjustment_changed)
+
+    @property
+    def overviews(self):
+        """The overviews created so far, in the order of the disks."""
+        return [self._overviews[name] for name in self.names if name in self._overviews]
+
+    def update(self, disks_data):
+        """Show the given disks.
+
+           :param disks_data: list of (name, args) tuples, where args are the
+                              arguments for the DiskOverview of the disk
+        """
+        self.names = [name for (name, _args) in disks_data]
+        data = dict(disks_data)
+
+        for (name, overview) in list(self._overviews.items()):
+            if data.get(name) != self._data.get(name):
+                overview.destroy()
+                del self._overviews[name]
+
+        self._data = data
+
+        for (i, overview) in enumerate(self.overviews):
+            self.box.reorder_child(overview, self._offset + i)
+        self.update_chosen()
+
+        self._wanted = min(len(self.names), max(self._wanted, DISK_OVERVIEW_BATCH))
+        self._create_missing()
+
+    def update_chosen(self, names=None):
+        """Make the overviews of the given disks (all by default) show whether
+           the disks are chosen.
+        """
+        if names is None:
+            names = self.names
+
+        for name in names:
+            overview = self._overviews.get(name)
+            if overview:
+                overview.set_chosen(self._is_chosen(name))
+
+    def _create_missing(self):
+        missing = [name for name in self.names[:self._wanted]
+                   if name not in self._overviews and name not in self._pending]
+        if not missing:
+            return
+
+        self._pending.update(missing)
+        threadMgr.add(AnacondaThread(prefix=constants.THREAD_DISK_OVERVIEWS_PREFIX,
+                                     target=gtk_batch_map,
+                                     args=(self._add_overview, missing),
+                                     kwargs={"batch_size": 4}))
+
+    def _add_overview(self, name):
+        self._pending.discard(name)
+        if name in self._overviews or name not in self._data:
+            # created already or not displayed anymore
+            return
+
+        (description, kind, capacity, free, popup) = self._data[name]
+        overview = AnacondaWidgets.DiskOverview(description, kind, capacity,
+                                                free, name, popup=popup)
+        position = len([n for n in self.names[:self.names.index(name)] if n in self._overviews])
+        self.box.pack_start(overview, False, False, 0)
+        self.box.reorder_child(overview, self._offset + position)
+        self._overviews[name] = overview
+
+        overview.set_chosen(self._is_chosen(name))
+        self._setup_overview(overview)
+        overview.show_all()
+
+    def _on_adjustment_changed(self, adjustment):
+        if self._wanted >= len(self.names) or not adjustment.get_page_size():
+            return
+
+        # keep one more screen of overviews than is visible
+        if adjustment.get_value() + 2 * adjustment.get_page_size() >= adjustment.get_upper():
+            self._wanted = min(len(self.names), self._wanted + DISK_OVERVIEW_BATCH)
+            self._create_missing()
+
 class InstallOptionsDialogBase(GUIObject):
     uiFile = "spokes/storage.glade"
 
@@ -275,6 +418,14 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         self._last_clicked_overview = None
         self._cur_clicked_overview = None
 
+        # autopartitioning proposal for the current choices, only one is
+        # computed at a time
+        self._proposal = None
+        self._proposal_running = False
+        self._accepted_key = None
+        # held while the storage and ksdata are copied for the proposal
+        self._storage_lock = threading.Lock()
+
         self._grabObjects()
 
     def _grabObjects(self):
@@ -283,31 +434,212 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         self._reclaim = self.builder.get_object("reclaimCheckbox")
 
     def apply(self):
-        applyDiskSelection(self.storage, self.data, self.selected_disks)
-        self.data.autopart.autopart = self.autopart
-        self.data.autopart.type = self.autoPartType
-        self.data.autopart.encrypted = self.encrypted
-        self.data.autopart.passphrase = self.passphrase
-
         self.clearPartType = CLEARPART_TYPE_NONE
-
-        if self.data.bootloader.bootDrive and \
-           self.data.bootloader.bootDrive not in self.selected_disks:
-            self.data.bootloader.bootDrive = ""
-            self.storage.bootloader.reset()
-
-        self.data.clearpart.initAll = True
-        self.data.clearpart.type = self.clearPartType
-        self.storage.config.update(self.data)
-        self.storage.autoPartType = self.data.autopart.type
-        self.storage.encryptedAutoPart = self.data.autopart.encrypted
-        self.storage.encryptionPassphrase = self.data.autopart.passphrase
+        self._apply_choices(self.storage, self.data, self.selected_disks,
+                            self.autopart, self.autoPartType, self.encrypted,
+                            self.passphrase, self.clearPartType)
+
+    def _apply_choices(self, storage, data, selected_disks, autopart,
+                       autopart_type, encrypted, passphrase, clearpart_type):
+        """ Apply the choices made in the spoke to the storage and ksdata. """
+        applyDiskSelection(storage, data, selected_disks)
+        data.autopart.autopart = autopart
+        data.autopart.type = autopart_type
+        data.autopart.encrypted = encrypted
+        data.autopart.passphrase = passphrase
+
+        if data.bootloader.bootDrive and \
+           data.bootloader.bootDrive not in selected_disks:
+            data.bootloader.bootDrive = ""
+            storage.bootloader.reset()
+
+        data.clearpart.initAll = True
+        data.clearpart.type = clearpart_type
+        storage.config.update(data)
+        storage.autoPartType = data.autopart.type
+        storage.encryptedAutoPart = data.autopart.encrypted
+        storage.encryptionPassphrase = data.autopart.passphrase
 
         # If autopart is selected we want to remove whatever has been
         # created/scheduled to make room for autopart.
         # If custom is selected, we want to leave alone any storage layout the
         # user may have set up before now.
-        self.storage.config.clearNonExistent = self.data.autopart.autopart
+        storage.config.clearNonExistent = data.autopart.autopart
+
+    def _remove_new_partitions(self, storage):
+        """ Remove the partitions created by a previous autopart run. """
+        for partition in storage.partitions[:]:
+            # check if it's been removed in a previous iteration
+            if not partition.exists and \
+               partition in storage.partitions:
+                storage.recursiveRemove(partition)
+
+    def _hide_disks(self, storage, disks, selected_disks):
+        """ Hide the disks not selected and unhide the selected ones. """
+        for disk in disks:
+            if disk.name not in selected_disks and \
+               disk in storage.devices:
+                storage.devicetree.hide(disk)
+            elif disk.name in selected_disks and \
+                 disk not in storage.devices:
+                storage.devicetree.unhide(disk)
+
+    def _hide_proposal_disks(self, storage, selected_disks):
+        """ Hide the disks not selected in the proposal's copy of the storage.
+
+            DeviceTree.hide also adds the hidden disks to the LVM filter,
+            which is shared by all the storage instances, so the filter is
+            restored right away. The caller must hold self._storage_lock,
+            which the main thread holds when hiding the disks for real.
+        """
+        rejects = lvm.config_args_data["filterRejects"][:]
+        try:
+            self._hide_disks(storage, getDisks(storage.devicetree), selected_disks)
+        finally:
+            lvm.config_args_data["filterRejects"][:] = rejects
+
+    def _autopart_proposal_key(self):
+        """ Return what the autopart result depends on besides the storage
+            configuration done outside of this spoke.
+        """
+        devicetree = self.storage.devicetree
+        return (tuple(self.selected_disks), self.autoPartType,
+                self.data.bootloader.bootDrive, id(devicetree),
+                tuple(id(d) for d in devicetree.devices),
+                tuple(id(a) for a in devicetree.findActions()))
+
+    @timed_action(delay=1000, threshold=5000, busy_cursor=False)
+    def _schedule_autopart_proposal(self):
+        """ Start the autopart proposal once the choices stop changing. """
+        self._start_autopart_proposal()
+
+    def _start_autopart_proposal(self):
+        """ Start computing the autopart result for the current choices in the
+            background, so that accepting them doesn't have to wait for it.
+            The result is only used if autopart without encryption is chosen.
+        """
+        # the choices are being accepted, the proposal for them (if any) must
+        # not be replaced
+        if self.back_clicked:
+            return
+
+        key = self._autopart_proposal_key()
+        if self._proposal and self._proposal.key == key:
+            return
+
+        self._cancel_autopart_proposal()
+        if not self.selected_disks:
+            return
+
+        if self._proposal_running:
+            # the cancelled proposal starts the one for the current choices
+            # when it's done
+            return
+
+        self._proposal = AutopartProposal(key, list(self.selected_disks),
+                                          self.autoPartType, self.clearPartType,
+                                          self.passphrase)
+        self._proposal_running = True
+        self._proposal.thread_name = threadMgr.add(AnacondaThread(prefix=constants.THREAD_AUTOPART_PROPOSAL_PREFIX,
+                                                                  target=self._compute_autopart_proposal,
+                                                                  args=(self._proposal,)))
+
+    def _cancel_autopart_proposal(self):
+        if self._proposal:
+            self._proposal.cancelled.set()
+            self._proposal = None
+
+    def _compute_autopart_proposal(self, proposal):
+        try:
+            threadMgr.wait(constants.THREAD_DASDFMT)
+            if proposal.cancelled.is_set():
+                return
+
+            log.debug("computing autopart proposal")
+
+            # the main thread changes the storage with the lock held when the
+            # choices are accepted; the proposal isn't used if the dialogs
+            # shown after that change them again
+            with self._storage_lock:
+                proposal.data = copy.deepcopy(self.data)
+                proposal.storage = self.storage.copy()
+                storage = proposal.storage
+
+                # do what on_back_clicked, apply and _doExecute do when
+                # accepting the choices with autopart
+                self._remove_new_partitions(storage)
+                self._hide_proposal_disks(storage, proposal.selected_disks)
+
+            if proposal.cancelled.is_set():
+                return
+
+            refreshAutoSwapSize(storage)
+            self._apply_choices(storage, proposal.data, proposal.selected_disks,
+                                True, proposal.autopart_type, False,
+                                proposal.passphrase, proposal.clearpart_type)
+
+            if proposal.cancelled.is_set():
+                return
+
+            doKickstartStorage(storage, proposal.data, self.instclass)
+            if not proposal.cancelled.is_set():
+                log.debug("autopart proposal computed")
+                proposal.computed = True
+        except Exception as e:    # pylint: disable=broad-except
+            # the choices are applied again without the proposal, reporting
+            # any errors then
+            log.debug("autopart proposal failed: %s", e)
+        finally:
+            self._autopart_proposal_done()
+
+    @gtk_action_nowait
+    def _autopart_proposal_done(self):
+        self._proposal_running = False
+
+        # start the proposal for the choices made while this one was running
+        self._start_autopart_proposal()
+
+    @gtk_action_nowait
+    def _drop_autopart_proposal(self):
+        """ Forget the proposal once the accepted choices are executed. """
+        self._cancel_autopart_proposal()
+        self._accepted_key = None
+
+    def _use_autopart_proposal(self):
+        """ Use the autopart proposal computed for the accepted choices instead
+            of running doKickstartStorage.
+
+            :returns: whether the proposal was used
+            :rtype: bool
+        """
+        proposal = self._proposal
+        if not self.autopart or self.encrypted or not proposal or \
+           proposal.key != self._accepted_key:
+            return False
+
+        threadMgr.wait(proposal.thread_name)
+        if not proposal.computed:
+            return False
+
+        log.debug("using the autopart proposal")
+        self.data.clearpart.execute(self.storage, self.data, self.instclass)
+        self.storage.createFreeSpaceSnapshot()
+
+        # We can't overwrite the main Storage instance because all the other
+        # spokes have references to it, see CustomPartitioningSpoke._do_check.
+        new_storage = proposal.storage
+        self.storage.devicetree._devices = new_storage.devicetree._devices
+        self.storage.devicetree._actions = new_storage.devicetree._actions
+        self.storage.devicetree._hidden = new_storage.devicetree._hidden
+        self.storage.devicetree.dasd = new_storage.devicetree.dasd
+        self.storage.devicetree.names = new_storage.devicetree.names
+        self.storage.roots = new_storage.roots
+        self.storage.autoPartitionRequests = new_storage.autoPartitionRequests
+        self.storage.doAutoPart = True
+
+        self.data.bootloader.execute(self.storage, self.data, self.instclass)
+        self.storage.setUpBootLoader()
+        return True
 
     @gtk_action_nowait
     def execute(self):
@@ -324,7 +656,8 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         threadMgr.wait(constants.THREAD_DASDFMT)
         hubQ.send_message(self.__class__.__name__, _("Saving storage configuration..."))
         try:
-            doKickstartStorage(self.storage, self.data, self.instclass)
+            if not self._use_autopart_proposal():
+                doKickstartStorage(self.storage, self.data, self.instclass)
         except (StorageError, KickstartValueError) as e:
             log.error("storage configuration failed: %s", e)
             StorageChecker.errors = str(e).split("\n")
@@ -346,6 +679,7 @@ class StorageSpoke(NormalSpoke, StorageChecker):
             if self.autopart:
                 self.run()
         finally:
+            self._drop_autopart_proposal()
             resetCustomStorageData(self.data)
             self._ready = True
             hubQ.send_ready(self.__class__.__name__, True)
@@ -395,11 +729,22 @@ class StorageSpoke(NormalSpoke, StorageChecker):
 
     @property
     def localOverviews(self):
-        return self.local_disks_box.get_children()
+        return self._local_disks.overviews
 
     @property
     def advancedOverviews(self):
-        return [child for child in self.specialized_disks_box.get_children() if isinstance(child, AnacondaWidgets.DiskOverview)]
+        return self._advanced_disks.overviews
+
+    def _choose_disks(self, names, chosen):
+        """ Update self.selected_disks and the overviews of the disks. """
+        for name in names:
+            if chosen and name not in self.selected_disks:
+                self.selected_disks.append(name)
+            elif not chosen and name in self.selected_disks:
+                self.selected_disks.remove(name)
+
+        self._local_disks.update_chosen(names)
+        self._advanced_disks.update_chosen(names)
 
     def _on_disk_clicked(self, overview, event):
         # This handler only runs for these two kinds of events, and only for
@@ -411,6 +756,8 @@ class StorageSpoke(NormalSpoke, StorageChecker):
            event.keyval not in [Gdk.KEY_space, Gdk.KEY_Return, Gdk.KEY_ISO_Enter, Gdk.KEY_KP_Enter, Gdk.KEY_KP_Space]:
             return
 
+        name = overview.get_property("name")
+
         if event.type == Gdk.EventType.BUTTON_PRESS and \
                 event.state & Gdk.ModifierType.SHIFT_MASK:
             # clicked with Shift held down
@@ -419,40 +766,38 @@ class StorageSpoke(NormalSpoke, StorageChecker):
                 # nothing clicked before, cannot apply Shift-click
                 return
 
-            local_overviews = self.localOverviews
-            advanced_overviews = self.advancedOverviews
-
-            # find out which list of overviews the clicked one belongs to
-            if overview in local_overviews:
-                from_overviews = local_overviews
-            elif overview in advanced_overviews:
-                from_overviews = advanced_overviews
+            # find out which list of disks the clicked one belongs to
+            if name in self._local_disks.names:
+                from_names = self._local_disks.names
+            elif name in self._advanced_disks.names:
+                from_names = self._advanced_disks.names
             else:
                 # should never happen, but if it does, no other actions should be done
                 return
 
-            if self._last_clicked_overview in from_overviews:
-                # get index of the last clicked overview
-                last_idx = from_overviews.index(self._last_clicked_overview)
+            last_name = self._last_clicked_overview.get_property("name")
+            if last_name in from_names:
+                # get index of the last clicked disk
+                last_idx = from_names.index(last_name)
             else:
-                # overview from the other list clicked before, cannot apply "Shift-click"
+                # disk from the other list clicked before, cannot apply "Shift-click"
                 return
 
-            # get index and state of the clicked overview
-            cur_idx = from_overviews.index(overview)
-            state = self._last_clicked_overview.get_chosen()
+            # get index of the clicked disk and the state of the last clicked one
+            cur_idx = from_names.index(name)
+            state = last_name in self.selected_disks
 
             if cur_idx > last_idx:
-                copy_to = from_overviews[last_idx:cur_idx+1]
+                copy_to = from_names[last_idx:cur_idx+1]
             else:
-                copy_to = from_overviews[cur_idx:last_idx]
+                copy_to = from_names[cur_idx:last_idx]
 
-            # copy the state of the last clicked overview to the ones between it and the
+            # copy the state of the last clicked disk to the ones between it and the
             # one clicked with the Shift held down
-            for disk_overview in copy_to:
-                disk_overview.set_chosen(state)
+            self._choose_disks(copy_to, state)
+        else:
+            self._choose_disks([name], overview.get_chosen())
 
-        self._update_disk_list()
         self._update_summary()
 
     def _on_disk_focus_in(self, overview, event):
@@ -478,40 +823,39 @@ class StorageSpoke(NormalSpoke, StorageChecker):
 
         self._previous_autopart = self.autopart
 
-        # First, remove all non-button children.
-        for child in self.localOverviews + self.advancedOverviews:
-            child.destroy()
+        # the storage may have been rescanned
+        resize_info.prefetch(resizable_devices(self.storage, self.disks))
 
-        # Then deal with local disks, which are really easy.  They need to be
+        # First deal with local disks, which are really easy.  They need to be
         # handled here instead of refresh to take into account the user pressing
         # the rescan button on custom partitioning.
-        for disk in filter(isLocalDisk, self.disks):
-            # While technically local disks, zFCP devices are specialized
-            # storage and should not be shown here.
-            if disk.type is not "zfcp":
-                self._add_disk_overview(disk, self.local_disks_box)
+        # While technically local disks, zFCP devices are specialized storage
+        # and should not be shown here.
+        local_disks = [d for d in self.disks if isLocalDisk(d) and d.type is not "zfcp"]
 
         # Advanced disks are different.  Because there can potentially be a lot
         # of them, we do not display them in the box by default.  Instead, only
-        # those selected in the filter UI are displayed.  This means refresh
-        # needs to know to create and destroy overviews as appropriate.
+        # those selected in the filter UI are displayed.
+        disks_by_name = dict((d.name, d) for d in self.disks)
+        advanced_disks = []
         for name in self.data.ignoredisk.onlyuse:
-            if name not in disk_names:
-                continue
-            obj = self.storage.devicetree.getDeviceByName(name, hidden=True)
+            obj = disks_by_name.get(name)
             # since zfcp devices may be detected as local disks when added
             # manually, specifically check the disk type here to make sure
             # we won't accidentally bypass adding zfcp devices to the disk
             # overview
-            if isLocalDisk(obj) and obj.type is not "zfcp":
+            if obj is None or (isLocalDisk(obj) and obj.type is not "zfcp"):
                 continue
 
-            self._add_disk_overview(obj, self.specialized_disks_box)
+            advanced_disks.append(obj)
 
-        # update the selections in the ui
-        for overview in self.localOverviews + self.advancedOverviews:
-            name = overview.get_property("name")
-            overview.set_chosen(name in self.selected_disks)
+        # The overviews are created as they are scrolled into view and are
+        # chosen based on self.selected_disks.
+        free_space = self.storage.getFreeSpace(disks=local_disks + advanced_disks)
+        self._local_disks.update([self._disk_overview_data(d, free_space)
+                                  for d in local_disks])
+        self._advanced_disks.update([self._disk_overview_data(d, free_space)
+                                     for d in advanced_disks])
 
         self._customPart.set_active(not self.autopart)
 
@@ -539,10 +883,19 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         mainBox = self.builder.get_object("storageMainBox")
         mainBox.set_focus_vadjustment(mainViewport.get_vadjustment())
 
+        is_chosen = lambda name: name in self.selected_disks
+        self._local_disks = DiskOverviewList(self.local_disks_box,
+                                             localViewport.get_hadjustment(),
+                                             is_chosen, self._setup_disk_overview)
+        self._advanced_disks = DiskOverviewList(self.specialized_disks_box,
+                                                specializedViewport.get_hadjustment(),
+                                                is_chosen, self._setup_disk_overview)
+
         threadMgr.add(AnacondaThread(name=constants.THREAD_STORAGE_WATCHER,
                       target=self._initialize))
 
-    def _add_disk_overview(self, disk, box):
+    def _disk_overview_data(self, disk, free_space):
+        """ Return the (name, args) tuple of the disk for DiskOverviewList. """
         if disk.removable:
             kind = "drive-removable-media"
         else:
@@ -566,25 +919,15 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         else:
             description = disk.description
 
-        free = self.storage.getFreeSpace(disks=[disk])[disk.name][0]
-
-        overview = AnacondaWidgets.DiskOverview(description,
-                                                kind,
-                                                str(disk.size),
-                                                _("%s free") % free,
-                                                disk.name,
-                                                popup=popup_info)
-        box.pack_start(overview, False, False, 0)
-
-        # FIXME: this will need to get smarter
-        #
-        # maybe a little function that resolves each item in onlyuse using
-        # udev_resolve_devspec and compares that to the DiskDevice?
-        overview.set_chosen(disk.name in self.selected_disks)
+        free = free_space[disk.name][0]
+
+        return (disk.name, (description, kind, str(disk.size),
+                            _("%s free") % free, popup_info))
+
+    def _setup_disk_overview(self, overview):
         overview.connect("button-press-event", self._on_disk_clicked)
         overview.connect("key-release-event", self._on_disk_clicked)
         overview.connect("focus-in-event", self._on_disk_focus_in)
-        overview.show_all()
 
     def _initialize(self):
         hubQ.send_message(self.__class__.__name__, _("Probing storage..."))
@@ -594,6 +937,10 @@ class StorageSpoke(NormalSpoke, StorageChecker):
 
         self.disks = getDisks(self.storage.devicetree)
 
+        # start finding out how much the existing file systems can be shrunk
+        # for the reclaim space dialog
+        resize_info.prefetch(resizable_devices(self.storage, self.disks))
+
         # if there's only one disk, select it by default
         if len(self.disks) == 1 and not self.selected_disks:
             applyDiskSelection(self.storage, self.data, [self.disks[0].name])
@@ -642,17 +989,7 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         else:
             self.clear_info()
 
-    def _update_disk_list(self):
-        """ Update self.selected_disks based on the UI. """
-        for overview in self.localOverviews + self.advancedOverviews:
-            selected = overview.get_chosen()
-            name = overview.get_property("name")
-
-            if selected and name not in self.selected_disks:
-                self.selected_disks.append(name)
-
-            if not selected and name in self.selected_disks:
-                self.selected_disks.remove(name)
+        self._schedule_autopart_proposal()
 
     def run_dasdfmt(self):
         """
@@ -692,10 +1029,8 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         self.selected_disks = [d.name for d in dialog.disks]
 
         # update the UI to reflect changes to self.selected_disks
-        for overview in self.localOverviews:
-            name = overview.get_property("name")
-
-            overview.set_chosen(name in self.selected_disks)
+        self._local_disks.update_chosen()
+        self._advanced_disks.update_chosen()
 
         self._update_summary()
 
@@ -744,24 +1079,20 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         else:
             self.back_clicked = True
 
-        # Remove all non-existing devices if autopart was active when we last
-        # refreshed.
-        if self._previous_autopart:
-            self._previous_autopart = False
-            for partition in self.storage.partitions[:]:
-                # check if it's been removed in a previous iteration
-                if not partition.exists and \
-                   partition in self.storage.partitions:
-                    self.storage.recursiveRemove(partition)
-
-        # hide/unhide disks as requested
-        for disk in self.disks:
-            if disk.name not in self.selected_disks and \
-               disk in self.storage.devices:
-                self.storage.devicetree.hide(disk)
-            elif disk.name in self.selected_disks and \
-                 disk not in self.storage.devices:
-                self.storage.devicetree.unhide(disk)
+        # the autopart proposal can be used if the storage isn't changed
+        # other than here before running autopart
+        self._accepted_key = self._autopart_proposal_key()
+
+        # a running autopart proposal may be copying the storage and ksdata
+        with self._storage_lock:
+            # Remove all non-existing devices if autopart was active when we
+            # last refreshed.
+            if self._previous_autopart:
+                self._previous_autopart = False
+                self._remove_new_partitions(self.storage)
+
+            # hide/unhide disks as requested
+            self._hide_disks(self.storage, self.disks, self.selected_disks)
 
         # show the installation options dialog
         disks = [d for d in self.disks if d.name in self.selected_disks]
@@ -779,6 +1110,7 @@ class StorageSpoke(NormalSpoke, StorageChecker):
                 # We want to apply current selection before running dasdfmt to
                 # prevent this information from being lost afterward
                 applyDiskSelection(self.storage, self.data, self.selected_disks)
+                self._accepted_key = None
                 dialog = DasdFormatDialog(self.data, self.storage, dasds)
                 ignoreEscape(dialog.window)
                 rc = self.run_lightbox_dialog(dialog)
@@ -908,6 +1240,8 @@ class StorageSpoke(NormalSpoke, StorageChecker):
         NormalSpoke.on_back_clicked(self, button)
 
     def _show_resize_dialog(self, disks):
+        # the dialog changes the storage
+        self._accepted_key = None
         resizeDialog = ResizeDialog(self.data, self.storage, self.payload)
         resizeDialog.refresh(disks)
 
@@ -978,14 +1312,12 @@ class StorageSpoke(NormalSpoke, StorageChecker):
 
         # select disks in the right box
         if box is self.local_disks_box:
-            overviews = self.localOverviews
+            names = self._local_disks.names
         elif box is self.specialized_disks_box:
-            overviews = self.advancedOverviews
+            names = self._advanced_disks.names
         else:
             # no other box contains disk overviews
             return
 
-        for overview in overviews:
-            overview.set_chosen(True)
-
-        self._update_disk_list()
+        self._choose_disks(names, True)
+        self._schedule_autopart_proposal()
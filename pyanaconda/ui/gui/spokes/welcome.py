@@ -27,7 +27,7 @@ import os
 
 from pyanaconda.ui.gui.hubs.summary import SummaryHub
 from pyanaconda.ui.gui.spokes import StandaloneSpoke
-from pyanaconda.ui.gui.utils import setup_gtk_direction, escape_markup, gtk_action_wait
+from pyanaconda.ui.gui.utils import setup_gtk_direction, escape_markup, gtk_action_wait, gtk_batch_map
 from pyanaconda.ui.gui.xkl_wrapper import XklWrapper
 from pyanaconda.ui.gui.spokes.lib.lang_locale_handler import LangLocaleHandler
 
@@ -36,9 +36,10 @@ from pyanaconda.product import distributionText, isFinal, productName, productVe
 from pyanaconda import keyboard
 from pyanaconda import flags
 from pyanaconda import geoloc
+from pyanaconda.threads import threadMgr, AnacondaThread
 from pyanaconda.i18n import _, C_
 from pyanaconda.iutil import is_unsupported_hw, ipmi_report
-from pyanaconda.constants import DEFAULT_LANG, DEFAULT_KEYBOARD, IPMI_ABORTED
+from pyanaconda.constants import DEFAULT_LANG, DEFAULT_KEYBOARD, IPMI_ABORTED, THREAD_WELCOME_LANGUAGES
 
 import logging
 log = logging.getLogger("anaconda")
@@ -61,11 +62,17 @@ class WelcomeLanguageSpoke(LangLocaleHandler, StandaloneSpoke):
         LangLocaleHandler.__init__(self)
         self._xklwrapper = XklWrapper.get_instance()
         self._origStrings = {}
+        self._best_locale = DEFAULT_LANG
+        self._languages_added = False
 
     def apply(self):
         (store, itr) = self._localeSelection.get_selected()
 
-        locale = store[itr][1]
+        if itr:
+            locale = store[itr][1]
+        else:
+            # nothing selected yet while the language list is being filled
+            locale = self.data.lang.lang or self._best_locale
         self._set_lang(locale)
         localization.setup_locale(locale, self.data.lang)
 
@@ -166,6 +173,27 @@ class WelcomeLanguageSpoke(LangLocaleHandler, StandaloneSpoke):
         # We need to tell the view whether something is a separator or not.
         self._langView.set_row_separator_func(self._row_is_separator, None)
 
+        # the best locale is selected once the language list is filled in,
+        # until then there's nothing to continue with
+        if hasattr(self.window, "set_may_continue"):
+            self.window.set_may_continue(False)
+
+    def _add_languages(self):
+        # Computing the names of all the translations takes a while, so the
+        # languages are added from a separate thread in batches and the spoke
+        # can be shown and used right away.
+        threadMgr.add(AnacondaThread(name=THREAD_WELCOME_LANGUAGES,
+                                     target=self._add_languages_thread))
+
+    def _add_languages_thread(self):
+        translations = list(localization.get_available_translations())
+
+        # The rows are added below the separator (None) while geolocation
+        # is still running, the preferred languages are moved above it once
+        # the territory is known.
+        gtk_batch_map(self._add_language_row, [None] + translations,
+                      pre_func=self._get_language_row, batch_size=10)
+
         # We can use the territory from geolocation here
         # to preselect the translation, when it's available.
         territory = geoloc.get_territory_code(wait=True)
@@ -176,54 +204,57 @@ class WelcomeLanguageSpoke(LangLocaleHandler, StandaloneSpoke):
         else:
             locales = localization.get_territory_locales(territory) or [DEFAULT_LANG]
 
-        # get the data models
-        filter_store = self._languageStoreFilter
-        store = filter_store.get_model()
-
-        # get language codes for the locales
-        langs = [localization.parse_langcode(locale)['language'] for locale in locales]
-
-        # check which of the geolocated languages have translations
-        # and store the iterators for those languages in a dictionary
-        langs_with_translations = {}
-        itr = store.get_iter_first()
-        while itr:
-            row_lang = store[itr][2]
-            if row_lang in langs:
-                langs_with_translations[row_lang] = itr
-            itr = store.iter_next(itr)
-
-        # if there are no translations for the given locales,
-        # use default
-        if not langs_with_translations:
-            self._set_lang(DEFAULT_LANG)
-            localization.setup_locale(DEFAULT_LANG, self.data.lang)
-            lang_itr, _locale_itr = self._select_locale(self.data.lang.lang)
-            langs_with_translations[DEFAULT_LANG] = lang_itr
+        # get language codes of the locales we have translations for, those
+        # go to the top of the list, above the separator
+        langs = []
+        for locale in locales:
+            lang = localization.parse_langcode(locale)['language']
+            if lang in translations and lang not in langs:
+                langs.append(lang)
+
+        if langs:
+            # dump all locales of the languages we don't have translation for
+            locales = [l for l in locales
+                       if localization.parse_langcode(l)['language'] in langs]
+        else:
+            # no translations for the given locales, use default
             locales = [DEFAULT_LANG]
+            langs = [localization.parse_langcode(DEFAULT_LANG)['language']]
+
+        self._show_best_languages(langs, locales[0])
+
+    def _get_language_row(self, lang):
+        # runs outside of the main thread, None stands for the separator
+        if lang is None:
+            return None
+
+        return (localization.get_native_name(lang),
+                localization.get_english_name(lang), lang)
 
-        # go over all geolocated languages in reverse order
-        # and move those we have translation for to the top of the
-        # list, above the separator
-        for lang in reversed(langs):
-            itr = langs_with_translations.get(lang)
-            if itr:
-                store.move_after(itr, None)
-            else:
-                # we don't have translation for this language,
-                # so dump all locales for it
-                locales = [l for l in locales
-                           if localization.parse_langcode(l)['language'] != lang]
-
-        # And then we add a separator after the selected best language
-        # and any additional languages (that have translations) from geoip
-        newItr = store.insert(len(langs_with_translations))
-        store.set(newItr, 0, "", 1, "", 2, "", 3, True)
-
-        # setup the "best" locale
-        self._set_lang(locales[0])
-        localization.setup_locale(locales[0], self.data.lang)
-        self._select_locale(self.data.lang.lang)
+    def _add_language_row(self, row):
+        if row is not None:
+            self._add_language(self._languageStore, *row)
+        else:
+            self._languageStore.append(["", "", "", True])
+
+    @gtk_action_wait
+    def _show_best_languages(self, langs, best_locale):
+        # move the selected best language and any additional languages (that
+        # have translations) from geoip above the separator
+        rows = dict((row[2], row.iter) for row in self._languageStore)
+        separator = rows[""]
+        for lang in langs:
+            self._languageStore.move_before(rows[lang], separator)
+
+        self._best_locale = best_locale
+        self._languages_added = True
+
+        # setup the "best" locale unless the user has already chosen one
+        (_store, itr) = self._localeSelection.get_selected()
+        if itr is None:
+            self._set_lang(self._best_locale)
+            localization.setup_locale(self._best_locale, self.data.lang)
+            self._select_locale(self.data.lang.lang)
 
     def _retranslate_one(self, widgetName, context=None):
         widget = self.builder.get_object(widgetName)
@@ -270,7 +301,9 @@ class WelcomeLanguageSpoke(LangLocaleHandler, StandaloneSpoke):
         self.window.retranslate()
 
     def refresh(self):
-        self._select_locale(self.data.lang.lang)
+        # the best locale is selected when the language list is filled in
+        if self._languages_added:
+            self._select_locale(self.data.lang.lang)
         self._languageEntry.set_text("")
         self._languageStoreFilter.refilter()
 
@@ -29,6 +29,8 @@ and various modifications of keyboard layouts settings.
 
 """
 
+import os
+import json
 import threading
 import gettext
 from gi.repository import GdkX11, Xkl
@@ -36,7 +38,7 @@ from collections import namedtuple
 
 from pyanaconda import flags
 from pyanaconda import iutil
-from pyanaconda.constants import DEFAULT_KEYBOARD
+from pyanaconda.constants import DEFAULT_KEYBOARD, XKL_CATALOG_FILE
 from pyanaconda.keyboard import join_layout_variant, parse_layout_variant, KeyboardConfigError, InvalidLayoutVariantSpec
 from pyanaconda.ui.gui.utils import gtk_action_wait
 
@@ -49,6 +51,42 @@ iso_ = lambda x: gettext.ldgettext("iso_639", x)
 # namedtuple for information about a keyboard layout (its language and description)
 LayoutInfo = namedtuple("LayoutInfo", ["lang", "desc"])
 
+# xkeyboard-config data the layouts and switching options are read from
+XKB_RULES_DIR = "/usr/share/X11/xkb/rules"
+XKB_CONFIG_PC_FILE = "/usr/share/pkgconfig/xkeyboard-config.pc"
+
+# environment variables gettext uses to choose the translations
+GETTEXT_ENV_VARS = ("LANGUAGE", "LC_ALL", "LC_MESSAGES", "LANG")
+
+def get_xkb_data_version():
+    """
+    Get a string identifying the installed xkeyboard-config data.
+
+    The version of the package is not enough for data changed by an updates
+    image, so the modification time of the rules directory is included too.
+
+    :return: the identification or None if the data cannot be found
+    :rtype: str or None
+
+    """
+
+    version = "unknown"
+    try:
+        with open(XKB_CONFIG_PC_FILE) as pc_file:
+            for line in pc_file:
+                if line.startswith("Version:"):
+                    version = line.split(":", 1)[1].strip()
+                    break
+    except IOError:
+        pass
+
+    try:
+        mtime = os.stat(XKB_RULES_DIR).st_mtime
+    except OSError:
+        return None
+
+    return "%s %d" % (version, mtime)
+
 class XklWrapperError(KeyboardConfigError):
     """Exception class for reporting libxklavier-related problems"""
 
@@ -107,19 +145,100 @@ class XklWrapper(object):
                     # really wrong
                     raise XklWrapperError("Failed to initialize layouts")
 
-        #needed also for Gkbd.KeyboardDrawingDialog
-        self.configreg = Xkl.ConfigRegistry.get_instance(self._engine)
-        self.configreg.load(False)
-
+        self._configreg = None
         self._layout_infos = dict()
         self._switch_opt_infos = dict()
 
-        #this might take quite a long time
-        self.configreg.foreach_language(self._get_language_variants, None)
-        self.configreg.foreach_country(self._get_country_variants, None)
+        self._search_texts = None
+        self._search_texts_env = None
+
+        #enumerating the layouts takes quite a long time, use the catalog
+        #shipped in the installer image if it was made from the same data
+        if not self._load_catalog(get_xkb_data_version()):
+            self.configreg.foreach_language(self._get_language_variants, None)
+            self.configreg.foreach_country(self._get_country_variants, None)
+
+            #'grp' means that we want layout (group) switching options
+            self.configreg.foreach_option('grp', self._get_switch_option, None)
+
+    @property
+    def configreg(self):
+        """The libxklavier config registry (loaded on the first use)"""
+
+        #needed also for Gkbd.KeyboardDrawingDialog
+        if not self._configreg:
+            self._configreg = Xkl.ConfigRegistry.get_instance(self._engine)
+            self._configreg.load(False)
+
+        return self._configreg
+
+    def _load_catalog(self, data_version, cache_file=XKL_CATALOG_FILE):
+        """
+        Load the layouts and switching options stored by store_catalog.
+
+        :param data_version: identification of the current xkeyboard-config data
+        :return: whether the catalog was loaded or not
+        :rtype: bool
 
-        #'grp' means that we want layout (group) switching options
-        self.configreg.foreach_option('grp', self._get_switch_option, None)
+        """
+
+        if not data_version:
+            return False
+
+        try:
+            with open(cache_file) as f:
+                catalog = json.load(f)
+        except (IOError, ValueError):
+            return False
+
+        if not isinstance(catalog, dict) or catalog.get("version") != data_version:
+            return False
+
+        # json gives unicode objects, but gettext and the rest of the code
+        # expect UTF-8 encoded strings
+        enc = lambda u: u.encode("utf-8")
+        try:
+            layout_infos = dict((enc(name), LayoutInfo(enc(lang), enc(desc)))
+                                for (name, (lang, desc)) in catalog["layouts"].items())
+            switch_opt_infos = dict((enc(name), enc(desc))
+                                    for (name, desc) in catalog["switch_options"].items())
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            log.warning("Invalid layouts catalog %s: %s", cache_file, e)
+            return False
+
+        self._layout_infos = layout_infos
+        self._switch_opt_infos = switch_opt_infos
+        log.debug("Loaded %d layouts from %s", len(layout_infos), cache_file)
+        return True
+
+    def store_catalog(self, cache_file=XKL_CATALOG_FILE):
+        """
+        Store the layouts and switching options, so that they don't have to be
+        enumerated when the installer starts.
+
+        :param cache_file: path of the file to store the catalog to
+        :return: whether the catalog was stored or not
+        :rtype: bool
+
+        """
+
+        data_version = get_xkb_data_version()
+        if not data_version:
+            log.error("Failed to identify the xkeyboard-config data")
+            return False
+
+        catalog = {"version": data_version,
+                   "layouts": dict((name, list(info))
+                                   for (name, info) in self._layout_infos.items()),
+                   "switch_options": self._switch_opt_infos}
+        try:
+            with open(cache_file, "w") as f:
+                json.dump(catalog, f)
+        except (IOError, UnicodeDecodeError) as e:
+            log.error("Failed to store the layouts catalog: %s", e)
+            return False
+
+        return True
 
     def _get_lang_variant(self, c_reg, item, subitem, lang):
         if subitem:
@@ -236,6 +355,35 @@ class XklWrapper(object):
         else:
             return description
 
+    def search_layouts(self, text):
+        """
+        Find the layouts with descriptions matching the given text.
+
+        Every word of the text has to be found in the English, translated or
+        transliterated description of the layout-variant (see
+        iutil.have_word_match).
+
+        :param text: the searched text (e.g. 'cze qwe')
+        :type text: str or unicode
+        :return: the matching layout-variant specifications
+        :rtype: set
+
+        """
+
+        # the translated descriptions depend on the current language, they
+        # are only looked up and transliterated again when it changes
+        env = tuple(os.environ.get(var) for var in GETTEXT_ENV_VARS)
+        if self._search_texts is None or self._search_texts_env != env:
+            self._search_texts = dict()
+            for name in self._layout_infos:
+                xlated = self.get_layout_variant_description(name)
+                self._search_texts[name] = (self.get_layout_variant_description(name, xlated=False),
+                                            xlated, iutil.strip_accents(xlated).lower())
+            self._search_texts_env = env
+
+        return set(name for (name, texts) in self._search_texts.items()
+                   if any(iutil.have_word_match(text, value) for value in texts))
+
     def get_switch_opt_description(self, switch_opt):
         """
         Get description of the given layout switching option.
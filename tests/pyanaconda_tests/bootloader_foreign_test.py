@@ -0,0 +1,133 @@
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+# Test the boot menu entries of the other installed operating systems
+# These tests do not write anything to the disk and do not require root
+
+from mock import Mock, patch
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyanaconda import bootloader
+
+def _device(path, fmt, uuid=None):
+    device = Mock(path=path)
+    device.name = os.path.basename(path)
+    device.format.name = fmt
+    device.format.type = fmt
+    device.format.exists = True
+    device.format.uuid = uuid
+    device.format.label = None
+    return device
+
+def _storage(loader, devices, roots=None):
+    return Mock(bootloader=loader, devices=devices, roots=roots or [],
+                rootDevice=None)
+
+def _root(name, device):
+    root = Mock(device=device, mounts={})
+    root.name = name
+    return root
+
+class ForeignImagesBIOSTest(unittest.TestCase):
+    def setUp(self):
+        self.loader = bootloader.GRUB2()
+        self.loader.has_windows = Mock(return_value=True)
+        self.ntfs = _device("/dev/sda1", "ntfs")
+
+    @patch("pyanaconda.bootloader.has_windows_boot_block", return_value=True)
+    def windows_boot_block_test(self, has_boot_block):
+        """An ntfs partition with a windows boot block gets an entry"""
+        images = bootloader.foreignImages(_storage(self.loader, [self.ntfs]))
+        self.assertEqual([i.device for i in images], [self.ntfs])
+        has_boot_block.assert_called_once_with(self.ntfs)
+
+    @patch("pyanaconda.bootloader.has_windows_boot_block", return_value=False)
+    def data_partition_test(self, has_boot_block):
+        """An ntfs data partition doesn't get an entry"""
+        images = bootloader.foreignImages(_storage(self.loader, [self.ntfs]))
+        self.assertEqual(images, [])
+
+    def no_efi_configs_test(self):
+        """Linux entries don't look for configs on EFI system partitions"""
+        root = _device("/dev/sda2", "ext4", uuid="1234")
+        storage = _storage(self.loader, [root], [_root("Fedora 21", root)])
+        images = bootloader.foreignImages(storage)
+        self.assertIsNone(images[0].efi_config)
+        self.assertNotIn("else", self.loader._linux_entry(images[0]))
+
+class ForeignImagesEFITest(unittest.TestCase):
+    def setUp(self):
+        self.loader = bootloader.EFIGRUB()
+        self.loader.efi_dir = "redhat"
+        self.esp = _device("/dev/sda1", "efi", uuid="ABCD-1234")
+        self.ntfs = _device("/dev/sda2", "ntfs")
+        self.root = _device("/dev/sda3", "ext4", uuid="1234")
+
+        self.mountpoint = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.mountpoint)
+        patcher = patch("pyanaconda.bootloader.inspect_filesystem",
+                        side_effect=lambda device, func: func(self.mountpoint))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _add_file(self, path):
+        path = self.mountpoint + path
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, "w").close()
+
+    def windows_loader_test(self):
+        """An EFI system partition with the windows boot manager gets an entry"""
+        self._add_file(bootloader.WINDOWS_EFI_LOADER)
+        images = bootloader.foreignImages(_storage(self.loader, [self.esp, self.ntfs]))
+        self.assertEqual([i.device for i in images], [self.esp])
+        self.assertEqual(self.loader._windows_entry(images[0]),
+                         ["search --no-floppy --fs-uuid --set=root ABCD-1234",
+                          "chainloader %s" % bootloader.WINDOWS_EFI_LOADER])
+
+    def no_windows_loader_test(self):
+        """An ntfs partition without the windows boot manager doesn't get an entry"""
+        self._add_file("/EFI/BOOT/BOOTX64.EFI")
+        images = bootloader.foreignImages(_storage(self.loader, [self.esp, self.ntfs]))
+        self.assertEqual(images, [])
+
+    def efi_grub_config_test(self):
+        """A foreign linux entry falls back to its grub.cfg on the EFI system partition"""
+        self._add_file("/EFI/fedora/grub.cfg")
+        self._add_file("/EFI/ubuntu/grub.cfg")
+        self._add_file("/EFI/redhat/grub.cfg")
+        self._add_file("/EFI/BOOT/grub.cfg")
+
+        self.assertEqual(self.loader.foreign_efi_configs([self.esp]),
+                         [(self.esp, "/EFI/fedora/grub.cfg"),
+                          (self.esp, "/EFI/ubuntu/grub.cfg")])
+
+        storage = _storage(self.loader, [self.esp, self.root],
+                           [_root("Ubuntu 14.04", self.root)])
+        images = bootloader.foreignImages(storage)
+        self.assertEqual(images[0].efi_config, (self.esp, "/EFI/ubuntu/grub.cfg"))
+
+        entry = self.loader._linux_entry(images[0])
+        self.assertEqual(entry[-4:],
+                         ["else",
+                          "\tsearch --no-floppy --fs-uuid --set=root ABCD-1234",
+                          "\tconfigfile /EFI/ubuntu/grub.cfg",
+                          "fi"])
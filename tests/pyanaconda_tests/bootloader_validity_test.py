@@ -0,0 +1,88 @@
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+# Test that the cached results of the stage1/stage2 device checks are
+# dropped when the devices they depend on change
+
+from mock import Mock
+import unittest
+
+from pyanaconda.bootloader import GRUB2, _watch_actions
+
+def _device(name, device_type, **kwargs):
+    device = Mock(type=device_type, isDisk=device_type == "disk",
+                  exists=True, protected=False, encrypted=False, **kwargs)
+    device.name = name
+    return device
+
+class FakeDeviceTree(object):
+    def registerAction(self, action):
+        pass
+
+    def cancelAction(self, action):
+        pass
+
+_watch_actions(FakeDeviceTree)
+
+class ValidityCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.loader = GRUB2()
+        self.check = Mock(return_value=True)
+        self.check.__name__ = "check"
+        self.devicetree = FakeDeviceTree()
+
+        self.sda = _device("sda", "disk")
+        self.sda.format.labelType = "gpt"
+
+    def _assert_rechecked(self, device, mutate):
+        self.loader._check_validity(self.check, device)
+        self.loader._check_validity(self.check, device)
+        self.assertEqual(self.check.call_count, 1)
+
+        mutate()
+        self.loader._check_validity(self.check, device)
+        self.assertEqual(self.check.call_count, 2)
+
+    def register_action_test(self):
+        """Registering an action invalidates the cached result"""
+        part = _device("sda1", "partition", disks=[self.sda], partedPartition=None)
+        self._assert_rechecked(part, lambda: self.devicetree.registerAction(Mock()))
+
+    def cancel_action_test(self):
+        """Cancelling an action invalidates the cached result"""
+        part = _device("sda1", "partition", disks=[self.sda], partedPartition=None)
+        self._assert_rechecked(part, lambda: self.devicetree.cancelAction(Mock()))
+
+    def mountpoint_test(self):
+        """A changed mountpoint invalidates the cached result"""
+        part = _device("sda1", "partition", disks=[self.sda], partedPartition=None)
+        part.format.mountpoint = "/boot"
+        self._assert_rechecked(part, lambda: setattr(part.format, "mountpoint", "/boot/efi"))
+
+    def geometry_test(self):
+        """A reallocated partition invalidates the cached result"""
+        part = _device("sda1", "partition", disks=[self.sda])
+        part.partedPartition.geometry.end = 2048
+        self._assert_rechecked(part, lambda: setattr(part.partedPartition.geometry, "end", 4096))
+
+    def unchanged_test(self):
+        """The cached result is used while nothing changes"""
+        part = _device("sda1", "partition", disks=[self.sda], partedPartition=None)
+        for _i in range(3):
+            self.assertTrue(self.loader._check_validity(self.check, part))
+        self.assertEqual(self.check.call_count, 1)
@@ -0,0 +1,187 @@
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.efi import EFIBootManager, EFIBootError, EFI_GLOBAL_GUID
+from pyanaconda.efi import parse_load_option
+import unittest
+import uuid
+import tempfile
+import shutil
+import struct
+import os
+
+LOADER = "\\EFI\\fedora\\shim.efi"
+ESP = (1, 2048, 409600, "4c5a4b06-1b47-4c7c-9e5c-1f0f4f2d7d7a")
+# the same partition on the second disk of a RAID1
+ESP_SDB = ESP[:3] + ("a3b6e5a8-70f4-4c8e-8e1e-0d3a2b7c9f11",)
+
+def load_option(label, partition, loader):
+    """ Return an EFI_LOAD_OPTION booting the loader from the partition. """
+    hd_node = struct.pack("<BBHIQQ16sBB", 4, 1, 42, partition[0], partition[1],
+                          partition[2], uuid.UUID(partition[3]).bytes_le, 2, 2)
+    path = (loader + "\0").encode("utf-16-le")
+    file_node = struct.pack("<BBH", 4, 4, 4 + len(path)) + path
+    end_node = struct.pack("<BBH", 0x7f, 0xff, 4)
+    device_path = hd_node + file_node + end_node
+    return (struct.pack("<IH", 1, len(device_path)) +
+            (label + "\0").encode("utf-16-le") + device_path)
+
+class FakeEFIVars(object):
+    """ A file-backed efivars tree and an efibootmgr working on it. """
+    def __init__(self):
+        self.path = tempfile.mkdtemp()
+        self.calls = []
+        # partition signatures of the ESPs efibootmgr creates entries for
+        self.signatures = {"/dev/sda": ESP[3], "/dev/sdb": ESP_SDB[3]}
+
+    def cleanup(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, name, data):
+        with open("%s/%s-%s" % (self.path, name, EFI_GLOBAL_GUID), "wb") as f:
+            f.write(struct.pack("<I", 7) + data)
+
+    def add_entry(self, slot, label, partition, loader):
+        self._write("Boot" + slot, load_option(label, partition, loader))
+
+    def set_order(self, order):
+        self._write("BootOrder", struct.pack("<%dH" % len(order), *[int(s, 16) for s in order]))
+
+    def order(self):
+        manager = EFIBootManager(None, self.path)
+        manager.read()
+        return manager.boot_order
+
+    def efibootmgr(self, *args):
+        self.calls.append(args)
+        order = self.order()
+        if args[0] == "-b":
+            os.unlink("%s/Boot%s-%s" % (self.path, args[1], EFI_GLOBAL_GUID))
+            self.set_order([s for s in order if s != args[1]])
+        elif args[0] == "-c":
+            slot = "%04X" % (max([int(s, 16) for s in order] + [0]) + 1)
+            partition = ((int(args[args.index("-p") + 1]),) + ESP[1:3] +
+                         (self.signatures[args[args.index("-d") + 1]],))
+            self.add_entry(slot, args[args.index("-L") + 1], partition,
+                           args[args.index("-l") + 1])
+            self.set_order([slot] + order)
+        elif args[0] == "-o":
+            self.set_order(args[1].split(","))
+        return 0
+
+class EFIBootManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.efivars = FakeEFIVars()
+        self.manager = EFIBootManager(self.efivars.efibootmgr, self.efivars.path)
+
+    def tearDown(self):
+        self.efivars.cleanup()
+
+    def _update(self, **kwargs):
+        self.manager.read()
+        self.manager.update("Fedora", [("/dev/sda", ESP, LOADER)], **kwargs)
+
+    def parse_load_option_test(self):
+        data = load_option("Fedora", ESP, LOADER)
+        self.assertEqual(parse_load_option(data), (u"Fedora", ESP, LOADER))
+        self.assertRaises(ValueError, parse_load_option, "\0\0")
+
+    def up_to_date_test(self):
+        """Test that nothing is written when the entry is already there"""
+        self.efivars.add_entry("0000", "Fedora", ESP, LOADER.lower())
+        self.efivars.add_entry("0001", "Windows Boot Manager", (2, 1, 1, ESP[3]), "\\EFI\\Microsoft\\Boot\\bootmgfw.efi")
+        self.efivars.set_order(["0000", "0001"])
+
+        self._update()
+        self.assertEqual(self.efivars.calls, [])
+
+    def stale_entries_test(self):
+        """Test that only the stale entries are removed"""
+        self.efivars.add_entry("0000", "Fedora", (2, 4096, 409600, ESP[3]), LOADER)
+        self.efivars.add_entry("0001", "Windows Boot Manager", (2, 1, 1, ESP[3]), "\\EFI\\Microsoft\\Boot\\bootmgfw.efi")
+        self.efivars.add_entry("0002", "Fedora", ESP, LOADER)
+        self.efivars.set_order(["0001", "0000", "0002"])
+
+        self._update()
+        self.assertEqual(self.efivars.calls, [("-b", "0000", "-B"), ("-o", "0002,0001")])
+        self.assertEqual(self.efivars.order(), ["0002", "0001"])
+
+    def new_entry_test(self):
+        """Test that a missing entry is created without reordering"""
+        self.efivars.add_entry("0001", "Windows Boot Manager", (2, 1, 1, ESP[3]), "\\EFI\\Microsoft\\Boot\\bootmgfw.efi")
+        self.efivars.add_entry("0002", "Fedora", (3, 1, 1, ESP[3]), LOADER)
+        self.efivars.set_order(["0001", "0002"])
+
+        self._update()
+        self.assertEqual([c[0] for c in self.efivars.calls], ["-b", "-c"])
+        self.assertEqual(self.efivars.order(), ["0002", "0001"])
+
+    def keep_others_test(self):
+        """Test that other entries and the boot order are kept when asked to"""
+        self.efivars.add_entry("0001", "Fedora", (3, 1, 1, ESP[3]), LOADER)
+        self.efivars.add_entry("0002", "Fedora", ESP, LOADER)
+        self.efivars.set_order(["0001", "0002"])
+
+        self._update(keep_others=True)
+        self.assertEqual(self.efivars.calls, [])
+        self.assertEqual(self.efivars.order(), ["0001", "0002"])
+
+    def keep_others_new_entry_test(self):
+        """Test that a created entry goes last when the boot order is kept"""
+        self.efivars.add_entry("0001", "Windows Boot Manager", (2, 1, 1, ESP[3]), "\\EFI\\Microsoft\\Boot\\bootmgfw.efi")
+        self.efivars.add_entry("0002", "Fedora", (3, 1, 1, ESP[3]), LOADER)
+        self.efivars.set_order(["0002", "0001"])
+
+        self._update(keep_others=True)
+        self.assertEqual([c[0] for c in self.efivars.calls], ["-c", "-o"])
+        self.assertEqual(self.efivars.order(), ["0002", "0001", "0003"])
+
+    def raid1_test(self):
+        """Test that the ESPs of a RAID1 get an entry each"""
+        self.efivars.add_entry("0000", "Fedora", ESP, LOADER)
+        self.efivars.set_order(["0000"])
+
+        self.manager.read()
+        self.manager.update("Fedora", [("/dev/sda", ESP, LOADER),
+                                       ("/dev/sdb", ESP_SDB, LOADER)])
+        self.assertEqual(self.efivars.calls, [("-c", "-w", "-L", "Fedora", "-d", "/dev/sdb",
+                                               "-p", "1", "-l", LOADER),
+                                              ("-o", "0000,0001")])
+        self.assertEqual(self.efivars.order(), ["0000", "0001"])
+
+        # both entries are up to date now
+        self.efivars.calls = []
+        self.manager.read()
+        self.manager.update("Fedora", [("/dev/sda", ESP, LOADER),
+                                       ("/dev/sdb", ESP_SDB, LOADER)])
+        self.assertEqual(self.efivars.calls, [])
+
+    def unknown_signature_test(self):
+        """Test that an entry matches a target without a known signature"""
+        self.efivars.add_entry("0000", "Fedora", ESP, LOADER)
+        self.efivars.set_order(["0000"])
+
+        self.manager.read()
+        self.manager.update("Fedora", [("/dev/sda", ESP[:3] + (None,), LOADER)])
+        self.assertEqual(self.efivars.calls, [])
+
+    def failure_test(self):
+        """Test that a failed efibootmgr call raises EFIBootError"""
+        self.efivars.add_entry("0001", "Fedora", (3, 1, 1, ESP[3]), LOADER)
+        self.manager.efibootmgr = lambda *args: 1
+        self.assertRaises(EFIBootError, self._update)
@@ -0,0 +1,123 @@
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda import geoloc
+from pyanaconda import threads
+from mock import patch
+import unittest
+import threading
+import tempfile
+import shutil
+import json
+import os
+
+class FakeProvider(geoloc.GeolocationBackend):
+    def __init__(self, name, result, release=None):
+        geoloc.GeolocationBackend.__init__(self)
+        self._name = name
+        self._lookup_result = result
+        self._release = release
+
+    def get_name(self):
+        return self._name
+
+    def _refresh(self):
+        if self._release:
+            self._release.wait(5)
+        self._set_result(self._lookup_result)
+
+class CompositeGeoIPProviderTest(unittest.TestCase):
+    def setUp(self):
+        threads.initThreading()
+        patcher = patch("pyanaconda.geoloc.threadMgr", threads.threadMgr)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmpdir, "geoloc.json")
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        shutil.rmtree(self.tmpdir)
+
+    def _lookup(self, *providers):
+        composite = geoloc.CompositeGeoIPProvider(list(providers), self.cache_file)
+        return composite.lookup()
+
+    def first_result_test(self):
+        """Test that the first result is used without waiting for the others"""
+        slow = FakeProvider("slow", geoloc.LocationResult("CZ", "Europe/Prague"), self.release)
+        failing = FakeProvider("failing", None)
+        fast = FakeProvider("fast", geoloc.LocationResult("DE", "Europe/Berlin",
+                                                          public_ip_address="192.0.2.1"))
+
+        result = self._lookup(slow, failing, fast)
+        self.assertEqual(result.territory_code, "DE")
+        self.assertEqual(result.timezone, "Europe/Berlin")
+
+        self.release.set()
+        threads.threadMgr.wait_all()
+        self.assertIsNone(slow.get_result())
+
+        with open(self.cache_file) as f:
+            self.assertEqual(json.load(f), {"ip": "192.0.2.1", "territory": "DE",
+                                            "timezone": "Europe/Berlin"})
+
+    @patch("pyanaconda.geoloc.get_preferred_timezone", lambda territory: "Europe/Berlin")
+    def cached_timezone_test(self):
+        """Test that a missing time zone is taken from the stored result"""
+        with open(self.cache_file, "w") as f:
+            json.dump({"ip": "192.0.2.1", "territory": "DE", "timezone": "Europe/Busingen"}, f)
+
+        hostip = FakeProvider("hostip", geoloc.LocationResult("DE", public_ip_address="192.0.2.1"))
+        result = self._lookup(hostip)
+        self.assertEqual(result.timezone, "Europe/Busingen")
+        self.assertEqual(result.timezone_source, "cache")
+
+        hostip = FakeProvider("hostip", geoloc.LocationResult("DE", public_ip_address="192.0.2.2"))
+        result = self._lookup(hostip)
+        self.assertEqual(result.timezone, "Europe/Berlin")
+
+    def invalid_territory_test(self):
+        """Test that the results with an invalid territory code are ignored"""
+        unknown = FakeProvider("unknown", geoloc.LocationResult("XX", "Europe/Prague"))
+        lowercase = FakeProvider("lowercase", geoloc.LocationResult("cz", "Europe/Prague"))
+        valid = FakeProvider("valid", geoloc.LocationResult("DE", "Europe/Berlin"), self.release)
+
+        composite = geoloc.CompositeGeoIPProvider([unknown, lowercase, valid], self.cache_file)
+        thread = threading.Thread(target=composite.lookup)
+        thread.start()
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(composite.get_result().territory_code, "DE")
+
+        self.assertFalse(geoloc.is_valid_territory_code(None))
+        self.assertFalse(geoloc.is_valid_territory_code("EU"))
+        self.assertTrue(geoloc.is_valid_territory_code("CZ"))
+
+    def cancel_before_lookup_test(self):
+        """Test that a provider cancelled before its lookup runs stays cancelled"""
+        provider = FakeProvider("late", geoloc.LocationResult("CZ", "Europe/Prague"))
+        provider.reset()
+        provider.cancel()
+        self.assertIsNone(provider.lookup())
+
+        # a new lookup starts from scratch
+        provider.reset()
+        self.assertEqual(provider.lookup().territory_code, "CZ")
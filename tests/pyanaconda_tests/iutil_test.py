@@ -404,6 +404,49 @@ done
             proc.communicate()
         self.assertRaises(iutil.ExitError, iutil.watchProcess, proc, "test2")
 
+    def sysroot_exec_server_test(self):
+        """Test SysrootExecServer"""
+
+        server = iutil.SysrootExecServer("/", helper=self._sysroot_exec_helper())
+        server.start()
+        try:
+            with timer(5):
+                # return codes are returned in order
+                self.assertEqual(server.run([["true"], ["false"], ["ls", "--help"]]),
+                                 [0, 1, 0])
+
+                # the server keeps running between batches
+                self.assertTrue(server.running)
+                self.assertEqual(server.run([["/bin/sh", "-c", "echo one; exit 3"]]), [3])
+
+                # a missing command raises OSError and the server survives it
+                self.assertRaises(OSError, server.run, [["asdasdadasd"], ["true"]])
+                self.assertEqual(server.run([["true"]]), [0])
+        finally:
+            server.stop()
+
+        self.assertFalse(server.running)
+
+    def sysroot_exec_server_exit_test(self):
+        """Test SysrootExecServer when the helper process exits"""
+
+        server = iutil.SysrootExecServer("/", helper=self._sysroot_exec_helper())
+        server.start()
+        try:
+            with timer(5):
+                server._proc.kill()
+                server._proc.wait()
+
+                # the batch fails and the server is not running anymore
+                self.assertRaises(OSError, server.run, [["true"]])
+                self.assertFalse(server.running)
+        finally:
+            server.stop()
+
+    def _sysroot_exec_helper(self):
+        # top_srcdir should have been set by nosetests.sh
+        return os.path.join(os.environ['top_srcdir'], 'scripts', 'anaconda-sysroot-exec')
+
 class MiscTests(unittest.TestCase):
     def get_dir_size_test(self):
         """Test the getDirSize."""
@@ -418,8 +461,56 @@ class MiscTests(unittest.TestCase):
         self.assertIsInstance(iutil.getDirSize('/dev/null'), int)
         self.assertIsInstance(iutil.getDirSize('/dev/null/foo'), int)
 
-        # TODO: mock some dirs and check if their size is
-        # computed correctly
+        # check the size of a real tree is computed correctly
+        test_dir = tempfile.mkdtemp()
+        try:
+            for subdir in ("a", "b", "b/c"):
+                os.mkdir(os.path.join(test_dir, subdir))
+            for (path, size) in (("f", 4096), ("a/f", 8192), ("b/c/f", 2048)):
+                with open(os.path.join(test_dir, path), "w") as f:
+                    f.write("x" * size)
+            os.symlink("/dev/null", os.path.join(test_dir, "b/link"))
+
+            self.assertEqual(iutil.getDirSize(test_dir), 14)
+            self.assertEqual(iutil.getDirSize(test_dir, workers=1), 14)
+        finally:
+            shutil.rmtree(test_dir)
+
+    def walk_dir_tree_test(self):
+        """Test walk_dir_tree."""
+
+        test_dir = tempfile.mkdtemp()
+        try:
+            for subdir in ("a", "b", "b/c"):
+                os.mkdir(os.path.join(test_dir, subdir))
+            for path in ("f", "a/f", "b/c/f"):
+                open(os.path.join(test_dir, path), "w").close()
+            os.symlink(os.path.join(test_dir, "a"), os.path.join(test_dir, "b/link"))
+
+            for workers in (1, 4):
+                visited = []
+                count = iutil.walk_dir_tree(test_dir, lambda e: visited.append(e.path) or 1,
+                                            workers=workers)
+                expected = [test_dir] + [os.path.join(test_dir, p) for p in
+                                         ("f", "a", "a/f", "b", "b/c", "b/c/f", "b/link")]
+                self.assertEqual(count, len(expected))
+                self.assertEqual(sorted(visited), sorted(expected))
+
+            # the directory symlink is skipped by dir_tree_map
+            visited = []
+            iutil.dir_tree_map(test_dir, visited.append, dirs=False)
+            self.assertEqual(sorted(visited),
+                             sorted(os.path.join(test_dir, p) for p in ("f", "a/f", "b/c/f")))
+
+            # chown to the current owner is always allowed
+            iutil.chown_dir_tree(test_dir, os.getuid(), os.getgid(),
+                                 from_uid_only=os.getuid())
+        finally:
+            shutil.rmtree(test_dir)
+
+        # nothing to walk in a file or a missing path
+        self.assertEqual(iutil.walk_dir_tree('/dev/null', lambda e: 1), 0)
+        self.assertEqual(iutil.walk_dir_tree('/dev/null/foo', lambda e: 1), 0)
 
     def mkdir_chain_test(self):
         """Test mkdirChain."""
@@ -19,6 +19,9 @@
 #
 
 from pyanaconda import keyboard
+from pyanaconda import threads
+from mock import patch
+import threading
 import unittest
 
 class ParsingAndJoiningTests(unittest.TestCase):
@@ -84,3 +87,95 @@ class ParsingAndJoiningTests(unittest.TestCase):
         self.assertEqual(keyboard.normalize_layout_variant("cz(qwerty)"), "cz (qwerty)")
         self.assertEqual(keyboard.normalize_layout_variant("cz ( qwerty )"), "cz (qwerty)")
         self.assertEqual(keyboard.normalize_layout_variant("cz "), "cz")
+
+class FakeLocaled(object):
+    """A stand-in for systemd-localed with a small conversion table."""
+
+    KEYMAPS = {"cz-us-qwertz": ("cz,us", ",")}
+    LAYOUTS = {"cz": "cz-us-qwertz", "us": "us"}
+
+    def __init__(self):
+        self.keymap = "us"
+        self.layouts = "us"
+        self.variants = ""
+        self.options = ""
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def call_sync(self, service, obj_path, iface, method, args, connection=None):
+        self.calls.append((method, args))
+        if method == "SetVConsoleKeyboard":
+            (self.keymap, _toggle, convert, _interactive) = args
+            if convert:
+                (self.layouts, self.variants) = self.KEYMAPS.get(self.keymap, (self.layouts, self.variants))
+        elif method == "SetX11Keyboard":
+            self.entered.set()
+            self.release.wait()
+            (self.layouts, _model, self.variants, self.options, convert, _interactive) = args
+            if convert:
+                self.keymap = self.LAYOUTS.get(self.layouts.split(",")[0], self.keymap)
+
+    def get_property_sync(self, service, obj_path, iface, prop_name, connection=None):
+        values = {"VConsoleKeymap": self.keymap, "X11Layout": self.layouts,
+                  "X11Variant": self.variants, "X11Options": self.options}
+        return (values[prop_name],)
+
+class LocaledWrapperTests(unittest.TestCase):
+    def setUp(self):
+        threads.initThreading()
+        self.localed = FakeLocaled()
+        self.patches = [patch("pyanaconda.keyboard.threadMgr", threads.threadMgr),
+                        patch("pyanaconda.keyboard.GLib.Variant", lambda fmt, args: args),
+                        patch("pyanaconda.keyboard.safe_dbus.get_new_system_connection", lambda: None),
+                        patch("pyanaconda.keyboard.safe_dbus.call_sync", self.localed.call_sync),
+                        patch("pyanaconda.keyboard.safe_dbus.get_property_sync", self.localed.get_property_sync),
+                        patch.object(keyboard.LocaledWrapper, "_keymap_conversions", dict()),
+                        patch.object(keyboard.LocaledWrapper, "_layout_conversions", dict())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    def conversions_cached_test(self):
+        """Conversions should be done by localed only once."""
+
+        wrapper = keyboard.LocaledWrapper()
+        self.assertEqual(wrapper.convert_keymap("cz-us-qwertz"), "cz,us")
+        self.assertEqual(wrapper.convert_layout("cz"), "cz-us-qwertz")
+
+        self.localed.calls = []
+        self.assertEqual(keyboard.LocaledWrapper().convert_keymap("cz-us-qwertz"), "cz,us")
+        self.assertEqual(keyboard.LocaledWrapper().convert_layout("cz"), "cz-us-qwertz")
+        self.assertEqual(self.localed.calls, [])
+
+        # setting still has to happen, but gives the conversion for later
+        self.assertEqual(wrapper.set_and_convert_layout("us"), "us")
+        self.localed.calls = []
+        self.assertEqual(wrapper.convert_layout("us"), "us")
+        self.assertEqual(self.localed.calls, [])
+
+    def set_layouts_async_test(self):
+        """Successive asynchronous layout changes should be coalesced."""
+
+        wrapper = keyboard.LocaledWrapper()
+        self.localed.release.clear()
+        wrapper.set_layouts_async(["cz"])
+        self.localed.entered.wait()
+
+        # these come while the first call is in progress
+        wrapper.set_layouts_async(["de"])
+        wrapper.set_layouts_async(["cz (qwerty)", "us"], ["grp:alt_shift_toggle"])
+
+        # raises before anything is queued
+        self.assertRaises(keyboard.InvalidLayoutVariantSpec, wrapper.set_layouts_async, ["&*&"])
+
+        self.localed.release.set()
+        self.assertEqual(wrapper.layouts_variants, ["cz (qwerty)", "us"])
+        self.assertEqual(wrapper.options, "grp:alt_shift_toggle")
+
+        set_calls = [args[0] for (method, args) in self.localed.calls if method == "SetX11Keyboard"]
+        self.assertEqual(set_calls, ["cz", "cz,us"])
@@ -0,0 +1,167 @@
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from mock import Mock
+import unittest
+import sys
+
+class PreScriptTextTest(unittest.TestCase):
+    def setUp(self):
+        sys.modules["anaconda_log"] = Mock()
+        sys.modules["block"] = Mock()
+
+        from pyanaconda import kickstart
+        self.parser = kickstart.AnacondaPreParser(kickstart.AnacondaKSHandler())
+
+    def _pre_text(self, lines):
+        return self.parser._preScriptText("".join(line + "\n" for line in lines)).split("\n")[:-1]
+
+    def pre_sections_kept_test(self):
+        """Only the %pre sections should be kept"""
+        ks = ["text",
+              "%pre",
+              "echo pre",
+              "%end",
+              "%post",
+              "echo post",
+              "%end",
+              "%packages",
+              "vim",
+              "%end"]
+        self.assertEqual(self._pre_text(ks),
+                         ["", "%pre", "echo pre", "%end", "", "", "", "", "", ""])
+
+    def line_numbers_test(self):
+        """The line numbers should stay the same"""
+        ks = ["network --bootproto=dhcp", "", "%pre --interpreter=/usr/bin/bash", "true", "%end",
+              "rootpw --plaintext secret"]
+        self.assertEqual(len(self._pre_text(ks)), len(ks))
+        self.assertEqual(self._pre_text(ks)[2:5], ks[2:5])
+
+    def unterminated_section_test(self):
+        """A section without %end should end at the next section"""
+        ks = ["%packages",
+              "vim",
+              "%pre",
+              "echo pre",
+              "%end"]
+        self.assertEqual(self._pre_text(ks), ["", "", "%pre", "echo pre", "%end"])
+
+    def includes_test(self):
+        """Only the top level and %pre %include lines should be kept"""
+        ks = ["%include /tmp/part-include",
+              "%ksappend /tmp/append",
+              "%packages",
+              "%include /tmp/packages",
+              "%end",
+              "%pre",
+              "%include /tmp/in-pre",
+              "%end",
+              "%post",
+              "%include /tmp/in-post",
+              "%end"]
+        self.assertEqual(self._pre_text(ks),
+                         ["%include /tmp/part-include", "%ksappend /tmp/append",
+                          "", "", "",
+                          "%pre", "%include /tmp/in-pre", "%end",
+                          "", "", ""])
+
+class FakeDeviceTree(object):
+    def __init__(self, devices):
+        self.devices = devices
+        self.actions = []
+
+    def registerAction(self, action):
+        self.actions.append(action)
+
+    def cancelAction(self, action):
+        self.actions.remove(action)
+
+    def resolveDevice(self, devspec):
+        return None
+
+def _device(name, uuid=None, label=None, req_name=None):
+    dev = Mock(path="/dev/" + name, uuid=None, req_name=req_name, complete=True)
+    dev.name = name
+    dev.format.uuid = uuid
+    dev.format.label = label
+    return dev
+
+class DeviceSpecIndexTest(unittest.TestCase):
+    def setUp(self):
+        sys.modules["anaconda_log"] = Mock()
+        sys.modules["block"] = Mock()
+
+        from pyanaconda import kickstart
+        self.kickstart = kickstart
+
+        self.sda1 = _device("sda1", uuid="1234", label="boot")
+        self.sdb1 = _device("sdb1", uuid="5678", req_name="raid.01")
+        self.tree = FakeDeviceTree([self.sda1, self.sdb1])
+        self.index = kickstart.DeviceSpecIndex(self.tree)
+
+    def lookup_test(self):
+        """Devices are found by name, path, UUID, label and req_name"""
+        for spec in ("sda1", "/dev/sda1", "UUID=1234", "LABEL=boot"):
+            self.assertIs(self.index.lookup(spec), self.sda1)
+        self.assertIs(self.index.lookupAlias("raid.01"), self.sdb1)
+        self.assertIsNone(self.index.lookup("sdc"))
+        self.assertIsNone(self.index.lookupAlias("raid.02"))
+
+    def renamed_test(self):
+        """A renamed device isn't returned for its old name"""
+        self.index.lookup("sda1")
+        self.sda1.name = "sda2"
+        self.sda1.path = "/dev/sda2"
+        self.assertIsNone(self.index.lookup("sda1"))
+
+    def ambiguous_test(self):
+        """Keys matching several devices are left to the devicetree"""
+        self.sdb1.format.label = "boot"
+        self.assertIsNone(self.index.lookup("LABEL=boot"))
+
+    def actions_test(self):
+        """Registering or cancelling an action drops the index"""
+        self.index.attach()
+        self.assertIsNone(self.index.lookup("sdc1"))
+
+        sdc1 = _device("sdc1")
+        self.tree.devices.append(sdc1)
+        self.tree.registerAction("create sdc1")
+        self.assertEqual(self.tree.actions, ["create sdc1"])
+        self.assertIs(self.index.lookup("sdc1"), sdc1)
+
+        self.tree.devices.remove(sdc1)
+        self.tree.cancelAction("create sdc1")
+        self.assertIsNone(self.index.lookup("sdc1"))
+
+        self.index.detach()
+        self.assertNotIn("registerAction", vars(self.tree))
+
+    def resolve_fallback_test(self):
+        """Specs missing in the index are resolved by the devicetree"""
+        other = _device("md127")
+        self.tree.resolveDevice = Mock(return_value=other)
+        self.kickstart._device_indexes[self.tree] = self.index
+        try:
+            self.assertIs(self.kickstart.resolveDevice(self.tree, "sda1"), self.sda1)
+            self.assertFalse(self.tree.resolveDevice.called)
+            self.assertIs(self.kickstart.resolveDevice(self.tree, "/dev/md/root"), other)
+            self.tree.resolveDevice.assert_called_once_with("/dev/md/root")
+        finally:
+            del self.kickstart._device_indexes[self.tree]
@@ -19,9 +19,14 @@
 # Red Hat Author(s): Radek Vykydal <rvykydal@redhat.com>
 
 from pyanaconda import network
+from pyanaconda import threads
+from pyanaconda import constants
 import unittest
 import mock
 from mock import patch
+import tempfile
+import shutil
+import os
 
 class NetworkTests(unittest.TestCase):
 
@@ -152,6 +157,25 @@ class NetworkTests(unittest.TestCase):
         self.assertEqual(network.ks_spec_to_device_name("bootif"), "eth1")
         self.assertNotEqual(network.ks_spec_to_device_name("bootif"), "eth0")
 
+    @patch("pyanaconda.nm.nm_wait_for")
+    @patch("pyanaconda.nm.nm_activate_device_connection")
+    def activate_connections_test(self, activate_mock, wait_mock):
+        activated = []
+        activate_mock.side_effect = lambda dev_name, con_uuid: activated.append(con_uuid)
+        wait_mock.side_effect = lambda check, timeout: activated.append("wait") or True
+
+        threads.initThreading()
+        with patch("pyanaconda.network.threadMgr", threads.threadMgr):
+            network._activate_connections([("vlan", None, "eth0"),
+                                           ("eth0", "eth0", None),
+                                           ("bond0", None, None),
+                                           ("slave", "eth1", None),
+                                           ("vlan2", None, "eth9")])
+            threads.threadMgr.wait(constants.THREAD_NETWORK_STACKED)
+
+        # the vlan on eth0 waits for eth0 in a thread, the one on eth9 doesn't
+        self.assertEqual(activated, ["eth0", "bond0", "slave", "vlan2", "wait", "vlan"])
+
 class NetworkKSDataTests(unittest.TestCase):
 
     def setUp(self):
@@ -334,3 +358,52 @@ class NetworkIfcfgTests(unittest.TestCase):
                 set(["rd.znet=qeth,0.0.f5f0,0.0.f5f1,0.0.f5f2,layer2=1,portname=OSAPORT",
                      "ip=10.34.102.233::10.34.102.254:255.255.255.0::eth0:none"]))
 
+
+class IfcfgIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = network.IfcfgIndex(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content, mtime=None):
+        path = os.path.join(self.directory, "ifcfg-%s" % name)
+        with open(path, "w") as f:
+            f.write(content)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def find_test(self):
+        ens3 = self._write("ens3", 'DEVICE=ens3\nHWADDR="52:54:00:12:34:56"\nUUID=1234\n')
+        slave = self._write("bond0_slave_1", 'HWADDR=52:54:00:AB:CD:EF\nMASTER=bond0\n')
+        self._write("lo", 'DEVICE=lo\n')
+
+        self.assertEqual(self.index.find([("DEVICE", "ens3")]), ens3)
+        self.assertEqual(self.index.find([("uuid", "1234")]), ens3)
+        self.assertEqual(self.index.find([("HWADDR", "52:54:00:ab:cd:ef")]), slave)
+        self.assertEqual(self.index.find([("HWADDR", "52:54:00:ab:cd:ef"),
+                                          ("MASTER", lambda x: x)]), slave)
+        self.assertEqual(self.index.find([("HWADDR", "52:54:00:12:34:56"),
+                                          ("MASTER", lambda x: x)]), None)
+        self.assertEqual(self.index.find([("DEVICE", "lo")]), None)
+        self.assertEqual([path for (path, _values) in
+                          self.index.find_all([("MASTER", ["bond0", "5678"])])],
+                         [slave])
+
+    def refresh_test(self):
+        ens3 = self._write("ens3", 'DEVICE=ens3\n', mtime=1000)
+        self.assertEqual(self.index.find([("DEVICE", "ens3")]), ens3)
+
+        self._write("ens3", 'DEVICE=ens4\n', mtime=2000)
+        self.assertEqual(self.index.find([("DEVICE", "ens3")]), None)
+        self.assertEqual(self.index.find([("DEVICE", "ens4")]), ens3)
+
+        os.unlink(ens3)
+        self.assertEqual(self.index.find([("DEVICE", "ens4")]), None)
+
+    def empty_value_test(self):
+        """Test that files without the key match an empty value"""
+        ens3 = self._write("ens3", 'DEVICE=ens3\n')
+        self.assertEqual(self.index.find([("MASTER", "")]), ens3)
@@ -20,7 +20,10 @@
 
 from pyanaconda import nm
 import unittest
+from mock import Mock, patch
 import socket
+import threading
+import time
 
 class UtilityFunctionsTests(unittest.TestCase):
 
@@ -44,3 +47,83 @@ class UtilityFunctionsTests(unittest.TestCase):
         self.assertEqual(nm.nm_ipv4_to_dbus_int("192.168.102.1"),
                          socket.ntohl(3232261633))
 
+
+class FakeVariant(object):
+    def __init__(self, value):
+        self._value = value
+
+    def unpack(self):
+        return self._value
+
+class NMObjectCacheTests(unittest.TestCase):
+    DEVICE = nm.NM_DEVICES_PATH + "1"
+    DEVICE_IFACE = "org.freedesktop.NetworkManager.Device"
+    WIRED_IFACE = "org.freedesktop.NetworkManager.Device.Wired"
+
+    def setUp(self):
+        self.cache = nm.NMObjectCache()
+        self.cache._subscribed = True
+        self.cache._properties[self.DEVICE] = {
+            self.DEVICE_IFACE: {"State": 30, "Interface": "ens3"},
+            self.WIRED_IFACE: {"Carrier": False},
+        }
+        self.cache._device_paths["ens3"] = self.DEVICE
+
+    def _signal(self, object_path, interface, signal, *params):
+        self.cache._on_signal(None, nm.NM_SERVICE, object_path, interface,
+                              signal, FakeVariant(params))
+
+    def _get(self, interface, prop):
+        return self.cache.get_property(self.DEVICE, interface, prop)
+
+    def cached_property_test(self):
+        self.assertEqual(self._get(self.DEVICE_IFACE, "Interface"), (True, "ens3"))
+        self.assertEqual(self._get(self.DEVICE_IFACE, "Nonexisting"), (True, None))
+        self.assertEqual(self.cache.get_property("/org/freedesktop/NetworkManager", self.DEVICE_IFACE, "State"),
+                         (False, None))
+
+    def properties_changed_test(self):
+        # NM emits the changes of all the interfaces on the most specific one
+        self._signal(self.DEVICE, self.WIRED_IFACE, "PropertiesChanged", {"Carrier": True, "State": 100})
+        self.assertEqual(self._get(self.WIRED_IFACE, "Carrier"), (True, True))
+        self.assertEqual(self._get(self.DEVICE_IFACE, "State"), (True, 100))
+
+        # invalidated properties are read again with all the others
+        proxy = Mock()
+        proxy.GetAll.return_value = {"State": 20, "Interface": "ens4"}
+        with patch("pyanaconda.nm._get_proxy", return_value=proxy):
+            self._signal(self.DEVICE, "org.freedesktop.DBus.Properties", "PropertiesChanged",
+                         self.DEVICE_IFACE, {"State": 20}, ["Interface"])
+            self.assertNotIn(self.DEVICE_IFACE, self.cache._properties[self.DEVICE])
+            self.assertEqual(self._get(self.DEVICE_IFACE, "Interface"), (True, "ens4"))
+            self.assertEqual(self._get(self.DEVICE_IFACE, "State"), (True, 20))
+            proxy.GetAll.assert_called_once_with('(s)', self.DEVICE_IFACE)
+        self.assertEqual(self._get(self.WIRED_IFACE, "Carrier"), (True, True))
+
+    def state_changed_test(self):
+        self._signal(self.DEVICE, self.DEVICE_IFACE, "StateChanged", 100, 30, 0)
+        self.assertEqual(self._get(self.DEVICE_IFACE, "State"), (True, 100))
+
+        # the StateChanged of NetworkManager itself is not about devices
+        self._signal(nm.NM_OBJECT_PATH, nm.NM_SERVICE, "StateChanged", 70)
+        self.assertEqual(self._get(self.DEVICE_IFACE, "State"), (True, 100))
+
+    def device_removed_test(self):
+        self._signal(nm.NM_OBJECT_PATH, nm.NM_SERVICE, "DeviceRemoved", self.DEVICE)
+        self.assertNotIn(self.DEVICE, self.cache._properties)
+        self.assertEqual(self.cache._device_paths, {})
+
+    def wait_for_test(self):
+        state = {"connected": False}
+        def connect():
+            state["connected"] = True
+            self._signal(nm.NM_OBJECT_PATH, nm.NM_SERVICE, "StateChanged", 70)
+
+        timer = threading.Timer(0.1, connect)
+        timer.start()
+        start = time.time()
+        self.assertTrue(self.cache.wait_for(lambda: state["connected"], 10))
+        self.assertLess(time.time() - start, 5)
+        timer.join()
+
+        self.assertFalse(self.cache.wait_for(lambda: False, 0.1))
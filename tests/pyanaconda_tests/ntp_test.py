@@ -0,0 +1,107 @@
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda import ntp
+from pyanaconda import threads
+from mock import patch
+import unittest
+import threading
+import socket
+import ntplib
+import time
+
+class FakeNTPServer(object):
+    """ A local UDP server answering (or not) the NTP requests. """
+    def __init__(self, reply=True):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        self.requests = 0
+        if reply:
+            self.thread = threading.Thread(target=self._serve)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                (_data, address) = self.socket.recvfrom(256)
+            except socket.error:
+                return
+            self.requests += 1
+            now = ntplib.system_to_ntp_time(time.time())
+            packet = ntplib.NTPPacket(version=2, mode=4, tx_timestamp=now)
+            packet.stratum = 2
+            packet.recv_timestamp = now
+            self.socket.sendto(packet.to_data(), address)
+
+    def close(self):
+        self.socket.close()
+
+class NTPServerStatusTest(unittest.TestCase):
+    def setUp(self):
+        self.results = []
+        self.done = threading.Event()
+        threads.initThreading()
+        patcher = patch("pyanaconda.ntp.threadMgr", threads.threadMgr)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _callback(self, server, working):
+        self.results.append((server, working))
+        self.done.set()
+
+    def _check(self, server, force=False):
+        status = ntp.NTPServerStatus(port=server.port, timeout=0.5)
+        status.add_callback(self._callback)
+        status.check(["127.0.0.1"], force)
+        self.assertTrue(self.done.wait(5))
+        return status
+
+    def working_test(self):
+        server = FakeNTPServer()
+        try:
+            status = self._check(server)
+            self.assertEqual(self.results, [("127.0.0.1", True)])
+            self.assertTrue(status.get("127.0.0.1"))
+
+            # the result is cached
+            status.check(["127.0.0.1"])
+            time.sleep(0.1)
+            self.assertEqual(server.requests, 1)
+        finally:
+            server.close()
+
+    def not_working_test(self):
+        server = FakeNTPServer(reply=False)
+        try:
+            status = self._check(server)
+            self.assertEqual(self.results, [("127.0.0.1", False)])
+            self.assertFalse(status.get("127.0.0.1"))
+            self.assertIsNone(status.get("ntp.example.com"))
+        finally:
+            server.close()
+
+    @patch("pyanaconda.ntp.NTP_WORKING_TTL", -1)
+    def expired_test(self):
+        server = FakeNTPServer()
+        try:
+            status = self._check(server)
+            self.assertIsNone(status.get("127.0.0.1"))
+        finally:
+            server.close()
@@ -0,0 +1,92 @@
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from mock import Mock
+import unittest
+
+from pyanaconda import storage_utils
+
+class SanityRuleTest(unittest.TestCase):
+    def setUp(self):
+        self.disk = Mock(type="disk", exists=True, protected=False, level=None)
+        self.disk.format.type = "disklabel"
+        self.disk.format.labelType = "gpt"
+
+        self.part = Mock(type="partition", exists=True, protected=False,
+                         isPrimary=True, level=None)
+        self.part.partedPartition.number = 1
+        self.part.partedPartition.geometry.start = 2048
+        self.part.partedPartition.geometry.end = 411647
+        self.part.format.type = "efi"
+        self.part.format.exists = True
+        self.part.format.mountpoint = "/boot/efi"
+        self.part.format.labelType = None
+
+        self.storage = Mock(devices=[self.disk, self.part])
+        self.storage.bootloader.skip_bootloader = False
+        self.storage.bootloader.disks = [self.disk]
+
+        self.check = Mock(return_value=[])
+        self.rule = storage_utils.SanityRule(storage_utils._bootloader_state, self.check)
+
+    def _assert_rechecked(self, mutate):
+        self.rule.run(self.storage, 0)
+        self.rule.run(self.storage, 0)
+        self.assertEqual(self.check.call_count, 1)
+
+        mutate()
+        self.rule.run(self.storage, 0)
+        self.assertEqual(self.check.call_count, 2)
+
+    def unchanged_test(self):
+        """The check isn't run again if nothing changed"""
+        for _i in range(3):
+            self.assertEqual(self.rule.run(self.storage, 0), [])
+        self.assertEqual(self.check.call_count, 1)
+
+    def exists_test(self):
+        """Removing a device reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.part, "exists", False))
+
+    def protected_test(self):
+        """Protecting a device reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.part, "protected", True))
+
+    def partition_start_test(self):
+        """Moving a partition reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.part.partedPartition.geometry, "start", 4096))
+
+    def partition_end_test(self):
+        """Resizing a partition reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.part.partedPartition.geometry, "end", 819199))
+
+    def partition_number_test(self):
+        """Renumbering a partition reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.part.partedPartition, "number", 2))
+
+    def primary_test(self):
+        """Making a partition logical reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.part, "isPrimary", False))
+
+    def disklabel_test(self):
+        """Changing the disklabel type reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.disk.format, "labelType", "msdos"))
+
+    def mountpoint_test(self):
+        """Changing the mount point reruns the check"""
+        self._assert_rechecked(lambda: setattr(self.part.format, "mountpoint", "/boot"))